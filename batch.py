@@ -0,0 +1,271 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from map import mapGenerator
+from map.planStore import savePlan
+
+# the image files processed from the input directory
+imageExtensions = (".jpg", ".jpeg", ".png")
+
+
+def findImages(directory):
+    """lists the floor plan images of a directory
+
+    Args:
+        directory (str): the directory of floor plan images
+
+    Returns:
+        list: the paths of the images, sorted by name
+    """
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.lower().endswith(imageExtensions))
+
+
+def getPlanName(path):
+    """returns the name of the artifacts of a floor plan, i.e. its file name without the extension
+
+    Args:
+        path (str): the path of the floor plan image
+
+    Returns:
+        str: the name of the floor plan
+    """
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def openingsToDict(openingDict):
+    """converts the openings of a grid to plain lists and dicts, to be saved as JSON
+
+    Args:
+        openingDict (dict): the openings, in the format {int(1): Opening()...}
+
+    Returns:
+        list: a dict per opening, with its key, center, pixels, orientation and the tile on its other side from each of its sides
+    """
+    return [{"key": int(key),
+             "location": [int(value) for value in opening.getLocation()],
+             "pixels": [[int(x), int(y)] for x, y in opening.getPixels()],
+             "orientation": opening.getOrientation(),
+             "otherSideTiles": dict(opening.otherSideTiles)}
+            for key, opening in openingDict.items()]
+
+
+def processPlan(name, floorplan, outputDirectory, finalSize=128, visibility=False):
+    """runs a floor plan's model output through the map stages and saves its artifacts,
+    in a worker process of the pool
+
+    Args:
+        name (str): the name of the floor plan's artifacts
+        floorplan (str or numpy ndarray): the model output, as an image path, an RGB array or a label map (see MapGenerator.createFromLabels) indexed [x, y]
+        outputDirectory (str): the directory the artifacts are saved to
+        finalSize (int, optional): the size of the final grid. Defaults to 128.
+        visibility (bool, optional): also build the visibility index of the openings and save it in the plan. Defaults to False.
+
+    Returns:
+        dict: the name of the plan, the seconds each stage took, and the error if it failed
+    """
+    result = {"name": name, "timings": dict()}
+    timings = result["timings"]
+    try:
+        generator = mapGenerator.MapGenerator(finalSize=finalSize)
+        if isinstance(floorplan, np.ndarray) and floorplan.ndim == 2:
+            generator.createFromLabels(floorplan)
+        else:
+            generator.create(floorplan)
+        timings.update(generator.timings)
+        grid = generator.grid
+
+        start = time.perf_counter()
+        grid.findOpenings()
+        timings["findOpenings"] = time.perf_counter() - start
+
+        if visibility:
+            start = time.perf_counter()
+            grid.buildVisibilityIndex(eager=True)
+            timings["visibility"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        generator.getImage().save(os.path.join(outputDirectory, name + ".png"))
+        with open(os.path.join(outputDirectory, name + ".openings.json"), "w") as openingsFile:
+            json.dump(openingsToDict(grid.getOpenings()), openingsFile)
+        # the grid, openings and indexes, to be loaded with planStore.loadPlan
+        savePlan(os.path.join(outputDirectory, name + ".plan.npz"), grid, includeVisibility=visibility)
+        timings["save"] = time.perf_counter() - start
+        result["openings"] = len(grid.getOpenings())
+    except Exception as error:
+        # one bad floor plan should not stop the batch
+        result["error"] = repr(error)
+    return result
+
+
+def runInference(paths, batchSize, intraOpThreads, interOpThreads, model=None):
+    """runs the DeepFloorPlan model on the floor plans, a batch at a time, through a single model session
+
+    a batch that fails, e.g. because one of its images cannot be read, is run again one image at a time,
+    so that only the floor plans that fail themselves are reported as failed
+
+    Args:
+        paths (list): the paths of the floor plan images
+        batchSize (int): how many images are run through the model at once
+        intraOpThreads (int): threads used within an operation, 0 lets tensorflow decide
+        interOpThreads (int): operations run in parallel, 0 lets tensorflow decide
+        model (module, optional): the module with the InferenceEngine and merge_results of the model. Defaults to demo.
+
+    Yields:
+        str, numpy ndarray, float, dict: the path of each floor plan, its model output as a label map indexed [x, y],
+        its share of the batch's inference time, and its failed result (see processPlan), None unless the model failed on it
+    """
+    if model is None:
+        # only imported when the model is needed, as it requires tensorflow
+        import demo as model
+    engine = model.InferenceEngine(intra_op_threads=intraOpThreads, inter_op_threads=interOpThreads)
+    try:
+        for start in range(0, len(paths), batchSize):
+            batch = paths[start:start + batchSize]
+            try:
+                floorplans = inferBatch(engine, model, batch)
+            except Exception:
+                floorplans = []
+                for path in batch:
+                    try:
+                        floorplans.extend(inferBatch(engine, model, [path]))
+                    except Exception as error:
+                        # one bad floor plan should not stop the batch
+                        floorplans.append((path, None, None, {"name": getPlanName(path), "timings": dict(), "error": repr(error)}))
+            yield from floorplans
+    finally:
+        engine.close()
+
+
+def inferBatch(engine, model, batch):
+    """runs the model on one batch of floor plans, raising if any of them fails
+
+    Args:
+        engine (InferenceEngine): the loaded model
+        model (module): the module with the model's merge_results
+        batch (list): the paths of the floor plan images
+
+    Returns:
+        list: the path, label map indexed [x, y], share of the inference time and None, of each floor plan (see runInference)
+    """
+    startTime = time.perf_counter()
+    roomTypes, roomBoundaries = engine.infer(batch)
+    seconds = (time.perf_counter() - startTime) / len(batch)
+    # images are indexed [y, x], the map stages [x, y]
+    return [(path, model.merge_results(roomType, roomBoundary).T, seconds, None)
+            for path, roomType, roomBoundary in zip(batch, roomTypes, roomBoundaries)]
+
+
+def summarize(results, wallTime):
+    """summarizes the time each stage took over every floor plan
+
+    Args:
+        results (list): the results of processPlan
+        wallTime (float): how many seconds the whole batch took
+
+    Returns:
+        dict: {"plans": int, "failed": int, "wallTime": seconds, "plansPerSecond": float, "stages": {stage: {"total", "mean", "max"}}}
+    """
+    stages = dict()
+    for result in results:
+        for stage, seconds in result["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+    return {"plans": len(results),
+            "failed": sum(1 for result in results if "error" in result),
+            "wallTime": wallTime,
+            "plansPerSecond": len(results) / wallTime if wallTime > 0 else 0.0,
+            "stages": {stage: {"total": sum(times), "mean": sum(times) / len(times), "max": max(times)}
+                       for stage, times in stages.items()}}
+
+
+def printSummary(summary):
+    """prints the summary of a batch as a table
+
+    Args:
+        summary (dict): the summary made by summarize
+    """
+    print("{} plans ({} failed) in {:.2f}s, {:.2f} plans/s".format(summary["plans"], summary["failed"], summary["wallTime"], summary["plansPerSecond"]))
+    print("{:<14}{:>12}{:>12}{:>12}".format("stage", "total (s)", "mean (ms)", "max (ms)"))
+    for stage, times in summary["stages"].items():
+        print("{:<14}{:>12.3f}{:>12.2f}{:>12.2f}".format(stage, times["total"], times["mean"] * 1000, times["max"] * 1000))
+
+
+def runBatch(inputDirectory, outputDirectory, workers=None, batchSize=4, modelOutput=False, finalSize=128, visibility=False, intraOpThreads=0, interOpThreads=0,
+             model=None):
+    """processes every floor plan of a directory, the model's batches in this process and the map stages in a process pool,
+    so that the model works on the next batch while the pool works on the previous one
+
+    Args:
+        inputDirectory (str): the directory of floor plan images
+        outputDirectory (str): the directory the artifacts and summary.json are saved to, created if needed
+        workers (int, optional): how many processes run the map stages. Defaults to the number of CPUs.
+        batchSize (int, optional): how many images are run through the model at once. Defaults to 4.
+        modelOutput (bool, optional): the images are already DeepFloorPlan model output, so the model is not run. Defaults to False.
+        finalSize (int, optional): the size of the final grids. Defaults to 128.
+        visibility (bool, optional): also build and save the visibility index of each plan. Defaults to False.
+        intraOpThreads (int, optional): the model's threads within an operation, 0 lets tensorflow decide. Defaults to 0.
+        interOpThreads (int, optional): the model's operations run in parallel, 0 lets tensorflow decide. Defaults to 0.
+        model (module, optional): the module with the InferenceEngine and merge_results of the model. Defaults to demo.
+
+    Returns:
+        dict: the summary of the batch (see summarize), with the result of every plan under "results"
+    """
+    os.makedirs(outputDirectory, exist_ok=True)
+    paths = findImages(inputDirectory)
+    start = time.perf_counter()
+    inferenceTimes = dict()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # the future of each plan's map stages, or its result if the model already failed on it
+        futures = []
+        if modelOutput:
+            floorplans = ((path, path, None, None) for path in paths)
+        else:
+            floorplans = runInference(paths, batchSize, intraOpThreads, interOpThreads, model)
+        for path, floorplan, seconds, failed in floorplans:
+            name = getPlanName(path)
+            if failed is not None:
+                futures.append(failed)
+                continue
+            if seconds is not None:
+                inferenceTimes[name] = seconds
+            futures.append(pool.submit(processPlan, name, floorplan, outputDirectory, finalSize, visibility))
+        results = [future if isinstance(future, dict) else future.result() for future in futures]
+    for result in results:
+        if result["name"] in inferenceTimes:
+            result["timings"]["inference"] = inferenceTimes[result["name"]]
+
+    summary = summarize(results, time.perf_counter() - start)
+    summary["results"] = results
+    with open(os.path.join(outputDirectory, "summary.json"), "w") as summaryFile:
+        json.dump(summary, summaryFile, indent=2)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Processes a directory of floor plans without the GUI")
+    parser.add_argument("input", help="the directory of floor plan images")
+    parser.add_argument("output", help="the directory the artifacts are saved to")
+    parser.add_argument("--workers", type=int, default=None, help="how many processes run the map stages (default: the number of CPUs)")
+    parser.add_argument("--batch-size", type=int, default=4, help="how many images are run through the model at once")
+    parser.add_argument("--model-output", action="store_true", help="the images are already DeepFloorPlan model output, do not run the model")
+    parser.add_argument("--size", type=int, default=128, help="the size of the final grids")
+    parser.add_argument("--visibility", action="store_true", help="also build and save each plan's visibility index")
+    parser.add_argument("--intra-op-threads", type=int, default=0, help="the model's threads within an operation")
+    parser.add_argument("--inter-op-threads", type=int, default=0, help="the model's operations run in parallel")
+    args = parser.parse_args(argv)
+
+    summary = runBatch(args.input, args.output, workers=args.workers, batchSize=args.batch_size, modelOutput=args.model_output,
+                       finalSize=args.size, visibility=args.visibility,
+                       intraOpThreads=args.intra_op_threads, interOpThreads=args.inter_op_threads)
+    printSummary(summary)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from map import mapGenerator
+from map.grid import Grid
+from sound import SoundGenerator, NullBackend
+
+# the grid sizes benchmarked by default, up to the largest grid allowed
+defaultSizes = (128, 256, 512, 1000)
+# the baseline the results are compared to, kept next to this file
+defaultBaseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarkBaseline.json")
+# how much slower than the baseline a benchmark can be before it is a regression, e.g. 0.25 is 25% slower
+defaultThreshold = 0.25
+# the number of lines and listener positions timed by the line and sound benchmarks
+lineCount = 200
+listenerCount = 20
+
+
+def loadExample(size=None):
+    """loads the bundled example floor plan, scaled to a size
+
+    the example is scaled without filtering, so that it keeps the tile colours, as a grid holds at most 256 colours
+
+    Args:
+        size (int, optional): the width and height of the scaled example. Defaults to the example's own size.
+
+    Returns:
+        Image: the RGBA example floor plan
+    """
+    generator = mapGenerator.MapGenerator()
+    image = Image.open(os.path.join(generator.mapDirectory, "example.png")).convert("RGBA")
+    if size is not None and image.size != (size, size):
+        image = image.resize((size, size), resample=Image.NEAREST)
+    return image
+
+
+def prepareGrid(image):
+    """populates a grid with an image and crushes its dithering, as MapGenerator does
+
+    Args:
+        image (Image): the floor plan
+
+    Returns:
+        Grid, Grid: the populated grid, and the crushed grid with its openings found
+    """
+    generator = mapGenerator.MapGenerator()
+    populated = generator.populateGrid(None, Grid(image.size[0], image.size[1]), image)
+    crushed = populated.crushDithering(populated)
+    crushed.findOpenings()
+    return populated, crushed
+
+
+def getLines(grid, count, seed=0):
+    """returns random lines across a grid
+
+    Args:
+        grid (Grid): the grid the lines are on
+        count (int): the number of lines
+        seed (int, optional): the seed of the random lines, so that every run times the same lines. Defaults to 0.
+
+    Returns:
+        list: (startX, startY, endX, endY) of each line
+    """
+    random = np.random.default_rng(seed)
+    xs = random.integers(0, grid.getSizeX(), (count, 2)).tolist()
+    ys = random.integers(0, grid.getSizeY(), (count, 2)).tolist()
+    return [(x[0], y[0], x[1], y[1]) for x, y in zip(xs, ys)]
+
+
+def getListeners(grid, count, seed=1):
+    """returns random listener positions on the grid's rooms, i.e. not on walls, openings or outside the plan
+
+    Args:
+        grid (Grid): the grid the listeners are on
+        count (int): the number of listeners
+        seed (int, optional): the seed of the random positions. Defaults to 1.
+
+    Returns:
+        list: (x, y) of each listener
+    """
+    rooms = np.argwhere(~grid.getObstructionMask() & ~grid.getTileMask("NaN", "background"))
+    if len(rooms) == 0:
+        return []
+    random = np.random.default_rng(seed)
+    return [tuple(cell) for cell in rooms[random.integers(0, len(rooms), count)].tolist()]
+
+
+def getBenchmarks(image):
+    """returns the benchmarks of a floor plan, each a function timed without its setup
+
+    Args:
+        image (Image): the floor plan
+
+    Returns:
+        dict: the function of each benchmark, by name
+    """
+    generator = mapGenerator.MapGenerator()
+    populated, crushed = prepareGrid(image)
+    lines = getLines(crushed, lineCount)
+    pixelLines = [crushed.pixelsBetweenTwoPoints(*line) for line in lines]
+    listeners = getListeners(crushed, listenerCount)
+    openings = list(crushed.getOpenings().values())
+    audio = SoundGenerator(crushed, crushed.getOpenings(), backend=NullBackend())
+
+    def otherSide():
+        for x, y in listeners:
+            for opening in openings:
+                openingX, openingY = opening.getLocation()
+                crushed.otherSide(x, y, openingX, openingY, len(opening.getPixels()))
+
+    def getOpeningSources():
+        for x, y in listeners:
+            audio.getOpeningSources(x, y)
+
+    return {"populateGrid": lambda: generator.populateGrid(None, Grid(image.size[0], image.size[1]), image),
+            "crushDithering": lambda: populated.crushDithering(populated),
+            "tileSearch": lambda: crushed.tileSearch("opening"),
+            "findOpenings": crushed.findOpenings,
+            "pixelsBetweenTwoPoints": lambda: [crushed.pixelsBetweenTwoPoints(*line) for line in lines],
+            "getObstructionsInLine": lambda: [crushed.getObstructionsInLine(line) for line in pixelLines],
+            "otherSide": otherSide,
+            "getOpeningSources": getOpeningSources}
+
+
+def timeFunction(function, repeat):
+    """times a function, once to warm it up and then repeat times
+
+    Args:
+        function (function): the function to time
+        repeat (int): how many times to time it
+
+    Returns:
+        dict: {"median": seconds, "min": seconds, "runs": int}
+    """
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {"median": statistics.median(times), "min": min(times), "runs": repeat}
+
+
+def getMachineInfo():
+    """returns what the benchmarks ran on, as results from different machines are not comparable
+
+    Returns:
+        dict: the platform, processor, CPU count and the versions of python and numpy
+    """
+    return {"platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+            "numpy": np.__version__}
+
+
+def runBenchmarks(sizes=defaultSizes, repeat=5, example=True, names=None):
+    """runs the benchmarks on the example floor plan scaled to every size, and on the example itself
+
+    Args:
+        sizes (list, optional): the grid sizes to run the benchmarks at. Defaults to defaultSizes.
+        repeat (int, optional): how many times each benchmark is timed. Defaults to 5.
+        example (bool, optional): also run the benchmarks on the unscaled example. Defaults to True.
+        names (list, optional): only run these benchmarks. Defaults to every benchmark.
+
+    Returns:
+        dict: {"machine": getMachineInfo(), "time": str, "results": {"name[size]": timeFunction()...}}
+    """
+    images = [(str(size), loadExample(size)) for size in sizes]
+    if example:
+        images.append(("example", loadExample()))
+    results = dict()
+    for label, image in images:
+        for name, function in getBenchmarks(image).items():
+            if names is None or name in names:
+                results[name + "[" + label + "]"] = timeFunction(function, repeat)
+    return {"machine": getMachineInfo(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": results}
+
+
+def compareResults(results, baseline, threshold=defaultThreshold):
+    """compares the median time of every benchmark to the baseline's
+
+    Args:
+        results (dict): the results of runBenchmarks
+        baseline (dict): the baseline, results of runBenchmarks saved earlier
+        threshold (float, optional): how much slower or faster than the baseline is a regression or speedup. Defaults to defaultThreshold.
+
+    Returns:
+        dict: {"name[size]": {"ratio": current / baseline, "status": "regression", "speedup" or "same"}} of the benchmarks in both
+    """
+    comparison = dict()
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            continue
+        ratio = result["median"] / max(baseline["results"][name]["median"], 1e-9)
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold):
+            status = "speedup"
+        else:
+            status = "same"
+        comparison[name] = {"ratio": ratio, "status": status}
+    return comparison
+
+
+def printResults(results, comparison=None):
+    """prints the results, and how they compare to the baseline, as a table
+
+    Args:
+        results (dict): the results of runBenchmarks
+        comparison (dict, optional): the comparison made by compareResults. Defaults to None.
+    """
+    print("{:<36}{:>12}{:>12}{:>10}  {}".format("benchmark", "median (ms)", "min (ms)", "ratio", "status"))
+    for name, result in results["results"].items():
+        ratio, status = "", ""
+        if comparison is not None and name in comparison:
+            ratio = "{:.2f}".format(comparison[name]["ratio"])
+            status = comparison[name]["status"]
+        print("{:<36}{:>12.3f}{:>12.3f}{:>10}  {}".format(name, result["median"] * 1000, result["min"] * 1000, ratio, status))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Times the map and sound hot paths at several grid sizes, and compares them to a baseline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(defaultSizes), help="the grid sizes to run the benchmarks at (at most 1000)")
+    parser.add_argument("--repeat", type=int, default=5, help="how many times each benchmark is timed")
+    parser.add_argument("--only", nargs="+", default=None, help="only run these benchmarks")
+    parser.add_argument("--no-example", action="store_true", help="do not run the benchmarks on the unscaled example")
+    parser.add_argument("--output", default=None, help="the JSON file the results are saved to")
+    parser.add_argument("--baseline", default=defaultBaseline, help="the JSON file of the baseline results")
+    parser.add_argument("--save-baseline", action="store_true", help="save the results as the new baseline instead of comparing to it")
+    parser.add_argument("--threshold", type=float, default=defaultThreshold, help="how much slower than the baseline is a regression, e.g. 0.25 for 25%%")
+    args = parser.parse_args(argv)
+
+    results = runBenchmarks(args.sizes, args.repeat, not args.no_example, args.only)
+    if args.output is not None:
+        with open(args.output, "w") as outputFile:
+            json.dump(results, outputFile, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as baselineFile:
+            json.dump(results, baselineFile, indent=2)
+        printResults(results)
+        return 0
+
+    comparison = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)
+        if baseline["machine"] != results["machine"]:
+            print("The baseline was recorded on another machine, the ratios may not be meaningful:", baseline["machine"])
+        comparison = compareResults(results, baseline, args.threshold)
+    printResults(results, comparison)
+    if comparison is not None and any(result["status"] == "regression" for result in comparison.values()):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
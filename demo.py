@@ -12,17 +12,27 @@
 
 # https://github.com/zlzeng/DeepFloorplan
 
-# I have made only minor modifications to this file to make it compatible with the rest of the project.
+# This file has been modified from the original to work with the rest of the project:
+# - InferenceEngine keeps the pretrained model loaded in one tensorflow session, optionally loading it on a background thread,
+#   and runs batches of images through it (infer, infer_one), keeping any loading error to be raised by wait()
+# - load_image accepts RGB arrays as well as paths, and ind2rgb draws the label map through a lookup table
+# - main(args, engine=None, save_image=True) can reuse a loaded InferenceEngine, only saves map/result.png when asked,
+#   and returns the merged label map
+# - main is recorded as a span by the project's tracing (see map/tracing.py)
 
 
 import os
+import time
 import argparse
+import threading
 import numpy as np
 import tensorflow as tf
 
 from scipy.misc import imread, imsave, imresize
 from matplotlib import pyplot as plt
 
+from map import tracing
+
 os.environ['CUDA_VISIBLE_DEVICES'] = '0'
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
@@ -49,56 +59,147 @@ floorplan_map = {
 }
 
 def ind2rgb(ind_im, color_map=floorplan_map):
-	rgb_im = np.zeros((ind_im.shape[0], ind_im.shape[1], 3))
-
+	# a lookup table of the colour of each class, so that the image is drawn in a single step
+	palette = np.zeros((max(color_map) + 1, 3))
 	for i, rgb in color_map.items():
-		rgb_im[(ind_im==i)] = rgb
-
-	return rgb_im
-
-def main(args):
-	# load input
-	im = imread(args, mode='RGB')
+		palette[i] = rgb
+
+	return palette[ind_im]
+
+def merge_results(room_type, room_boundary):
+	# merge results
+	floorplan = room_type.copy()
+	floorplan[room_boundary==1] = 9
+	floorplan[room_boundary==2] = 10
+	return floorplan
+
+def load_image(image):
+	# load input, either a path or an RGB array
+	if isinstance(image, str):
+		im = imread(image, mode='RGB')
+	else:
+		im = np.asarray(image)[:, :, :3]
 	im = im.astype(np.float32)
-	im = imresize(im, (512,512,3)) / 255.
-
-	# create tensorflow session
-	with tf.Session() as sess:
-		
-		# initialize
-		sess.run(tf.group(tf.global_variables_initializer(),
-					tf.local_variables_initializer()))
-
-		# restore pretrained model
-		# saver = tf.train.import_meta_graph('/DeepFloorplan/pretrained/pretrained_r3d.meta')
-		saver = tf.train.import_meta_graph(os.path.join(os.getcwd(), "pretrained\pretrained_r3d.meta"))
-		saver.restore(sess, os.path.join(os.getcwd(), "pretrained\pretrained_r3d"))
-
-		# get default graph
-		graph = tf.get_default_graph()
-
-		# restore inputs & outpus tensor
-		x = graph.get_tensor_by_name('inputs:0')
-		room_type_logit = graph.get_tensor_by_name('Cast:0')
-		room_boundary_logit = graph.get_tensor_by_name('Cast_1:0')
-  
-  		# infer results
-		[room_type, room_boundary] = sess.run([room_type_logit, room_boundary_logit],\
-										feed_dict={x:im.reshape(1,512,512,3)})
-		room_type, room_boundary = np.squeeze(room_type), np.squeeze(room_boundary)
-
-		# merge results
-		floorplan = room_type.copy()
-		floorplan[room_boundary==1] = 9
-		floorplan[room_boundary==2] = 10
+	return imresize(im, (512,512,3)) / 255.
+
+class InferenceEngine(object):
+	"""keeps one tensorflow session open with the pretrained graph and weights,
+	so that they are loaded once rather than for every floor plan
+
+	Args:
+		model_path (str, optional): the pretrained model, without the .meta extension. Defaults to pretrained/pretrained_r3d.
+		intra_op_threads (int, optional): threads used within an operation, 0 lets tensorflow decide. Defaults to 0.
+		inter_op_threads (int, optional): operations run in parallel, 0 lets tensorflow decide. Defaults to 0.
+		background (bool, optional): load the model on another thread, e.g. while the app starts. Defaults to False.
+	"""
+	def __init__(self, model_path=None, intra_op_threads=0, inter_op_threads=0, background=False):
+		if model_path is None:
+			model_path = os.path.join(os.getcwd(), 'pretrained', 'pretrained_r3d')
+		self.model_path = model_path
+		self.config = tf.ConfigProto(intra_op_parallelism_threads=intra_op_threads,
+									inter_op_parallelism_threads=inter_op_threads)
+		self.graph = tf.Graph()
+		self.sess = None
+		self.error = None
+		self.load_time = None
+		self.ready = threading.Event()
+		if background:
+			self.thread = threading.Thread(target=self.load, daemon=True)
+			self.thread.start()
+		else:
+			self.load()
+
+	def load(self):
+		start = time.perf_counter()
+		try:
+			with self.graph.as_default():
+				sess = tf.Session(graph=self.graph, config=self.config)
+				# restore pretrained model
+				saver = tf.train.import_meta_graph(self.model_path + '.meta')
+				saver.restore(sess, self.model_path)
+
+				# restore inputs & outpus tensor
+				self.x = self.graph.get_tensor_by_name('inputs:0')
+				self.room_type_logit = self.graph.get_tensor_by_name('Cast:0')
+				self.room_boundary_logit = self.graph.get_tensor_by_name('Cast_1:0')
+			# the graph may only take a fixed amount of images at once
+			self.batch_size = self.x.shape.as_list()[0] if self.x.shape.ndims else None
+			self.sess = sess
+		except Exception as e:
+			self.error = e
+		finally:
+			self.load_time = time.perf_counter() - start
+			self.ready.set()
+
+	def wait(self, timeout=None):
+		"""waits for the model to be loaded, raising the error if it failed to load"""
+		if not self.ready.wait(timeout):
+			raise RuntimeError('The model has not finished loading')
+		if self.error is not None:
+			raise self.error
+
+	def infer(self, images):
+		"""runs the model on a batch of images, through a single sess.run when the graph allows it
+
+		Args:
+			images (list): image paths or RGB arrays, or an (n, 512, 512, 3) array of preprocessed images
+
+		Returns:
+			2 numpy ndarray: the (n, 512, 512) room_type and room_boundary arrays
+		"""
+		self.wait()
+		if isinstance(images, np.ndarray) and images.ndim == 4:
+			batch = images.astype(np.float32)
+		else:
+			batch = np.stack([load_image(image) for image in images])
+		step = self.batch_size if self.batch_size else len(batch)
+		room_types, room_boundaries = [], []
+		for start in range(0, len(batch), max(step, 1)):
+			[room_type, room_boundary] = self.sess.run([self.room_type_logit, self.room_boundary_logit],\
+									feed_dict={self.x:batch[start:start + step]})
+			room_types.append(room_type.reshape(-1, 512, 512))
+			room_boundaries.append(room_boundary.reshape(-1, 512, 512))
+		return np.concatenate(room_types), np.concatenate(room_boundaries)
+
+	def infer_one(self, image):
+		"""runs the model on a single image path or RGB array
+
+		Returns:
+			2 numpy ndarray: the (512, 512) room_type and room_boundary arrays
+		"""
+		room_type, room_boundary = self.infer([image])
+		return room_type[0], room_boundary[0]
+
+	def close(self):
+		self.wait()
+		self.sess.close()
+
+@tracing.traced("demo.main")
+def main(args, engine=None, save_image=True):
+	"""runs the model on a floor plan and returns its merged label map
+
+	Args:
+		args (str): the path of the floor plan image
+		engine (InferenceEngine, optional): an already loaded model. Defaults to loading one for this image only.
+		save_image (bool, optional): also draw the label map in colour to map/result.png. Defaults to True.
+
+	Returns:
+		numpy ndarray: the (512, 512) label map of the model's classes, indexed [y, x] (see MapGenerator.createFromLabels)
+	"""
+	# load the model for this image only, unless an already loaded engine is given
+	if engine is None:
+		engine = InferenceEngine()
+		room_type, room_boundary = engine.infer_one(args)
+		engine.close()
+	else:
+		room_type, room_boundary = engine.infer_one(args)
+
+	floorplan = merge_results(room_type, room_boundary)
+	if save_image:
 		floorplan_rgb = ind2rgb(floorplan)
-
-		plt.subplot(121)
-		plt.imshow(im)
-		plt.subplot(122)
 		plt.imsave(os.path.join(os.getcwd(), 'map', 'result.png'),floorplan_rgb/255)
-		return
+	return floorplan
 
 if __name__ == '__main__':
 	FLAGS, unparsed = parser.parse_known_args()
-	main(FLAGS)
+	main(FLAGS.im_path)
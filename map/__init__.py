@@ -1,3 +1,8 @@
 from .grid import Grid
 from .mapGenerator import MapGenerator
-from .opening import Opening
\ No newline at end of file
+from .opening import Opening
+from .planStore import loadPlan, savePlan
+from .propagation import PropagationField
+from .pyramid import ObstructionPyramid
+from .quantizer import Quantizer
+from .rooms import RoomIndex
\ No newline at end of file
@@ -0,0 +1,170 @@
+import numpy as np
+
+
+class Components():
+    """Components class
+        the connected components of a boolean mask, with Four-Pixel Connectivity (up, down, left, right)
+        components are numbered from 1 in the order their first pixel is met scanning x then y,
+        i.e. the same order as Grid.tileSearch visits them
+        0 is used for the pixels that are not part of any component
+    """
+
+    def __init__(self, labels, pixels, pixelLabels):
+        """Components class __init__
+
+        Args:
+            labels (numpy ndarray): 2D int32 array containing the component number of every pixel
+            pixels (numpy ndarray): (n, 2) array of the (x, y) coordinates of every labelled pixel, sorted by component then x then y
+            pixelLabels (numpy ndarray): (n,) array of the component number of each of the pixels
+        """
+        self.labels = labels
+        self.count = int(pixelLabels[-1]) if len(pixelLabels) > 0 else 0
+        # index of the first pixel of each component in the pixels array, plus the end of the array
+        self.offsets = np.searchsorted(pixelLabels, np.arange(1, self.count + 2))
+        self.pixels = pixels
+        self.sizes = np.diff(self.offsets)
+        if self.count > 0:
+            starts = self.offsets[:-1]
+            self.boundingBoxes = np.concatenate((np.minimum.reduceat(pixels, starts),
+                                                 np.maximum.reduceat(pixels, starts)), axis=1)
+            self.centroids = np.add.reduceat(pixels, starts) / self.sizes[:, np.newaxis]
+        else:
+            self.boundingBoxes = np.empty((0, 4), dtype=pixels.dtype)
+            self.centroids = np.empty((0, 2))
+
+    def __len__(self):
+        return self.count
+
+    def getPixels(self, component):
+        """returns the pixels of one component
+
+        Args:
+            component (int): the component number, from 1 to count
+
+        Returns:
+            numpy ndarray: (n, 2) array of the (x, y) coordinates of the component's pixels, sorted by x then y
+        """
+        if not 1 <= component <= self.count:
+            raise ValueError("Component numbers must be between 1 and the number of components")
+        return self.pixels[self.offsets[component - 1]:self.offsets[component]]
+
+    def getBoundingBox(self, component):
+        """returns the bounding box of one component
+
+        Args:
+            component (int): the component number, from 1 to count
+
+        Returns:
+            tuple: the inclusive bounding box as (minX, minY, maxX, maxY)
+        """
+        return tuple(int(value) for value in self.boundingBoxes[component - 1])
+
+    def getCentroid(self, component):
+        """returns the mean pixel of one component
+
+        Args:
+            component (int): the component number, from 1 to count
+
+        Returns:
+            tuple: the mean (x, y) of the component's pixels as floats
+        """
+        return tuple(float(value) for value in self.centroids[component - 1])
+
+    def asLists(self):
+        """returns every component as a list of its pixels
+
+        Returns:
+            list: a 2D list containing each component as a sublist of its pixels as (x, y) tuples
+        """
+        pixelList = [(int(x), int(y)) for x, y in self.pixels]
+        return [pixelList[self.offsets[i]:self.offsets[i + 1]] for i in range(self.count)]
+
+
+def findRuns(mask):
+    """finds the runs of consecutive True pixels along the y axis of each x column of a mask
+
+    Args:
+        mask (numpy ndarray): 2D boolean array
+
+    Returns:
+        3 numpy ndarray:
+        runX: the x coordinate of each run,
+        runStart: the first y coordinate of each run,
+        runEnd: the y coordinate after the end of each run
+        all sorted by x then y
+    """
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    steps = np.diff(padded, axis=1)
+    runX, runStart = np.nonzero(steps == 1)
+    runEnd = np.nonzero(steps == -1)[1]
+    return runX, runStart, runEnd
+
+
+def labelComponents(mask, minSize=1):
+    """labels the connected components of a boolean mask with Four-Pixel Connectivity
+
+    a single non-recursive pass: the runs of each column are found at once,
+    runs that touch in neighbouring columns are merged with a union-find,
+    so no pixel is visited more than a constant amount of times
+
+    Args:
+        mask (numpy ndarray): 2D boolean array, True for the pixels to label
+        minSize (int, optional): components with fewer pixels than this are left unlabelled. Defaults to 1.
+
+    Returns:
+        Components: the labelled components of the mask
+    """
+    mask = np.asarray(mask, dtype=bool)
+    if mask.ndim != 2:
+        raise ValueError("Can only label a 2D mask")
+    runX, runStart, runEnd = findRuns(mask)
+    runCount = len(runX)
+
+    # the run each True pixel belongs to
+    runOfPixel = np.full(mask.shape, -1, dtype=np.int64)
+    runOfPixel[mask] = np.repeat(np.arange(runCount), runEnd - runStart)
+
+    # pairs of runs which touch between column x and column x+1
+    touching = mask[:-1, :] & mask[1:, :]
+    edges = np.unique(np.stack((runOfPixel[:-1, :][touching], runOfPixel[1:, :][touching]), axis=1), axis=0)
+
+    # union-find over the runs, always keeping the earliest run (in scan order) as the root
+    parent = list(range(runCount))
+    for a, b in edges.tolist():
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        while parent[b] != b:
+            parent[b] = parent[parent[b]]
+            b = parent[b]
+        if a < b:
+            parent[b] = a
+        elif b < a:
+            parent[a] = b
+    # parents always point to an earlier run, so resolving in scan order flattens every tree
+    for run in range(runCount):
+        parent[run] = parent[parent[run]]
+    roots = np.array(parent, dtype=np.int64)
+
+    # number the components by their root, which is also their first run in scan order
+    runLengths = runEnd - runStart
+    sizes = np.bincount(roots, weights=runLengths, minlength=runCount)
+    keptRoots = np.nonzero((sizes >= max(minSize, 1)) & (roots == np.arange(runCount)))[0]
+    componentOfRoot = np.zeros(runCount, dtype=np.int32)
+    componentOfRoot[keptRoots] = np.arange(1, len(keptRoots) + 1)
+    componentOfRun = componentOfRoot[roots] if runCount > 0 else np.zeros(0, dtype=np.int32)
+
+    labels = np.zeros(mask.shape, dtype=np.int32)
+    labels[mask] = np.repeat(componentOfRun, runLengths)
+
+    # every labelled pixel, grouped by component and kept in x then y order within it
+    pixelX, pixelY = np.nonzero(labels)
+    pixelLabels = labels[pixelX, pixelY]
+    order = np.argsort(pixelLabels, kind="stable")
+    pixels = np.stack((pixelX[order], pixelY[order]), axis=1)
+    return Components(labels, pixels, pixelLabels[order])
+
+
+if __name__ == "__main__":
+    pass
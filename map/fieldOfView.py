@@ -0,0 +1,84 @@
+import math
+import numpy as np
+
+# how each of the 8 octants maps its (column, row) coordinates onto the grid's (x, y)
+octants = [(1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+           (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1)]
+
+
+def fieldOfView(blocking, originX, originY, radius=None):
+    """computes the cells that can be seen from an origin in a single sweep, using recursive shadowcasting
+    (written with an explicit stack rather than recursion, so that it works on grids of any size)
+
+    each of the 8 octants around the origin is scanned row by row, moving away from the origin,
+    keeping track of the range of slopes that are not yet in the shadow of a blocking cell
+    blocking cells are visible themselves, but hide the cells behind them
+    an origin on a blocking cell sees only itself
+
+    Args:
+        blocking (numpy ndarray): 2D boolean array, True for the cells that block the view (e.g. walls and openings)
+        originX (int): the x coordinate of the origin
+        originY (int): the y coordinate of the origin
+        radius (int, optional): how far the view reaches. Defaults to the whole grid.
+
+    Returns:
+        numpy ndarray: a boolean array the same shape as blocking, True for the visible cells
+    """
+    sizeX, sizeY = blocking.shape
+    if not (0 <= originX < sizeX and 0 <= originY < sizeY):
+        raise ValueError("The origin must be within the grid")
+    if radius is None:
+        radius = sizeX + sizeY
+    visible = np.zeros((sizeX, sizeY), dtype=bool)
+    visible[originX, originY] = True
+    if blocking[originX, originY]:
+        return visible
+    # looking up cells in nested lists is much faster than in an array one cell at a time
+    isBlocking = blocking.tolist()
+    radiusSquared = radius * radius
+
+    for xx, xy, yx, yy in octants:
+        # each entry is a row still to scan and the range of slopes still lit in it
+        stack = [(1, 1.0, 0.0)]
+        while stack:
+            row, startSlope, endSlope = stack.pop()
+            if startSlope < endSlope:
+                continue
+            nextStartSlope = startSlope
+            for distance in range(row, radius + 1):
+                deltaY = -distance
+                blocked = False
+                # skip straight to the first cell that is not before the lit range
+                firstDeltaX = max(-distance, math.floor(-startSlope * (distance + 0.5) - 0.5))
+                for deltaX in range(firstDeltaX, 1):
+                    leftSlope = (deltaX - 0.5) / (deltaY + 0.5)
+                    rightSlope = (deltaX + 0.5) / (deltaY - 0.5)
+                    if startSlope < rightSlope:
+                        continue
+                    if endSlope > leftSlope:
+                        break
+                    x = originX + deltaX * xx + deltaY * xy
+                    y = originY + deltaX * yx + deltaY * yy
+                    inside = 0 <= x < sizeX and 0 <= y < sizeY
+                    if inside and deltaX * deltaX + deltaY * deltaY < radiusSquared:
+                        visible[x, y] = True
+                    # anything outside the grid blocks the view too
+                    cellBlocks = not inside or isBlocking[x][y]
+                    if blocked:
+                        if cellBlocks:
+                            nextStartSlope = rightSlope
+                            continue
+                        blocked = False
+                        startSlope = nextStartSlope
+                    elif cellBlocks and distance < radius:
+                        # the lit range before this blocking cell carries on in the next rows
+                        blocked = True
+                        stack.append((distance + 1, startSlope, leftSlope))
+                        nextStartSlope = rightSlope
+                if blocked:
+                    break
+    return visible
+
+
+if __name__ == "__main__":
+    pass
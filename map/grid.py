@@ -1,12 +1,57 @@
 from collections import Counter
-import copy
 import numpy as np
+from . import tracing
+from .components import labelComponents
+from .fieldOfView import fieldOfView
+from .lines import bresenhamLines, walkLines
 from .opening import Opening
+from .propagation import PropagationField
+from .pyramid import ObstructionPyramid
+from .quantizer import Quantizer
+from .rooms import RoomIndex
+from .visibility import VisibilityIndex
 
 # (x=0,y=0) of the grid is in the top left corner
 
+# rgbMap dictionary specifying what each type of pixel "tile" corresponds to in RGBA (r, g, b, a)
+rgbMap = {
+    "wall": (0,  0,  0, 255),
+    "background": (255, 255, 255, 255),
+    "closet": (192, 192, 224, 255),
+    "bathroom": (192, 255, 255, 255),  # /washroom
+    "dining room": (224, 255, 192, 255), # livingroom/kitchen/dining room
+    "bedroom": (255, 224, 128, 255),
+    "hall": (255, 160, 96, 255),
+    "balcony": (255, 224, 224, 255),
+    "opening": (255, 60, 128, 255),  # door & window
+    "NaN": (0, 0, 0, 0)  # unused / used as an invalid tile
+}
+# tileMap dict specifies what each RGBA's (r, g, b, a) colour corresponds to as a tile type
+tileMap = {v: k for k, v in rgbMap.items()}
+
+# tileNames list specifies the tile type stored under each tile code in the grid array
+# "NaN" is code 0, so that an empty grid (all zeros) is a grid of invalid tiles
+tileNames = ["NaN"] + [tile for tile in rgbMap if tile != "NaN"]
+# tileCodes dict specifies the tile code of each tile type
+tileCodes = {tile: code for code, tile in enumerate(tileNames)}
+# tilePalette array specifies the RGBA colour of each tile code, as a lookup table
+tilePalette = np.array([rgbMap[tile] for tile in tileNames], dtype=np.uint8)
+
+# tileQuantizer maps any colour to the code of its closest tile colour,
+# trying the tiles in rgbMap order so that ties go to the first tile listed
+tileQuantizer = Quantizer(list(rgbMap.values()), [tileCodes[tile] for tile in rgbMap])
+
+# grids at least this wide walk their lines through the obstruction pyramid, smaller ones pixel by pixel,
+# as skipping the empty cells only pays off once the lines are long
+pyramidMinSize = 256
+
+
 class Grid():
-    """Grid class: a 2-dimensional nparray containing RGBA colours in the form of 4-tuples (r, g, b, a)
+    """Grid class: a 2-dimensional nparray of tile codes,
+    where each code indexes a palette of RGBA colours in the form of 4-tuples (r, g, b, a)
+
+    the first entries of the palette are the tiles of rgbMap (in tileNames order),
+    any other colour populated into the grid is appended to the end of the palette
     """
 
     def __init__(self, sizeX, sizeY):
@@ -24,43 +69,69 @@ class Grid():
         self.sizeX = sizeX
         self.sizeY = sizeY
 
-        # rgbMap dictionary specifying what each type of pixel "tile" corresponds to in RGBA (r, g, b, a)
-        global rgbMap
-        rgbMap = {
-            "wall": (0,  0,  0, 255),
-            "background": (255, 255, 255, 255),
-            "closet": (192, 192, 224, 255),
-            "bathroom": (192, 255, 255, 255),  # /washroom
-            "dining room": (224, 255, 192, 255), # livingroom/kitchen/dining room
-            "bedroom": (255, 224, 128, 255),
-            "hall": (255, 160, 96, 255),
-            "balcony": (255, 224, 224, 255),
-            "opening": (255, 60, 128, 255),  # door & window
-            "NaN": (0, 0, 0, 0)  # unused / used as an invalid tile
-        }
-        # tileMap dict specifies what each RGBA's (r, g, b, a) colour corresponds to as a tile type
-        global tileMap
-        tileMap = {v: k for k, v in rgbMap.items()}
+        # the palette of RGBA colours the tile codes refer to, held once per grid
+        self.resetPalette()
 
         # dictionary containing the opening shapes in the grid
         # opened as empty
         self.openingDict = dict()
+        # the labelled opening shapes, set by findOpenings
+        self.openingLabels = None
+        # the cells each opening can be heard from, set by buildVisibilityIndex
+        self.visibilityIndex = None
+        # the path distance from every cell to each opening, set by buildPropagationField
+        self.propagationField = None
+        # the rooms of the grid and the openings between them, set by buildRoomIndex
+        self.roomIndex = None
+        # the wall and opening tiles as a mask, set by getObstructionMask
+        self.obstructionMask = None
+        # the multi-resolution obstruction mask, set by getObstructionPyramid
+        self.obstructionPyramid = None
 
         # initialise the starting grid
         # create a 2d numpy array of the given size
         self.grid = self.createGrid(sizeX, sizeY)
 
     def createGrid(self, sizeX, sizeY):
-        """Creates the empty grid of a given size
+        """Creates the empty grid of a given size, filled with "NaN" tiles
 
         Args:
             sizeX (int): the horizontal size X of the grid
             sizeY (int): the vertical size Y of the grid
 
         Returns:
-            numpy ndarray: an empty 2D numpy ndarray, ready to contain tuples
+            numpy ndarray: an empty 2D numpy ndarray of uint8 tile codes
+        """
+        return np.zeros((sizeX, sizeY), dtype=np.uint8)
+
+    def resetPalette(self):
+        """resets the grid's palette to only contain the tiles of rgbMap, in tileNames order
+        """
+        self.colours = [rgbMap[tile] for tile in tileNames]
+        self.palette = tilePalette.copy()
+        # reverse lookup of the palette, from RGBA colour to tile code
+        self.colourCodes = {colour: code for code, colour in enumerate(self.colours)}
+
+    def getColourCode(self, rgbaTuple):
+        """returns the tile code of a given colour, 
+        adding the colour to the grid's palette if it is not already part of it
+
+        Args:
+            rgbaTuple (tuple): the RGBA colour as a 4-tuple (r, g, b, a)
+
+        Returns:
+            int: the code of the colour in the grid's palette
         """
-        return np.empty((sizeX, sizeY), dtype=tuple)
+        code = self.colourCodes.get(rgbaTuple)
+        if code is None:
+            code = len(self.colours)
+            self.colours.append(rgbaTuple)
+            self.palette = np.array(self.colours, dtype=np.uint8)
+            self.colourCodes[rgbaTuple] = code
+            # widen the grid's array once the palette no longer fits in a uint8
+            if code > np.iinfo(self.grid.dtype).max:
+                self.grid = self.grid.astype(np.uint32)
+        return code
 
     # function to input a colour into the 2d grid
     def populate(self, locationX, locationY, rgbTuple):
@@ -74,7 +145,7 @@ class Grid():
         """
         if locationX < 0 or locationY < 0:
             raise ValueError("Grid coordinates must be greater than 0")
-        if locationX > self.sizeX or locationY > self.sizeY:
+        if locationX >= self.sizeX or locationY >= self.sizeY:
             raise ValueError(
                 "Grid coordinates must be less than the grid size")
         for value in rgbTuple:
@@ -83,17 +154,82 @@ class Grid():
         if not (len(rgbTuple) == 4 or len(rgbTuple) == 3):
             raise ValueError(
                 "RGBA values must be a 3-tuple (r, g, b) or 4-tuple (r, g, b, a)")
+        rgbTuple = tuple(int(value) for value in rgbTuple)
         if len(rgbTuple) == 3:
             rgbTuple = rgbTuple + (255,)
-            self.grid[locationX, locationY] = rgbTuple
-        else:
-            self.grid[locationX, locationY] = rgbTuple
+        self.grid[locationX, locationY] = self.getColourCode(rgbTuple)
+        self.obstructionMask = None
+
+    def setRGBArray(self, rgbArray):
+        """bulk setter function to set the colour of every pixel of the grid at once,
+        the array's values are validated once for the whole array
+
+        Args:
+            rgbArray (numpy ndarray): a (sizeX, sizeY, 3) RGB or (sizeX, sizeY, 4) RGBA array, indexed [x, y]
+        """
+        rgbArray = np.asarray(rgbArray)
+        if rgbArray.ndim != 3 or rgbArray.shape[:2] != (self.sizeX, self.sizeY):
+            raise ValueError("The RGBA array must be the same size as the grid")
+        if rgbArray.shape[2] not in (3, 4):
+            raise ValueError(
+                "RGBA values must be a 3-tuple (r, g, b) or 4-tuple (r, g, b, a)")
+        if rgbArray.min() < 0 or rgbArray.max() > 255:
+            raise ValueError("RGBA values must be between 0 and 255")
+
+        channels = rgbArray.astype(np.uint32)
+        alpha = channels[:, :, 3] if rgbArray.shape[2] == 4 else np.uint32(255)
+        packed = (channels[:, :, 0] << 24) | (channels[:, :, 1] << 16) | (channels[:, :, 2] << 8) | alpha
+        colours, inverse = np.unique(packed, return_inverse=True)
+
+        # the whole grid is replaced, so only the colours in use are kept in the palette
+        self.resetPalette()
+        self.grid = self.createGrid(self.sizeX, self.sizeY)
+        codes = np.array([self.getColourCode((colour >> 24, (colour >> 16) & 255, (colour >> 8) & 255, colour & 255))
+                          for colour in colours.tolist()])
+        self.grid = codes[inverse].reshape(self.sizeX, self.sizeY).astype(self.grid.dtype)
+        self.obstructionMask = None
+
+    def setTiles(self, tileArray):
+        """bulk setter function to set the tile of every pixel of the grid at once from an array of tile codes
+
+        Args:
+            tileArray (numpy ndarray): a (sizeX, sizeY) array of tile codes (see tileCodes dict), indexed [x, y]
+        """
+        tileArray = np.asarray(tileArray)
+        if tileArray.shape != (self.sizeX, self.sizeY):
+            raise ValueError("The tile array must be the same size as the grid")
+        if tileArray.size > 0 and (tileArray.min() < 0 or tileArray.max() >= len(tileNames)):
+            raise ValueError("Tile codes must be between 0 and " + str(len(tileNames) - 1))
+        self.resetPalette()
+        self.grid = tileArray.astype(np.uint8)
+        self.obstructionMask = None
+
+    def setCodes(self, codeArray, palette=None):
+        """bulk setter function to set the grid's array of codes as it is, without copying it
+        (e.g. so that a memory-mapped array stays memory-mapped)
+
+        Args:
+            codeArray (numpy ndarray): a (sizeX, sizeY) unsigned int array of codes indexed [x, y]
+            palette (numpy ndarray, optional): the (n, 4) RGBA colour of each code, starting with tilePalette. Defaults to tilePalette.
+        """
+        if codeArray.shape != (self.sizeX, self.sizeY):
+            raise ValueError("The code array must be the same size as the grid")
+        self.resetPalette()
+        if palette is not None:
+            if len(palette) < len(tilePalette) or not np.array_equal(palette[:len(tilePalette)], tilePalette):
+                raise ValueError("The palette must start with the tiles of tilePalette")
+            for colour in palette[len(tilePalette):]:
+                self.colourCodes[tuple(int(value) for value in colour)] = len(self.colours)
+                self.colours.append(tuple(int(value) for value in colour))
+            self.palette = np.array(self.colours, dtype=np.uint8)
+        self.grid = codeArray
+        self.obstructionMask = None
 
     def getSelf(self):
-        """returns the current grid instance, i.e. self
+        """returns the current grid's array of tile codes
 
         Returns:
-            Grid: the current grid
+            numpy ndarray: the 2D array of tile codes of the current grid
         """
         return self.grid
 
@@ -114,13 +250,55 @@ class Grid():
         return self.sizeY
 
     def getAsList(self):
-        """returns all of the grid's individual colour tuples as a single list
+        """returns all of the grid's individual tile codes as a single flat array
 
         Returns:
-            list: list containing all the pixel colour values as tuples of the current grid
+            numpy ndarray: flat array containing the tile codes of every pixel of the current grid
         """
         return self.grid.flatten()
 
+    def getRGBAArray(self):
+        """returns the grid as an array of RGBA colours, looked up from the grid's palette
+
+        Returns:
+            numpy ndarray: a (sizeX, sizeY, 4) uint8 array of the RGBA colour of every pixel
+        """
+        return self.palette[self.grid]
+
+    def getObstructionMask(self):
+        """returns a boolean mask of the wall and opening tiles, which obstruct sound,
+        computed once and kept until the grid changes
+
+        Returns:
+            numpy ndarray: a (sizeX, sizeY) boolean array, True where the pixel is a wall or an opening
+        """
+        if self.obstructionMask is None:
+            self.obstructionMask = self.getTileMask("wall", "opening")
+        return self.obstructionMask
+
+    def getObstructionPyramid(self):
+        """returns the max-pooled levels of the obstruction mask (see ObstructionPyramid),
+        built once and kept until the grid changes
+
+        Returns:
+            ObstructionPyramid: the pyramid of the grid's obstruction mask
+        """
+        mask = self.getObstructionMask()
+        if self.obstructionPyramid is None or self.obstructionPyramid.mask is not mask:
+            self.obstructionPyramid = ObstructionPyramid(mask)
+        return self.obstructionPyramid
+
+    def getTileMask(self, *tiles):
+        """returns a boolean mask of the pixels of the grid which are one of the given tile types
+
+        Args:
+            *tiles (string): the tiles to search for (see rgbMap dict for tile list)
+
+        Returns:
+            numpy ndarray: a (sizeX, sizeY) boolean array, True where the pixel is one of the given tiles
+        """
+        return np.isin(self.grid, [tileCodes[tile] for tile in tiles])
+
     def getRGBValue(self, x, y):
         """Returns the RGB value stored within the grid at a given x,y
 
@@ -131,10 +309,7 @@ class Grid():
         Returns:
             tuple: A 4-tuple containing the RGBA colour (r, g, b, a)
         """
-        if self.grid[int(x), int(y)] == None:
-            return rgbMap["NaN"]
-        else:
-            return self.grid[int(x), int(y)]
+        return self.colours[self.grid[int(x), int(y)]]
 
     def averagePixel(self, listOfPixels):
         """returns the center pixel of a shape (a list of pixels)
@@ -170,10 +345,13 @@ class Grid():
         """
         if x < 0 or y < 0:
             raise ValueError("Grid coordinates must be greater than 0")
-        if x > self.getSizeX() or y > self.getSizeY():
+        if x >= self.getSizeX() or y >= self.getSizeY():
             raise ValueError("Grid coordinates must be less than the grid size")
         
-        return tileMap[(self.getRGBValue(x, y))]
+        code = self.grid[int(x), int(y)]
+        if code < len(tileNames):
+            return tileNames[code]
+        return tileMap[self.colours[code]]
 
     def getAdjacentCoords(self, x, y):
         """returns the adjacent pixel to the north, south, east, west of a given coordinate 
@@ -195,7 +373,7 @@ class Grid():
         
         if x < 0 or y < 0:
             raise ValueError("Grid coordinates must be greater than 0")
-        if x > self.getSizeX() or y > self.getSizeY():
+        if x >= self.getSizeX() or y >= self.getSizeY():
             raise ValueError("Grid coordinates must be less than the grid size")
         
         for coord in adjacentCoords:
@@ -217,6 +395,21 @@ class Grid():
             v[0], v[1]) for k, v in self.getAdjacentCoords(x, y).items()}
         return adjacentTiles
 
+    def labelTiles(self, tile, minSize=1):
+        """labels every shape of a searched tile type in a single non-recursive pass, without copying the grid
+
+        a shape is defined as pixels of the same colour touching each other 
+        with Four-Pixel Connectivity (up, down, left, right)
+
+        Args:
+            tile (string): the tile to search as a string (see rgbMap dict for tile list)
+            minSize (int, optional): the smallest amount of pixels a shape can have. Defaults to 1.
+
+        Returns:
+            Components: the label image, pixels, bounding boxes and centroids of each shape
+        """
+        return labelComponents(self.getTileMask(tile), minSize)
+
     def tileSearch(self, tile):
         """returns a 2d list containing all the pixels 
         of each shape of a searched tile type as a sublist
@@ -231,54 +424,156 @@ class Grid():
         Returns:
             list: a 2D list containing each shape as a sublist of its pixels
         """
-        searchGrid = copy.deepcopy(self)
-        resultList = list()
-        for x in range(searchGrid.getSizeX()):
-            for y in range(searchGrid.getSizeY()):
-                if searchGrid.getTileType(x, y) == tile:
-                    adjacentTiles = list(
-                        searchGrid.getAdjacentTiles(x, y).values())
-                    if tile in adjacentTiles:
-                        shapeList = list()
-                        searchGrid.coagulateShape(tile, x, y, shapeList)
-                        resultList.append(shapeList)
-        return resultList
+        return self.labelTiles(tile, minSize=2).asLists()
 
     # returns a list of instances of a tile which are all adjacent to each other
     # i.e. finds a window's individual tiles and returns them as a list
-    def coagulateShape(self, tile, x, y, shapeList=[]):
-        """ Performs a recursive Depth First Search
+    def coagulateShape(self, tile, x, y, shapeList=None):
+        """ Performs an iterative Depth First Search
 
         returns a list of coordinates of a tile which are all adjacent to each other 
         through Four Pixel connectivity (up, down, left, right)
 
         i.e. finds a shape's individual tiles and returns them as a list
+        the shape's tiles are replaced with "NaN" tiles on this grid as they are found
 
         Args:
             tile (string): the tile to search for (see rgbMap dict for tile list)
             x (int): the x coordinate of the starting pixel
             y (int): the y coordinate of the starting pixel
-            shapeList (list): the list that the shape's coordinates will be appended to recursively
+            shapeList (list, optional): the list that the shape's coordinates will be appended to
+
+        Returns:
+            list: the shape's coordinates
+        """
+        if shapeList is None:
+            shapeList = list()
+        code = tileCodes[tile]
+        stack = [(x, y)]
+        while stack:
+            x, y = stack.pop()
+            if not self.grid[x, y] == code:
+                continue
+            self.grid[x, y] = tileCodes["NaN"]
+            self.obstructionMask = None
+            shapeList.append((x, y))
+            # pushed in reverse, so that north is searched first, then east, south and west
+            stack.extend(reversed(list(self.getAdjacentCoords(x, y).values())))
+        return shapeList
+
+    @tracing.traced("Grid.findOpenings")
+    def findOpenings(self):
+        """creates a dict of all the opening objects present in the grid,
+        numbered in the same way as the labels of self.openingLabels
         """
-        # base case
-        if not self.getTileType(x, y) == tile:
-            return
+        self.setOpenings(self.labelTiles("opening", minSize=2))
 
-        # recursive case
-        self.populate(x, y, (0, 0, 0, 0))
-        shapeList.append((x, y))
-        adjacentPixels = list(self.getAdjacentCoords(x, y).values())
-        for pixel in adjacentPixels:
-            self.coagulateShape(tile, pixel[0], pixel[1], shapeList)
+    def setOpenings(self, openingLabels, otherSideTiles=None):
+        """creates the dict of opening objects from already labelled opening shapes
 
-    def findOpenings(self):
-        """creates a dict of all the opening objects present in the grid
+        Args:
+            openingLabels (Components): the labelled opening shapes, as made by labelTiles
+            otherSideTiles (list, optional): the otherSideTiles dict of each opening, in label order (see classifyOpenings). Defaults to classifying the openings.
         """
-        openingList = self.tileSearch("opening")
-        i = 0
-        for sublist in openingList:
-            i += 1
+        self.openingLabels = openingLabels
+        self.openingDict.clear()
+        for i, sublist in enumerate(self.openingLabels.asLists(), start=1):
             self.openingDict[i] = Opening(sublist)
+        # any index of the previous openings is out of date
+        self.visibilityIndex = None
+        self.propagationField = None
+        self.roomIndex = None
+        if otherSideTiles is None:
+            self.classifyOpenings()
+        else:
+            for opening, tiles in zip(self.openingDict.values(), otherSideTiles):
+                for side, tile in tiles.items():
+                    opening.setOtherSideTile(side, tile)
+
+    def classifyOpenings(self):
+        """precomputes the most common tile on the other side of every opening, as seen from each of its sides,
+        so that whether an opening leads outside (a window) or not (a door) is a lookup (see Opening.getOtherSideTile)
+        called by findOpenings
+        """
+        for opening in self.openingDict.values():
+            centerX, centerY = opening.getLocation()
+            # look through the opening from far enough away to be clear of its pixels
+            distance = len(opening.getPixels())
+            for side in opening.getSides():
+                stepX, stepY = {"north": (0, -1), "south": (0, 1), "west": (-1, 0), "east": (1, 0)}[side]
+                opening.setOtherSideTile(side, self.otherSide(centerX + stepX * distance, centerY + stepY * distance,
+                                                              centerX, centerY, len(opening.getPixels())))
+
+    def buildVisibilityIndex(self, eager=None):
+        """precomputes, for every opening, the cells of the grid from which it can be heard unobstructed
+        to be called after findOpenings
+
+        Args:
+            eager (bool, optional): build every opening's mask now, or each the first time it is needed. Defaults to deciding from the index's size.
+
+        Returns:
+            VisibilityIndex: the visibility index of the grid's openings
+        """
+        self.visibilityIndex = VisibilityIndex(self, self.openingDict, eager)
+        return self.visibilityIndex
+
+    def setVisibilityIndex(self, visibilityIndex):
+        """sets an already built visibility index of the grid's openings, e.g. one loaded from a file
+
+        Args:
+            visibilityIndex (VisibilityIndex): the visibility index
+        """
+        self.visibilityIndex = visibilityIndex
+
+    def getVisibilityIndex(self):
+        """returns the visibility index of the grid's openings, if it has been built
+
+        Returns:
+            VisibilityIndex: the visibility index, or None if buildVisibilityIndex has not been called
+        """
+        return self.visibilityIndex
+
+    def buildPropagationField(self, eager=None):
+        """precomputes, for every opening, the length of the path its sound travels around the walls to every cell of the grid
+        to be called after findOpenings
+
+        Args:
+            eager (bool, optional): build every opening's field now, or each the first time it is needed. Defaults to deciding from the fields' size.
+
+        Returns:
+            PropagationField: the propagation field of the grid's openings
+        """
+        self.propagationField = PropagationField(self, self.openingDict, eager)
+        return self.propagationField
+
+    def getPropagationField(self):
+        """returns the propagation field of the grid's openings, if it has been built
+
+        Returns:
+            PropagationField: the propagation field, or None if buildPropagationField has not been called
+        """
+        return self.propagationField
+
+    def buildRoomIndex(self, minSize=1):
+        """finds the rooms of the grid, the room of every cell and the openings between the rooms
+        to be called after findOpenings
+
+        Args:
+            minSize (int, optional): the smallest amount of cells a room can have. Defaults to 1.
+
+        Returns:
+            RoomIndex: the room index of the grid
+        """
+        self.roomIndex = RoomIndex(self, minSize)
+        return self.roomIndex
+
+    def getRoomIndex(self):
+        """returns the room index of the grid, if it has been built
+
+        Returns:
+            RoomIndex: the room index, or None if buildRoomIndex has not been called
+        """
+        return self.roomIndex
 
     def getOpenings(self):
         """returns the dictionary of opening shapes present in the grid
@@ -297,11 +592,16 @@ class Grid():
         Returns:
             int: the number of the given tile present in the grid
         """
-        count = 0
-        for pixel in self.getAsList():
-            if pixel == rgbMap[tile]:
-                count += 1
-        return count
+        return int(np.count_nonzero(self.grid == tileCodes[tile]))
+
+    def getTileCounts(self):
+        """Counts the amount of tiles of every type that exist on the grid in a single pass
+
+        Returns:
+            dict: the number of each tile present in the grid in the format {"wall": int...}
+        """
+        counts = np.bincount(self.grid.ravel(), minlength=len(tileNames))
+        return {tile: int(counts[code]) for code, tile in enumerate(tileNames)}
 
     def getLine(self, startX, startY, endX, endY):
         """finds the line between two coordinates
@@ -360,21 +660,56 @@ class Grid():
 
         # Uses an implementation of Bresenham's algorithm
         # wikiwand.com/en/Bresenham%27s_line_algorithm
+        pixelX, pixelY, offsets = self.linesBetweenPoints(startX, startY, endX, endY)
+        return list(zip(pixelX.tolist(), pixelY.tolist()))
 
-        deltaX, deltaY, xx, xy, yx, yy = self.getLine(
-            startX, startY, endX, endY)
+    def linesBetweenPoints(self, startX, startY, endX, endY):
+        """returns all the pixels of many lines at once, including both their start and end points
+        each line is the same as pixelsBetweenTwoPoints would return
 
-        line = []
-        D = 2*deltaY - deltaX
-        y = 0
+        Args:
+            startX (numpy ndarray or int): the x coordinate of the starting pixel of each line
+            startY (numpy ndarray or int): the y coordinate of the starting pixel of each line
+            endX (numpy ndarray or int): the x coordinate of the end pixel of each line
+            endY (numpy ndarray or int): the y coordinate of the end pixel of each line
 
-        for x in range(deltaX + 1):
-            line.append((startX + x*xx + y*yx, startY + x*xy + y*yy))
-            if D >= 0:
-                y += 1
-                D -= 2*deltaX
-            D += 2*deltaY
-        return line
+        Returns:
+            3 numpy ndarray:
+            pixelX: the x coordinates of the pixels of every line, one line after the other,
+            pixelY: the y coordinates of the pixels of every line, one line after the other,
+            offsets: where each line starts in pixelX and pixelY, followed by their length
+        """
+        return bresenhamLines(startX, startY, endX, endY)
+
+    def countObstructionsInLines(self, startX, startY, endX, endY, ignoreMask=None, ignoreLabels=None, lineLabels=None, stopAtFirst=False):
+        """counts how many wall pixels or opening pixels are on many lines at once,
+        using the grid's obstruction mask, or its obstruction pyramid on grids at least pyramidMinSize wide
+
+        Args:
+            startX (numpy ndarray or int): the x coordinate of the starting pixel of each line
+            startY (numpy ndarray or int): the y coordinate of the starting pixel of each line
+            endX (numpy ndarray or int): the x coordinate of the end pixel of each line
+            endY (numpy ndarray or int): the y coordinate of the end pixel of each line
+            ignoreMask (numpy ndarray, optional): (sizeX, sizeY) boolean array of pixels to ignore on every line. Defaults to None.
+            ignoreLabels (numpy ndarray, optional): (sizeX, sizeY) int array, e.g. openingLabels.labels; pixels with the same label as a line are ignored on that line. Defaults to None.
+            lineLabels (numpy ndarray or int, optional): the label of each line, used with ignoreLabels. Defaults to None.
+            stopAtFirst (bool, optional): stop counting on each line as soon as one obstruction is found. Defaults to False.
+
+        Returns:
+            numpy ndarray: the number of wall or opening tiles on each line (at most 1 when stopAtFirst is set)
+        """
+        for coordinates, size in ((startX, self.getSizeX()), (startY, self.getSizeY()), (endX, self.getSizeX()), (endY, self.getSizeY())):
+            coordinates = np.asarray(coordinates)
+            if coordinates.size > 0 and coordinates.min() < 0:
+                raise ValueError("Grid coordinates must be greater than 0")
+            if coordinates.size > 0 and coordinates.max() >= size:
+                raise ValueError("Grid coordinates must be less than the grid size")
+        blocking = self.getObstructionMask()
+        if ignoreMask is not None:
+            blocking = blocking & ~ignoreMask
+        if max(self.getSizeX(), self.getSizeY()) >= pyramidMinSize:
+            return self.getObstructionPyramid().walkLines(blocking, startX, startY, endX, endY, ignoreLabels, lineLabels, stopAtFirst)
+        return walkLines(blocking, startX, startY, endX, endY, ignoreLabels, lineLabels, stopAtFirst)
 
     # todo: remove OpeningX and openingY, replace with averagePixel()
     def passThroughOpening(self, startX, startY, openingX, openingY, openingListLength):
@@ -418,41 +753,66 @@ class Grid():
             startY (int): the y coordinate of the starting pixel
             openingX (int): the center pixel's x coordinate of an opening shape
             openingY (int): the center pixel's y coordinate of an opening shape
-            openingList (list): the shape in pixels (i.e. the shape as an array)
+            openingList (int): size of the opening shape's list of pixels that it is made up of
 
         Returns:
-            string: the most common tile on the other side of an opening
+            string: the most common tile on the other side of an opening, or "NaN" if it is outside of the grid
         """
         flipsidePixels = self.passThroughOpening(
             startX, startY, openingX, openingY, openingList)
         pixelsToSearch = []
+        searched = set()
         for pixel in flipsidePixels:
             adjacent = self.getAdjacentCoords(pixel[0], pixel[1])
-            for adjacentPixel in adjacent:
-                if adjacent[adjacentPixel] not in pixelsToSearch:
+            for adjacentPixel in adjacent.values():
+                # each pixel is only counted once, even when it is next to both flipside pixels
+                if adjacentPixel not in searched:
+                    searched.add(adjacentPixel)
                     pixelsToSearch.append(self.getTileType(
-                        adjacent[adjacentPixel][0], adjacent[adjacentPixel][1]))
+                        adjacentPixel[0], adjacentPixel[1]))
+        if len(pixelsToSearch) == 0:
+            # the other side of the opening is outside of the grid
+            return "NaN"
         tileCounts = Counter(pixelsToSearch)
         return tileCounts.most_common(1)[0][0]
 
-    def getObstructionsInLine(self, lineAsListOfPixels, pixelsToIgnore=[]):
+    def getFieldOfView(self, x, y, radius=None):
+        """returns the cells that can be seen from a given location in a single sweep over the grid,
+        with wall and opening tiles blocking the view (see fieldOfView)
+
+        Args:
+            x (int): the x coordinate of the location
+            y (int): the y coordinate of the location
+            radius (int, optional): how far the view reaches. Defaults to the whole grid.
+
+        Returns:
+            numpy ndarray: a (sizeX, sizeY) boolean array, True for the visible cells
+        """
+        return fieldOfView(self.getObstructionMask(), x, y, radius)
+
+    def getObstructionsInLine(self, lineAsListOfPixels, pixelsToIgnore=None):
         """function that count how many wall pixels or opening pixels are in a given line on the grid
 
         Args:
             lineAsListOfPixels (list): the list of pixels that make up a line
-            pixelsToIgnore (list, optional): list of pixels to ignore (e.g. the opening's own pixels)
+            pixelsToIgnore (list or numpy ndarray, optional): list of pixels to ignore (e.g. the opening's own pixels)
 
         Returns:
             int: the number of wall or opening tiles encountered in that line
         """
-        obstructionNum = 0
-        searchable = [
-            pixel for pixel in lineAsListOfPixels if pixel not in pixelsToIgnore]
-        for pixel in searchable:
-            # if that pixel is a wall
-            if self.getTileType(pixel[0], pixel[1]) == "wall" or self.getTileType(pixel[0], pixel[1]) == "opening":
-                obstructionNum += 1
-        return obstructionNum
+        if len(lineAsListOfPixels) == 0:
+            return 0
+        line = np.array(lineAsListOfPixels).reshape(-1, 2)
+        if line.min() < 0:
+            raise ValueError("Grid coordinates must be greater than 0")
+        if line[:, 0].max() >= self.getSizeX() or line[:, 1].max() >= self.getSizeY():
+            raise ValueError("Grid coordinates must be less than the grid size")
+        obstructed = self.getObstructionMask()[line[:, 0], line[:, 1]]
+        if pixelsToIgnore is not None and len(pixelsToIgnore) > 0:
+            ignore = np.array(pixelsToIgnore).reshape(-1, 2)
+            obstructed &= ~np.isin(line[:, 0] * (self.getSizeY() + 1) + line[:, 1],
+                                   ignore[:, 0] * (self.getSizeY() + 1) + ignore[:, 1])
+        return int(np.count_nonzero(obstructed))
 
     def rgbDistance(self, start, end):
         """calculate the euclidian distance between two RGB values
@@ -468,33 +828,24 @@ class Grid():
         end = np.array(end)
         return np.linalg.norm(start-end)
 
-    def crushDithering(self, givenGrid):
+    def crushDithering(self, givenGrid, quantizer=None):
         """replaces all colours in the given grid with the closest colour present in rgbMap,
-        using the rgbDistance function
+        using the same euclidian distance as the rgbDistance function
+
+        only the given grid's palette is quantized, the tiles are then remapped with a single array lookup
 
         Args:
             grid (Grid): the grid to crush the dithering on
+            quantizer (Quantizer, optional): the quantizer to use. Defaults to tileQuantizer.
 
         Returns:
             Grid: the crushed grid post-processing
         """
+        if quantizer is None:
+            quantizer = tileQuantizer
         crushedGrid = Grid(givenGrid.getSizeX(), givenGrid.getSizeY())
-        for x in range(0, crushedGrid.getSizeX()):
-            for y in range(0, crushedGrid.getSizeY()):
-                closestColour = None
-                closestDistance = (256*256*256*256+1)
-                for colour in rgbMap:
-                    distance = givenGrid.rgbDistance(
-                        givenGrid.grid[x, y], rgbMap.get(colour))
-                    if distance < float(closestDistance):
-                        closestDistance = distance
-                        closestColour = colour
-
-                rgb = rgbMap.get(closestColour, (255, 255, 255, 255))
-                crushedGrid.populate(x, y, rgb)
-
+        crushedGrid.grid = quantizer.quantize(givenGrid.palette)[givenGrid.grid]
         return crushedGrid
 
-
 if __name__ == "__main__":
     pass
@@ -0,0 +1,131 @@
+import numpy as np
+
+# batched versions of the Bresenham lines of Grid.pixelsBetweenTwoPoints,
+# working on arrays of start and end points at once
+
+
+def lineSteps(startX, startY, endX, endY):
+    """computes the direction of each line, as Grid.getLine does for a single line
+
+    Args:
+        startX (numpy ndarray): the x coordinate of the starting pixel of each line
+        startY (numpy ndarray): the y coordinate of the starting pixel of each line
+        endX (numpy ndarray): the x coordinate of the end pixel of each line
+        endY (numpy ndarray): the y coordinate of the end pixel of each line
+
+    Returns:
+        6 numpy ndarray: deltaX, deltaY, xx, xy, yx, yy for every line (see Grid.getLine)
+    """
+    deltaX = endX - startX
+    deltaY = endY - startY
+    signX = np.where(deltaX > 0, 1, -1)
+    signY = np.where(deltaY > 0, 1, -1)
+    deltaX, deltaY = np.abs(deltaX), np.abs(deltaY)
+    steep = ~(deltaX > deltaY)
+    xx = np.where(steep, 0, signX)
+    xy = np.where(steep, signY, 0)
+    yx = np.where(steep, signX, 0)
+    yy = np.where(steep, 0, signY)
+    deltaX, deltaY = np.where(steep, deltaY, deltaX), np.where(steep, deltaX, deltaY)
+    return deltaX, deltaY, xx, xy, yx, yy
+
+
+def toLineArrays(startX, startY, endX, endY):
+    """broadcasts the start and end points of the lines to flat int64 arrays of the same length
+
+    Returns:
+        4 numpy ndarray: startX, startY, endX, endY
+    """
+    arrays = np.broadcast_arrays(*(np.asarray(value, dtype=np.int64) for value in (startX, startY, endX, endY)))
+    return tuple(array.ravel() for array in arrays)
+
+
+def bresenhamLines(startX, startY, endX, endY):
+    """returns all the pixels of many lines at once, including both their start and end points
+    the pixels are the same as Grid.pixelsBetweenTwoPoints, in the same order
+
+    Args:
+        startX (numpy ndarray or int): the x coordinate of the starting pixel of each line
+        startY (numpy ndarray or int): the y coordinate of the starting pixel of each line
+        endX (numpy ndarray or int): the x coordinate of the end pixel of each line
+        endY (numpy ndarray or int): the y coordinate of the end pixel of each line
+
+    Returns:
+        3 numpy ndarray:
+        pixelX: the x coordinates of the pixels of every line, one line after the other,
+        pixelY: the y coordinates of the pixels of every line, one line after the other,
+        offsets: where each line starts in pixelX and pixelY, followed by their length,
+        i.e. line i is pixelX[offsets[i]:offsets[i+1]]
+    """
+    startX, startY, endX, endY = toLineArrays(startX, startY, endX, endY)
+    deltaX, deltaY, xx, xy, yx, yy = lineSteps(startX, startY, endX, endY)
+    lengths = deltaX + 1
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    line = np.repeat(np.arange(len(lengths)), lengths)
+    # the step along each line, and the matching step across it
+    # the error term of Bresenham's algorithm steps across whenever this floor goes up by one
+    step = np.arange(offsets[-1]) - offsets[line]
+    across = (2 * step * deltaY[line] + deltaX[line]) // np.maximum(2 * deltaX[line], 1)
+    pixelX = startX[line] + step * xx[line] + across * yx[line]
+    pixelY = startY[line] + step * xy[line] + across * yy[line]
+    return pixelX, pixelY, offsets
+
+
+def walkLines(blocking, startX, startY, endX, endY, labels=None, lineLabels=None, stopAtFirst=False):
+    """walks many lines (the same as bresenhamLines) at once, one step at a time,
+    counting the blocking pixels on each line
+
+    Args:
+        blocking (numpy ndarray): 2D boolean array, True for the pixels that block a line
+        startX (numpy ndarray or int): the x coordinate of the starting pixel of each line
+        startY (numpy ndarray or int): the y coordinate of the starting pixel of each line
+        endX (numpy ndarray or int): the x coordinate of the end pixel of each line
+        endY (numpy ndarray or int): the y coordinate of the end pixel of each line
+        labels (numpy ndarray, optional): 2D int array, pixels with the same label as a line do not block it. Defaults to None.
+        lineLabels (numpy ndarray, optional): the label of each line, used with labels. Defaults to None.
+        stopAtFirst (bool, optional): stop walking each line as soon as one blocking pixel is found. Defaults to False.
+
+    Returns:
+        numpy ndarray: the number of blocking pixels on each line (at most 1 when stopAtFirst is set)
+    """
+    startX, startY, endX, endY = toLineArrays(startX, startY, endX, endY)
+    deltaX, deltaY, xx, xy, yx, yy = lineSteps(startX, startY, endX, endY)
+    flatBlocking = np.ascontiguousarray(blocking).ravel()
+    sizeY = blocking.shape[1]
+    if labels is not None:
+        flatLabels = np.ascontiguousarray(labels).ravel()
+        lineLabels = np.broadcast_to(np.asarray(lineLabels), startX.shape).copy()
+
+    # the state of the lines that are not finished yet, compacted as lines drop out
+    lines = np.arange(startX.size)
+    pixelX, pixelY = startX.copy(), startY.copy()
+    D = 2 * deltaY - deltaX
+    counts = np.zeros(startX.size, dtype=np.int64)
+    x = 0
+    while lines.size > 0:
+        pixels = pixelX * sizeY + pixelY
+        hit = flatBlocking[pixels]
+        if labels is not None:
+            hit &= flatLabels[pixels] != lineLabels
+        counts[lines] += hit
+        keep = x < deltaX
+        if stopAtFirst:
+            keep &= ~hit
+        if not keep.all():
+            lines, pixelX, pixelY, deltaX, deltaY, D = lines[keep], pixelX[keep], pixelY[keep], deltaX[keep], deltaY[keep], D[keep]
+            xx, xy, yx, yy = xx[keep], xy[keep], yx[keep], yy[keep]
+            if labels is not None:
+                lineLabels = lineLabels[keep]
+        # one step along the line, and one step across it whenever the error term says so
+        step = D >= 0
+        pixelX += xx + step * yx
+        pixelY += xy + step * yy
+        D += 2 * deltaY - step * 2 * deltaX
+        x += 1
+    return counts
+
+
+if __name__ == "__main__":
+    pass
@@ -1,43 +1,233 @@
 import os
+import time
+import numpy as np
 from PIL import Image
 from PIL.ImageFilter import (
     GaussianBlur
     )
-from .grid import Grid
+from . import tracing
+from .grid import Grid, tileCodes, tilePalette, tileQuantizer
+from .planStore import loadPlan
+
+# modelTileCodes array specifies the tile code of each class of the DeepFloorPlan model's label map, as a lookup table
+# (see floorplan_map in demo.py, classes 7 and 8 are not used and drawn as background)
+modelTileCodes = np.array([tileCodes[tile] for tile in ["background", "closet", "bathroom", "dining room", "bedroom", "hall", "balcony",
+                                                       "background", "background", "opening", "wall"]], dtype=np.uint8)
 
 class MapGenerator:
     """MapGenerator class
         takes the output of the DeepFloorPlan model and converts it to an image compatible with the grid
         populates the grid with the data from the DeepFloorPlan model
         contains functions to generate the grid from either the model output or an example
+
+        the model output goes through a pipeline of in-memory stages, each passing an array to the next:
+        ingest -> blur -> quantize -> downsample -> requantize -> grid
+        the model's label map can instead be given straight to createFromLabels, skipping the RGB stages:
+        labels -> downsample -> requantize -> grid
     """    
-    def __init__(self, finalSize = 128):
+    def __init__(self, finalSize = 128, outputDirectory = None, debug = False, blurBeforeQuantizing = False):
+        """MapGenerator class __init__
+
+        Args:
+            finalSize (int, optional): the size of the final grid. Defaults to 128.
+            outputDirectory (str, optional): directory the model output is read from and the debug images are written to. Defaults to the map package's directory.
+            debug (bool, optional): save the output of the pipeline stages as PNG images in the output directory. Defaults to False.
+            blurBeforeQuantizing (bool, optional): quantize the blurred model output rather than the model output itself. Defaults to False.
+        """
         # resize the image to be axa size where a = 128
         # assumes that the output of the DeepFloorPlan model is a 512x512 image
         self.workingGridSize = 512
         # default final size is 128x128
         self.finalSize = finalSize
-        #get parent directory:
-        self.parentDirectory = os.path.abspath(os.path.join(os.getcwd(), os.pardir))
-        self.currentDirectory = os.path.abspath(os.getcwd())
+        # the bundled images (example.png, the hat icons...) live next to this file
+        self.mapDirectory = os.path.dirname(os.path.abspath(__file__))
+        if outputDirectory is None:
+            outputDirectory = self.mapDirectory
+        self.outputDirectory = outputDirectory
+        self.debug = debug
+        # the blur stage has always saved blurredGrid.png without its result being used,
+        # so by default the unblurred image is passed on to keep the resulting grid the same
+        self.blurBeforeQuantizing = blurBeforeQuantizing
+        # the images saved by each stage when debugging
+        self.debugFilenames = {"blur": "blurredGrid.png",
+                               "downsample": "crushedGrid.png",
+                               "requantize": "saved.png"}
+        # the pipeline's stages, in order
+        self.stages = [("ingest", self.ingest),
+                       ("blur", self.blur),
+                       ("quantize", self.quantize),
+                       ("downsample", self.downsample),
+                       ("requantize", self.requantize),
+                       ("grid", self.toGrid)]
+        # the pipeline's stages from the model's label map
+        self.labelStages = [("labels", self.labelsToTiles),
+                            ("downsample", self.downsample),
+                            ("requantize", self.requantize),
+                            ("grid", self.toGrid)]
+        self.image = None
+        # how many seconds each stage took during the last create()
+        self.timings = dict()
         
         
-    def create(self):
-        """main function to convert the DeepFloorPlan output to an image compatible with the grid
+    def create(self, floorplan = None):
+        """main function to convert the DeepFloorPlan output to an image compatible with the grid,
+        by running it through each stage of the pipeline in memory
+
+        Args:
+            floorplan (str, Image or numpy ndarray, optional): the model output as an image path, image, or array indexed [x, y]. Defaults to result.png in the output directory.
         """        
-        # create the grid based on the model output
-        self.createGrid(filename="result.png")
-        # populate the empty grid with the model output RGB values
-        self.grid = self.populateGrid(self.floorplan.size[0], self.grid, self.floorplan)
-        # Gaussian Blur to remove jpg noise, and to fix overfitting of the tiles
-        self.blurGrid()
-        # first replaces all pixel colours with the closest tile colour, then shrinks the grid to final size 
-        self.fixNoise()
-        # replaces all pixel colours on the final size grid with the closest tile colour to further reduce blur noise from shrinkage
-        self.crushDitheringTwice()     
-        # populates the final grid with the RGB values of the final image
-        self.createFromSaveFile()
-        self.floorplan.close()   
+        if floorplan is None:
+            floorplan = os.path.join(self.outputDirectory, "result.png")
+        with tracing.span("MapGenerator.create"):
+            self.runStages(self.stages, floorplan)
+
+    def createFromLabels(self, labels):
+        """converts the DeepFloorPlan model's label map to the grid in memory,
+        looking up the tile of each class rather than drawing the classes in colour and quantizing the colours back
+
+        the resulting grid is the same as create() on the label map drawn with demo.ind2rgb
+
+        Args:
+            labels (numpy ndarray): the model's merged label map (see demo.merge_results), indexed [x, y] like the grid
+        """
+        with tracing.span("MapGenerator.createFromLabels"):
+            self.runStages(self.labelStages, labels)
+
+    def runStages(self, stages, data):
+        """runs data through the given stages, timing each of them, then keeps the final grid and its image
+
+        Args:
+            stages (list): the (name, stage function) of each stage, in order
+            data: the input of the first stage
+        """
+        self.timings = dict()
+        for name, stage in stages:
+            start = time.perf_counter()
+            with tracing.span("MapGenerator." + name):
+                data = stage(data)
+            self.timings[name] = time.perf_counter() - start
+            if self.debug and name in self.debugFilenames:
+                self.saveDebugImage(name, data)
+        self.grid = data
+        # keep the final image, e.g. for displaying it
+        self.image = self.arrayToImage(self.grid.getRGBAArray())
+
+    def ingest(self, floorplan):
+        """first stage: loads the DeepFloorPlan model output
+
+        Args:
+            floorplan (str, Image or numpy ndarray): the model output as an image path, image, or array indexed [x, y]
+
+        Returns:
+            numpy ndarray: the model output as an RGB or RGBA array indexed [x, y]
+        """
+        if isinstance(floorplan, np.ndarray):
+            return floorplan
+        if isinstance(floorplan, Image.Image):
+            return self.imageToArray(floorplan)
+        with Image.open(floorplan) as image:
+            return np.array(self.imageToArray(image))
+
+    def labelsToTiles(self, labels):
+        """first stage from a label map: replaces the model's classes with their tile codes
+
+        Args:
+            labels (numpy ndarray): the model's label map, indexed [x, y]
+
+        Returns:
+            numpy ndarray: the array of tile codes
+        """
+        labels = np.asarray(labels)
+        if labels.ndim != 2:
+            raise ValueError("The label map must be a 2D array of the model's classes")
+        if labels.size > 0 and (labels.min() < 0 or labels.max() >= len(modelTileCodes)):
+            raise ValueError("The model's classes must be between 0 and " + str(len(modelTileCodes) - 1))
+        return modelTileCodes[labels]
+
+    def blur(self, rgbArray):
+        """second stage: Gaussian Blur to remove jpg noise, and to fix overfitting of the tiles
+
+        Args:
+            rgbArray (numpy ndarray): the model output as an RGB or RGBA array indexed [x, y]
+
+        Returns:
+            numpy ndarray: the blurred RGB array if blurBeforeQuantizing is set, otherwise the given array
+        """
+        if not (self.blurBeforeQuantizing or self.debug):
+            return rgbArray
+        blurred = self.arrayToImage(rgbArray).filter(GaussianBlur(radius=1))
+        if self.debug:
+            blurred.save(os.path.join(self.outputDirectory, self.debugFilenames["blur"]))
+        if self.blurBeforeQuantizing:
+            return self.imageToArray(blurred)
+        return rgbArray
+
+    def quantize(self, rgbArray):
+        """third stage: replaces all pixel colours with the code of the closest tile colour
+
+        Args:
+            rgbArray (numpy ndarray): an RGB or RGBA array indexed [x, y]
+
+        Returns:
+            numpy ndarray: the array of tile codes
+        """
+        return tileQuantizer.quantize(rgbArray)
+
+    def downsample(self, tileArray):
+        """fourth stage: shrinks the tiles to the final size, averaging their colours
+
+        Args:
+            tileArray (numpy ndarray): an array of tile codes indexed [x, y]
+
+        Returns:
+            numpy ndarray: the (finalSize, finalSize, 3) RGB array of the shrunk tiles
+        """
+        tileImage = self.arrayToImage(tilePalette[tileArray])
+        return self.imageToArray(tileImage.resize((self.finalSize, self.finalSize), Image.BOX))
+
+    def requantize(self, rgbArray):
+        """fifth stage: replaces all pixel colours on the final size grid with the closest tile colour 
+        to further reduce blur noise from shrinkage
+
+        Args:
+            rgbArray (numpy ndarray): an RGB or RGBA array indexed [x, y]
+
+        Returns:
+            numpy ndarray: the array of tile codes
+        """
+        return tileQuantizer.quantize(rgbArray)
+
+    def toGrid(self, tileArray):
+        """last stage: creates the final grid from the tile codes
+
+        Args:
+            tileArray (numpy ndarray): an array of tile codes indexed [x, y]
+
+        Returns:
+            Grid: the final grid
+        """
+        grid = Grid(tileArray.shape[0], tileArray.shape[1])
+        grid.setTiles(tileArray)
+        return grid
+
+    def saveDebugImage(self, stage, data):
+        """saves the output of a pipeline stage as a PNG image in the output directory
+
+        Args:
+            stage (string): the name of the stage
+            data (numpy ndarray): the stage's output, either an RGB(A) array or an array of tile codes
+        """
+        if data.ndim == 2:
+            data = tilePalette[data]
+        self.arrayToImage(data).save(os.path.join(self.outputDirectory, self.debugFilenames[stage]))
+
+    def getImage(self):
+        """returns the image of the final grid made by create()
+
+        Returns:
+            Image: the RGB image of the final grid
+        """
+        return self.image
         
     def createFromSaveFile(self, example = False):
         """populates the final grid with the RGB values of either the example image or the cleaned DeepFloorPlan model output image
@@ -49,89 +239,90 @@ class MapGenerator:
             self.createGrid(fromMemory=True, filename="example.png")
         else:
             self.createGrid(fromMemory=False, filename="saved.png")
-        self.grid = self.populateGrid(self.finalSize, self.grid, self.floorplan)
+        self.grid = self.populateGrid(None, self.grid, self.floorplan)
         self.floorplan.close()
         
+    def createFromPlanFile(self, path):
+        """loads the final grid, its openings and their indexes from a plan saved by planStore.savePlan,
+        instead of rebuilding them from an image
+
+        Args:
+            path (str): the .npz file or directory the plan was saved to
+        """
+        self.grid = loadPlan(path)
+        self.image = self.arrayToImage(self.grid.getRGBAArray())
+
     # not used
     def saveAsPNG(self):
         """get output of the DeepFloorPlan and save it as png
         """        
-        colouredFloorPlan = Image.open(os.path.join(os.getcwd(), "map", "result.jpg"))
-        colouredFloorPlan.save(os.path.join(os.getcwd(), "map", "result.png"))
+        colouredFloorPlan = Image.open(os.path.join(self.outputDirectory, "result.jpg"))
+        colouredFloorPlan.save(os.path.join(self.outputDirectory, "result.png"))
         colouredFloorPlan.close()
 
     def createGrid(self, fromMemory = False, filename = "example.png"):
         """create a grid from either the DeepFloorPlan model output or an example image
 
         Args:
-            fromMemory (bool, optional): indicate whether an image different from the DeepFloorPlan model output is going to be used as the grid source data. Defaults to False.
+            fromMemory (bool, optional): indicate whether a bundled image (from the map package) rather than one from the output directory is going to be used as the grid source data. Defaults to False.
             filename (str, optional): file name of the custom image to use. Defaults to "example.png".
         """        
         if fromMemory == True:
-            path = os.path.join("map", filename)
-            self.floorplan = Image.open(path)
-            
-            self.grid = Grid(self.floorplan.size[0], self.floorplan.size[0])
+            self.floorplan = Image.open(os.path.join(self.mapDirectory, filename))
         else:
-            self.floorplan = Image.open(os.path.join("map",filename))
-            self.grid = Grid(self.floorplan.size[0], self.floorplan.size[1])
+            self.floorplan = Image.open(os.path.join(self.outputDirectory, filename))
+        self.grid = Grid(self.floorplan.size[0], self.floorplan.size[1])
             
 
+    def imageToArray(self, image):
+        """converts an image to an RGB or RGBA array indexed [x, y] like the grid, in a single step
+
+        Args:
+            image (Image): the image to convert
+
+        Returns:
+            numpy ndarray: a (width, height, 3) RGB or (width, height, 4) RGBA uint8 array
+        """
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        # images are stored as rows of pixels, i.e. indexed [y, x]
+        return np.asarray(image).transpose(1, 0, 2)
+
+    def arrayToImage(self, rgbArray):
+        """converts an RGB or RGBA array indexed [x, y] like the grid back to an RGB image
+
+        Args:
+            rgbArray (numpy ndarray): a (width, height, 3) RGB or (width, height, 4) RGBA array
+
+        Returns:
+            Image: the RGB image of the array
+        """
+        return Image.fromarray(np.ascontiguousarray(rgbArray[:, :, :3].transpose(1, 0, 2)), 'RGB')
+
     def populateGrid(self, gridsize, givenGrid, image):
-        """populate the grid with the RGB values of the given image
+        """populate the grid with the RGB values of the given image,
+        converting the whole image to an array at once
 
         Args:
-            gridsize (int): size of the grid to populate
+            gridsize (int): size of the square area of the grid to populate, or None to populate the whole grid
             givenGrid (grid): grid to populate
             image (Image): image to use as source data
 
         Returns:
             givenGrid: populated grid
         """        
-        for x in range(0, gridsize):
-            for y in range(0, gridsize):
-                givenGrid.populate(x, y, image.getpixel((x,y)))
+        rgbArray = self.imageToArray(image)
+        if gridsize is None:
+            rgbArray = rgbArray[:givenGrid.getSizeX(), :givenGrid.getSizeY()]
+            givenGrid.setRGBArray(rgbArray)
+        else:
+            # only the top left gridsize x gridsize square is populated
+            rgbaArray = givenGrid.getRGBAArray()
+            rgbaArray[:gridsize, :gridsize, :3] = rgbArray[:gridsize, :gridsize, :3]
+            rgbaArray[:gridsize, :gridsize, 3] = rgbArray[:gridsize, :gridsize, 3] if rgbArray.shape[2] == 4 else 255
+            givenGrid.setRGBArray(rgbaArray)
         return givenGrid
-                
-    def blurGrid(self):
-        """Gaussian Blur to remove jpg noise, and to fix overfitting of the tiles
-            saves to file blurredGrid.png
-        """        
-        printedGrid = Image.new('RGB', (self.workingGridSize, self.workingGridSize))
-        printedGrid.putdata(self.grid.getAsList())
-        adjustedGrid = printedGrid.rotate(90).transpose(Image.FLIP_TOP_BOTTOM).filter(GaussianBlur(radius=1))
-        adjustedGrid.save(os.path.join("map","blurredGrid.png"))
-    
-    def fixNoise(self):
-        """first replaces all pixel colours with the closest tile colour, then shrinks the grid to final size
-            saves to file crushedGrid.png
-        """        
-        self.crushedGrid = self.grid.crushDithering(self.grid)
-        self.grid = self.crushedGrid
-        printedCrushedGrid = Image.new('RGB', (self.workingGridSize, self.workingGridSize))
-        printedCrushedGrid.putdata(self.crushedGrid.getAsList())
-        # also rotates and transposes the image to handle having put the data in as a list 
-        printedCrushedGrid = printedCrushedGrid.rotate(90).transpose(Image.FLIP_TOP_BOTTOM).resize((self.finalSize, self.finalSize), Image.BOX)
-        printedCrushedGrid.save(os.path.join("map","crushedGrid.png"))
-
-    def crushDitheringTwice(self):
-        """ second time around, to reduce the blur noise from the first time around
-            saves to file saved.png
-        """        
-        printedCrushedGrid = Image.open(os.path.join("map","crushedGrid.png"))
-        # create the empty grid
-        crushed2Grid = Grid(self.finalSize, self.finalSize)
-        # populate it
-        self.grid = self.populateGrid(self.finalSize, crushed2Grid, printedCrushedGrid)
-        # crush dithering again
-        twiceCrushedGrid = crushed2Grid.crushDithering(crushed2Grid)
-        printed2xCrushedGrid = Image.new('RGB', (self.finalSize, self.finalSize))
-        printed2xCrushedGrid.putdata(twiceCrushedGrid.getAsList())
-        # rotates and transposes the image to handle having put the data in as a list 
-        printed2xCrushedGrid = printed2xCrushedGrid.rotate(90).transpose(Image.FLIP_TOP_BOTTOM)
-        printed2xCrushedGrid.save(os.path.join("map","saved.png"))
-        # set the final self.floorplan to the final version of the image 
-        self.floorplan = printed2xCrushedGrid
+
 
 if __name__ == "__main__":
     pass
@@ -10,7 +10,19 @@ class Opening():
     def __init__(self, listedPixels):
         self.listedPixels = listedPixels
         self.centerPixel = self.averagePixel()
+        # the orientation and sides are found once, so that finding the side of a location is a single comparison
+        self.orientation = self.findOrientation()
+        if self.orientation == "horizontal":
+            self.sides = ("north", "south")
+            # a horizontal opening is approached along y, a vertical one along x
+            self.sideAxis = 1
+        else:
+            self.sides = ("west", "east")
+            self.sideAxis = 0
         self.soundSource = None
+        # the most common tile on the other side of the opening, as seen from each of its sides
+        # set by Grid.classifyOpenings
+        self.otherSideTiles = dict()
         
         
     
@@ -48,6 +60,71 @@ class Opening():
         """        
         return self.listedPixels
     
+    def findOrientation(self):
+        """finds whether this opening runs across the grid horizontally (along x) or vertically (along y) from its pixels
+
+        Returns:
+            string: "horizontal" or "vertical"
+        """        
+        x = [pixel[0] for pixel in self.listedPixels]
+        y = [pixel[1] for pixel in self.listedPixels]
+        if max(x) - min(x) >= max(y) - min(y):
+            return "horizontal"
+        return "vertical"
+
+    def getOrientation(self):
+        """returns whether this opening runs across the grid horizontally (along x) or vertically (along y)
+
+        Returns:
+            string: "horizontal" or "vertical"
+        """        
+        return self.orientation
+
+    def getSides(self):
+        """returns the two sides of this opening, i.e. the directions it can be approached from
+
+        Returns:
+            tuple: ("north", "south") for a horizontal opening, ("west", "east") for a vertical one
+        """        
+        return self.sides
+
+    def getSide(self, x, y):
+        """returns which side of this opening a given location is on
+
+        Args:
+            x (int): the x coordinate of the location
+            y (int): the y coordinate of the location
+
+        Returns:
+            string: "north", "south", "west" or "east", or None if the location is in line with the opening
+        """        
+        offset = (x, y)[self.sideAxis] - self.centerPixel[self.sideAxis]
+        if offset == 0:
+            return None
+        return self.sides[offset > 0]
+
+    def setOtherSideTile(self, side, tile):
+        """sets the tile on the other side of this opening, as seen from one of its sides
+
+        Args:
+            side (string): the side the opening is seen from (see getSides)
+            tile (string): the most common tile on the other side (see rgbMap dict for tile list)
+        """        
+        self.otherSideTiles[side] = tile
+
+    def getOtherSideTile(self, x, y):
+        """returns the tile on the other side of this opening as seen from a given location, 
+        looked up from the classification made by Grid.classifyOpenings
+
+        Args:
+            x (int): the x coordinate of the location
+            y (int): the y coordinate of the location
+
+        Returns:
+            string: the most common tile on the other side, or None if it has not been classified from that side
+        """        
+        return self.otherSideTiles.get(self.getSide(x, y))
+
     def setSoundSource(self, source):
         """sets the sound source of this opening
 
@@ -0,0 +1,155 @@
+import os
+import numpy as np
+from .components import Components
+from .grid import Grid, tileCodes, tileNames
+from .visibility import VisibilityIndex
+
+# saving and loading a processed plan, i.e. a grid with its openings and their indexes,
+# so that it does not need to be rebuilt from an image
+
+# the version of the plan format, stored in every plan and checked when loading
+planFormatVersion = 2
+
+# the arrays of the plan format: those of every plan, those of a plan with openings, and the visibility index
+planArrays = ("version", "codes", "palette", "hasOpenings", "hasVisibility")
+openingArrays = ("labels", "pixels", "otherSideTiles")
+visibilityArrays = ("visibility",)
+
+
+def planToArrays(grid, includeVisibility=True):
+    """converts a grid, its openings and their indexes to the arrays of the plan format
+
+    Args:
+        grid (Grid): the grid to convert
+        includeVisibility (bool, optional): include the visibility index, if the grid has one. Defaults to True.
+
+    Returns:
+        dict: the arrays of the plan, by name
+    """
+    arrays = {"version": np.array(planFormatVersion),
+              "codes": grid.getSelf(),
+              "palette": grid.palette,
+              "hasOpenings": np.array(grid.openingLabels is not None),
+              "hasVisibility": np.array(False)}
+    if grid.openingLabels is not None:
+        openings = list(grid.getOpenings().values())
+        arrays["labels"] = grid.openingLabels.labels
+        arrays["pixels"] = grid.openingLabels.pixels
+        # the tile code on the other side of each opening, from each of its sides (see Opening.getSides), -1 if unknown
+        arrays["otherSideTiles"] = np.array([[tileCodes.get(opening.otherSideTiles.get(side), -1) for side in opening.getSides()]
+                                             for opening in openings], dtype=np.int8).reshape(-1, 2)
+        visibility = grid.getVisibilityIndex()
+        if includeVisibility and visibility is not None:
+            arrays["hasVisibility"] = np.array(True)
+            arrays["visibility"] = np.array([visibility.getMask(key) for key in grid.getOpenings()], dtype=bool).reshape(-1, grid.getSizeX(), grid.getSizeY())
+    return arrays
+
+
+def savePlan(path, grid, includeVisibility=True):
+    """saves a grid, its openings and their indexes
+
+    a path ending in .npz is saved as a single compressed file,
+    any other path as a directory of .npy files, which can be memory-mapped when loaded
+
+    Args:
+        path (str): the .npz file or directory to save the plan to
+        grid (Grid): the grid to save
+        includeVisibility (bool, optional): include the visibility index, if the grid has one. Defaults to True.
+    """
+    arrays = planToArrays(grid, includeVisibility)
+    if path.endswith(".npz"):
+        np.savez_compressed(path, **arrays)
+        return
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, name + ".npy"), array)
+    # the arrays of a plan saved to the directory before, that this plan does not have, would belong to the wrong grid
+    for name in planArrays + openingArrays + visibilityArrays:
+        stalePath = os.path.join(path, name + ".npy")
+        if name not in arrays and os.path.exists(stalePath):
+            os.remove(stalePath)
+
+
+def readArrays(plan, names, mmap):
+    """reads arrays of the plan format from an opened .npz plan or a directory plan
+
+    Args:
+        plan (NpzFile or str): the opened .npz file, or the directory the plan was saved to
+        names (tuple): the names of the arrays to read
+        mmap (bool): memory-map the arrays of a directory
+
+    Returns:
+        dict: the arrays, by name, copied out of the .npz file so that it can be closed
+    """
+    try:
+        if isinstance(plan, str):
+            return {name: np.load(os.path.join(plan, name + ".npy"), mmap_mode="c" if mmap else None) for name in names}
+        return {name: plan[name] for name in names}
+    except (KeyError, FileNotFoundError) as error:
+        raise ValueError("The plan is missing an array of the plan format: " + str(error)) from error
+
+
+def loadPlan(path, mmap=True):
+    """loads a grid, its openings and their indexes saved by savePlan,
+    without labelling, classifying or indexing the openings again
+
+    Args:
+        path (str): the .npz file or directory the plan was saved to
+        mmap (bool, optional): memory-map the arrays of a directory, so that they are only read from disk when used
+            (changes to the grid are kept in memory and not written back). Defaults to True.
+
+    Returns:
+        Grid: the loaded grid, with its openings, and its visibility index if it was saved
+    """
+    if os.path.isdir(path):
+        return arraysToPlan(path, mmap)
+    with np.load(path) as plan:
+        return arraysToPlan(plan, mmap)
+
+
+def arraysToPlan(plan, mmap):
+    """creates the grid of a plan from the arrays of the plan format, reading only the arrays the plan has
+
+    Args:
+        plan (NpzFile or str): the opened .npz file, or the directory the plan was saved to
+        mmap (bool): memory-map the arrays of a directory
+
+    Returns:
+        Grid: the loaded grid, with its openings, and its visibility index if it was saved
+    """
+    try:
+        version = int(readArrays(plan, ("version",), mmap)["version"])
+    except ValueError:
+        version = None
+    if version != planFormatVersion:
+        raise ValueError("The plan was not saved in version " + str(planFormatVersion) + " of the plan format")
+    arrays = readArrays(plan, planArrays, mmap)
+    if bool(arrays["hasOpenings"]):
+        arrays.update(readArrays(plan, openingArrays, mmap))
+        if bool(arrays["hasVisibility"]):
+            arrays.update(readArrays(plan, visibilityArrays, mmap))
+
+    codes = arrays["codes"]
+    grid = Grid(codes.shape[0], codes.shape[1])
+    grid.setCodes(codes, arrays["palette"])
+    if bool(arrays["hasOpenings"]):
+        labels = arrays["labels"]
+        pixels = np.asarray(arrays["pixels"])
+        pixelLabels = labels[pixels[:, 0], pixels[:, 1]]
+        # the openings are classified from the saved tiles rather than from the grid
+        grid.setOpenings(Components(labels, pixels, pixelLabels), otherSideTiles=[])
+        for opening, sideCodes in zip(grid.getOpenings().values(), arrays["otherSideTiles"].tolist()):
+            for side, code in zip(opening.getSides(), sideCodes):
+                if code >= 0:
+                    opening.setOtherSideTile(side, tileNames[code])
+        if bool(arrays["hasVisibility"]):
+            visibility = arrays["visibility"]
+            index = VisibilityIndex(grid, grid.getOpenings(), eager=False)
+            for i, key in enumerate(grid.getOpenings()):
+                index.setMask(key, visibility[i])
+            grid.setVisibilityIndex(index)
+    return grid
+
+
+if __name__ == "__main__":
+    pass
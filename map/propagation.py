@@ -0,0 +1,154 @@
+import time
+import numpy as np
+
+# the path distance of the cells an opening's sound cannot reach
+unreachable = np.iinfo(np.uint16).max
+
+
+class PropagationField():
+    """PropagationField class
+        for every opening of a grid, the length of the shortest path its sound travels to every cell of the grid,
+        going around walls and the other openings rather than through them, so that an opening around a corner is still heard
+        the paths move between side-adjacent cells, so their length is in cells, and cells the sound cannot reach are unreachable
+
+        the fields are built once with a breadth-first search from all of an opening's pixels at once,
+        so that the path distance from a cell to an opening is a single array index
+        when there are too many openings to build eagerly, each field is built the first time it is needed
+    """
+
+    def __init__(self, grid, openingDict=None, eager=None, maxEagerBytes=8 * 1024 * 1024):
+        """PropagationField class __init__
+
+        Args:
+            grid (Grid): the grid the openings are in
+            openingDict (dict, optional): the openings to build the fields of, in the format {int(1): Opening()...}. Defaults to the grid's openings.
+            eager (bool, optional): build every field now (True) or the first time each is queried (False). Defaults to building eagerly when the fields fit in maxEagerBytes.
+            maxEagerBytes (int, optional): the most memory the fields can use to be built eagerly, which also bounds the build time. Defaults to 8MB.
+        """
+        self.grid = grid
+        if openingDict is None:
+            openingDict = grid.getOpenings()
+        self.openingDict = openingDict
+        self.fields = dict()
+        self.buildTime = 0.0
+        if eager is None:
+            eager = self.estimateBytes() <= maxEagerBytes
+        self.eager = eager
+        if eager:
+            for key in self.openingDict:
+                self.getField(key)
+
+    def estimateBytes(self):
+        """returns the memory that the fields of every opening would use
+
+        Returns:
+            int: the amount of bytes of all the fields
+        """
+        return len(self.openingDict) * self.grid.getSizeX() * self.grid.getSizeY() * np.dtype(np.uint16).itemsize
+
+    def getField(self, key):
+        """returns the path distance from every cell to an opening, building it if needed
+
+        Args:
+            key (int): the opening's key in the opening dict
+
+        Returns:
+            numpy ndarray: a (sizeX, sizeY) uint16 array of path lengths in cells, unreachable where the sound does not reach
+        """
+        field = self.fields.get(key)
+        if field is None:
+            start = time.perf_counter()
+            field = self.buildField(self.openingDict[key])
+            self.buildTime += time.perf_counter() - start
+            self.fields[key] = field
+        return field
+
+    def setField(self, key, field):
+        """sets an already built field of an opening, e.g. one loaded from a file
+
+        Args:
+            key (int): the opening's key in the opening dict
+            field (numpy ndarray): a (sizeX, sizeY) uint16 array of path lengths in cells
+        """
+        self.fields[key] = field
+
+    def buildField(self, opening):
+        """computes the path distance from every cell to an opening,
+        with a breadth-first search that expands the whole frontier of the search at once, one distance at a time
+
+        Args:
+            opening (Opening): the opening to build the field of
+
+        Returns:
+            numpy ndarray: a (sizeX, sizeY) uint16 array of path lengths in cells, unreachable where the sound does not reach
+        """
+        sizeX, sizeY = self.grid.getSizeX(), self.grid.getSizeY()
+        pixels = np.array(opening.getPixels()).reshape(-1, 2)
+        # the sound passes through every cell but walls and the other openings
+        passable = ~self.grid.getObstructionMask()
+        passable[pixels[:, 0], pixels[:, 1]] = True
+        passable = passable.ravel()
+
+        distances = np.full(sizeX * sizeY, unreachable, dtype=np.uint16)
+        frontier = np.unique(pixels[:, 0] * sizeY + pixels[:, 1])
+        distances[frontier] = 0
+        distance = 0
+        # the paths longer than the largest uint16 are left unreachable
+        while frontier.size > 0 and distance < unreachable - 1:
+            distance += 1
+            x, y = frontier // sizeY, frontier % sizeY
+            neighbours = np.concatenate((frontier[x > 0] - sizeY, frontier[x < sizeX - 1] + sizeY,
+                                         frontier[y > 0] - 1, frontier[y < sizeY - 1] + 1))
+            neighbours = neighbours[passable[neighbours] & (distances[neighbours] == unreachable)]
+            frontier = np.unique(neighbours)
+            distances[frontier] = distance
+        return distances.reshape(sizeX, sizeY)
+
+    def getDistance(self, key, x, y):
+        """returns the length of the path from a given cell to an opening
+
+        Args:
+            key (int): the opening's key in the opening dict
+            x (int): the x coordinate of the listener
+            y (int): the y coordinate of the listener
+
+        Returns:
+            int: the path length in cells, or None if the opening's sound does not reach the cell
+        """
+        distance = int(self.getField(key)[x, y])
+        if distance == unreachable:
+            return None
+        return distance
+
+    def getReachableOpenings(self, x, y):
+        """returns the openings whose sound reaches a given cell, and how far it travels
+
+        Args:
+            x (int): the x coordinate of the listener
+            y (int): the y coordinate of the listener
+
+        Returns:
+            dict: the path length in cells of every opening that reaches the cell, by key, in opening dict order
+        """
+        distances = dict()
+        for key in self.openingDict:
+            distance = self.getField(key)[x, y]
+            if distance != unreachable:
+                distances[key] = int(distance)
+        return distances
+
+    def getStats(self):
+        """returns how long the fields took to build and how much memory they use
+
+        Returns:
+            dict: {"openings": int, "built": int, "eager": bool, "buildTime": seconds, "bytes": int}
+        """
+        return {"openings": len(self.openingDict),
+                "built": len(self.fields),
+                "eager": self.eager,
+                "buildTime": self.buildTime,
+                "bytes": sum(field.nbytes for field in self.fields.values())}
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,151 @@
+import numpy as np
+from .lines import lineSteps, toLineArrays
+
+
+class ObstructionPyramid():
+    """ObstructionPyramid class
+        a multi-resolution version of a grid's obstruction mask, each level max-pooling 2x2 cells of the level below,
+        so that a cell of level L is empty when none of the 2^L x 2^L pixels it covers are obstructed
+
+        walking a line through the pyramid skips each empty cell in a single step, found at the coarsest level that is empty,
+        and only walks pixel by pixel where there are obstructions nearby,
+        so that lines crossing open rooms on large grids take a few steps rather than one per pixel
+    """
+
+    def __init__(self, mask, minSize=2):
+        """ObstructionPyramid class __init__
+
+        Args:
+            mask (numpy ndarray): the (sizeX, sizeY) boolean array of the obstructed pixels (e.g. Grid.getObstructionMask)
+            minSize (int, optional): the coarsest level is the first one at most minSize cells wide. Defaults to 2.
+        """
+        self.mask = mask
+        self.levels = [np.asarray(mask, dtype=bool)]
+        while max(self.levels[-1].shape) > minSize:
+            level = self.levels[-1]
+            # padded to an even size, so that the cells on the edges are pooled too
+            padded = np.zeros(((level.shape[0] + 1) // 2 * 2, (level.shape[1] + 1) // 2 * 2), dtype=bool)
+            padded[:level.shape[0], :level.shape[1]] = level
+            pooled = padded[0::2, 0::2] | padded[1::2, 0::2] | padded[0::2, 1::2] | padded[1::2, 1::2]
+            if pooled.all():
+                # neither this level nor any coarser one has an empty cell to skip
+                break
+            self.levels.append(pooled)
+        # the number of empty levels around every pixel, so that walking a line looks up a single array per step
+        self.emptyLevels = np.zeros(self.levels[0].shape, dtype=np.uint8)
+        for level, occupancy in enumerate(self.levels):
+            cellSize = 1 << level
+            upsampled = np.repeat(np.repeat(occupancy, cellSize, axis=0), cellSize, axis=1)
+            self.emptyLevels += ~upsampled[:self.emptyLevels.shape[0], :self.emptyLevels.shape[1]]
+
+    def getLevelCount(self):
+        """returns the number of levels of the pyramid, including the mask itself
+
+        Returns:
+            int: the number of levels
+        """
+        return len(self.levels)
+
+    def getEmptyLevels(self, x, y):
+        """returns how many levels are empty around pixels, i.e. the coarsest empty level plus one
+
+        an empty cell's pixels are empty at every finer level, so the empty levels are always the finest ones
+
+        Args:
+            x (numpy ndarray): the x coordinate of each pixel
+            y (numpy ndarray): the y coordinate of each pixel
+
+        Returns:
+            numpy ndarray: the number of empty levels around each pixel, 0 if the pixel itself is obstructed
+        """
+        return self.emptyLevels[x, y].astype(np.int64)
+
+    def walkLines(self, blocking, startX, startY, endX, endY, labels=None, lineLabels=None, stopAtFirst=False):
+        """walks many lines at once through the pyramid, counting the blocking pixels on each line
+        the result is the same as lines.walkLines, for the same Bresenham lines
+
+        Args:
+            blocking (numpy ndarray): 2D boolean array, True for the pixels that block a line, which must be a subset of the pyramid's mask
+                (e.g. the mask without an opening's own pixels)
+            startX (numpy ndarray or int): the x coordinate of the starting pixel of each line
+            startY (numpy ndarray or int): the y coordinate of the starting pixel of each line
+            endX (numpy ndarray or int): the x coordinate of the end pixel of each line
+            endY (numpy ndarray or int): the y coordinate of the end pixel of each line
+            labels (numpy ndarray, optional): 2D int array, pixels with the same label as a line do not block it. Defaults to None.
+            lineLabels (numpy ndarray, optional): the label of each line, used with labels. Defaults to None.
+            stopAtFirst (bool, optional): stop walking each line as soon as one blocking pixel is found. Defaults to False.
+
+        Returns:
+            numpy ndarray: the number of blocking pixels on each line (at most 1 when stopAtFirst is set)
+        """
+        startX, startY, endX, endY = toLineArrays(startX, startY, endX, endY)
+        deltaX, deltaY, xx, xy, yx, yy = lineSteps(startX, startY, endX, endY)
+        if labels is not None:
+            lineLabels = np.broadcast_to(np.asarray(lineLabels), startX.shape).copy()
+        counts = np.zeros(startX.size, dtype=np.int64)
+
+        # the state of the lines that are not finished yet, compacted as lines drop out
+        lines = np.arange(startX.size)
+        step = np.zeros(startX.size, dtype=np.int64)
+        while lines.size > 0:
+            # the pixel at each line's step, in closed form (see lines.bresenhamLines)
+            across = (2 * step * deltaY + deltaX) // np.maximum(2 * deltaX, 1)
+            pixelX = startX + step * xx + across * yx
+            pixelY = startY + step * xy + across * yy
+
+            emptyLevels = self.getEmptyLevels(pixelX, pixelY)
+            hit = emptyLevels == 0
+            hit &= blocking[pixelX, pixelY]
+            if labels is not None:
+                hit &= labels[pixelX, pixelY] != lineLabels
+            counts[lines] += hit
+
+            # the obstructed pixels are stepped over one at a time, the empty cells all at once
+            cellSize = np.left_shift(1, np.maximum(emptyLevels - 1, 0))
+            nextStep = np.minimum(self.getExitStep(startX, pixelX, xx, yx, cellSize, step, deltaX, deltaY),
+                                  self.getExitStep(startY, pixelY, xy, yy, cellSize, step, deltaX, deltaY))
+            nextStep = np.where(emptyLevels == 0, step + 1, nextStep)
+
+            keep = nextStep <= deltaX
+            if stopAtFirst:
+                keep &= ~hit
+            if not keep.all():
+                lines, nextStep, startX, startY, deltaX, deltaY = lines[keep], nextStep[keep], startX[keep], startY[keep], deltaX[keep], deltaY[keep]
+                xx, xy, yx, yy = xx[keep], xy[keep], yx[keep], yy[keep]
+                if labels is not None:
+                    lineLabels = lineLabels[keep]
+            step = nextStep
+        return counts
+
+    def getExitStep(self, start, pixel, alongStep, acrossStep, cellSize, step, deltaX, deltaY):
+        """returns the first step at which each line leaves its pixel's cell along one axis
+
+        along the line's major axis, the coordinate moves by one every step,
+        along its minor axis, it moves by one whenever the across term of Bresenham's algorithm goes up by one
+
+        Args:
+            start (numpy ndarray): the line's starting coordinate on the axis
+            pixel (numpy ndarray): the coordinate of the line's current pixel on the axis
+            alongStep (numpy ndarray): how much the coordinate moves every step, if it is the major axis (-1, 0 or 1)
+            acrossStep (numpy ndarray): how much the coordinate moves every step across, if it is the minor axis (-1, 0 or 1)
+            cellSize (numpy ndarray): the width of the pixel's cell
+            step (numpy ndarray): the line's current step
+            deltaX (numpy ndarray): the length of the line along its major axis (see lineSteps)
+            deltaY (numpy ndarray): the length of the line along its minor axis (see lineSteps)
+
+        Returns:
+            numpy ndarray: the first step out of the cell, past the end of the line if it never leaves it
+        """
+        low = pixel // cellSize * cellSize
+        high = low + cellSize - 1
+        direction = alongStep + acrossStep
+        # how far from the line's start the coordinate must be to leave the cell
+        distance = np.where(direction > 0, high + 1 - start, start - (low - 1))
+        # along the major axis, the step is the distance, along the minor axis, the first step whose across term reaches it
+        acrossExit = ((2 * distance - 1) * deltaX + 2 * deltaY - 1) // np.maximum(2 * deltaY, 1)
+        exitStep = np.where(alongStep != 0, distance, np.where((acrossStep != 0) & (deltaY > 0), acrossExit, deltaX + 1))
+        return np.maximum(exitStep, step + 1)
+
+
+if __name__ == "__main__":
+    pass
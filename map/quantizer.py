@@ -0,0 +1,158 @@
+import os
+import numpy as np
+
+# lookup tables that have already been built, shared by every Quantizer with the same palette
+lookupTableCache = dict()
+
+
+class Quantizer():
+    """Quantizer class
+        maps every pixel of an image to the code of its nearest colour in a palette in one batched operation
+        nearest is the smallest euclidian distance in RGBA space,
+        with ties going to the colour that comes first in the palette (i.e. the same rule as Grid.rgbDistance)
+        can optionally use a 256x256x256 RGB lookup table so that repeated quantization is a single array index
+    """
+
+    # amount of pixels to measure against the palette at a time, to bound the memory used
+    chunkSize = 65536
+
+    def __init__(self, colours, codes=None, useLookupTable=False, lookupTablePath=None):
+        """Quantizer class __init__
+
+        Args:
+            colours (list): the palette as a list of RGBA 4-tuples (r, g, b, a), in tie-breaking order
+            codes (list, optional): the code to output for each palette colour. Defaults to the colour's index in the palette.
+            useLookupTable (bool, optional): build (or load) the RGB lookup table on first use. Defaults to False.
+            lookupTablePath (str, optional): .npy file to load the lookup table from, or save it to once built. Defaults to None.
+        """
+        if len(colours) == 0:
+            raise ValueError("Cannot quantize to an empty palette")
+        if codes is None:
+            codes = range(len(colours))
+        if len(codes) != len(colours):
+            raise ValueError("There must be one code for each palette colour")
+        if max(codes) > 255 or min(codes) < 0:
+            raise ValueError("Palette codes must be between 0 and 255")
+        self.colours = np.array(colours, dtype=np.int32)
+        if self.colours.ndim != 2 or self.colours.shape[1] != 4:
+            raise ValueError("Palette colours must be 4-tuples (r, g, b, a)")
+        self.codes = np.array(codes, dtype=np.uint8)
+        self.useLookupTable = useLookupTable
+        self.lookupTablePath = lookupTablePath
+
+    def toRGBA(self, image):
+        """returns the given image as a flat (n, 4) array of RGBA pixels, checking its values once for the whole image
+
+        Args:
+            image (numpy ndarray): an (..., 3) RGB or (..., 4) RGBA array
+
+        Returns:
+            numpy ndarray: the image's pixels as an (n, 4) int32 array, with an alpha of 255 added to RGB images
+        """
+        image = np.asarray(image)
+        if image.ndim < 1 or image.shape[-1] not in (3, 4):
+            raise ValueError(
+                "RGBA values must be a 3-tuple (r, g, b) or 4-tuple (r, g, b, a)")
+        if image.size > 0 and (image.min() < 0 or image.max() > 255):
+            raise ValueError("RGBA values must be between 0 and 255")
+        pixels = image.reshape(-1, image.shape[-1]).astype(np.int32)
+        if pixels.shape[1] == 3:
+            pixels = np.concatenate(
+                (pixels, np.full((len(pixels), 1), 255, dtype=np.int32)), axis=1)
+        return pixels
+
+    def nearest(self, pixels):
+        """returns the code of the nearest palette colour for each of the given RGBA pixels
+
+        Args:
+            pixels (numpy ndarray): an (n, 4) int32 array of RGBA pixels
+
+        Returns:
+            numpy ndarray: an (n,) uint8 array of palette codes
+        """
+        result = np.empty(len(pixels), dtype=np.uint8)
+        for start in range(0, len(pixels), self.chunkSize):
+            chunk = pixels[start:start + self.chunkSize]
+            # squared distances are exact integers, so their order is the same as the euclidian distances
+            # argmin keeps the first of any tied colours, like the strict "<" comparison it replaces
+            difference = chunk[:, np.newaxis, :] - self.colours[np.newaxis, :, :]
+            distances = np.einsum("ijk,ijk->ij", difference, difference)
+            result[start:start + self.chunkSize] = self.codes[np.argmin(distances, axis=1)]
+        return result
+
+    def quantize(self, image):
+        """replaces every pixel of the image with the code of its closest palette colour
+
+        Args:
+            image (numpy ndarray): an (..., 3) RGB or (..., 4) RGBA array, e.g. an HxWx3 image
+
+        Returns:
+            numpy ndarray: a uint8 array of palette codes with the image's shape minus its last axis
+        """
+        image = np.asarray(image)
+        pixels = self.toRGBA(image)
+        if self.useLookupTable:
+            result = self.quantizeWithLookupTable(pixels)
+        else:
+            result = self.nearest(pixels)
+        return result.reshape(image.shape[:-1])
+
+    def quantizeWithLookupTable(self, pixels):
+        """quantizes the given pixels through the RGB lookup table,
+        falling back to nearest() for the pixels that are not fully opaque
+
+        Args:
+            pixels (numpy ndarray): an (n, 4) int32 array of RGBA pixels
+
+        Returns:
+            numpy ndarray: an (n,) uint8 array of palette codes
+        """
+        table = self.getLookupTable()
+        packed = (pixels[:, 0] << 16) | (pixels[:, 1] << 8) | pixels[:, 2]
+        result = table[packed]
+        translucent = pixels[:, 3] != 255
+        if translucent.any():
+            result[translucent] = self.nearest(pixels[translucent])
+        return result
+
+    def getLookupTable(self):
+        """returns the lookup table of the palette code for every opaque RGB colour,
+        loading it from lookupTablePath or building it the first time it is needed
+
+        Returns:
+            numpy ndarray: a (256*256*256,) uint8 array indexed by (r << 16) | (g << 8) | b
+        """
+        key = (self.colours.tobytes(), self.codes.tobytes())
+        table = lookupTableCache.get(key)
+        if table is not None:
+            return table
+        if self.lookupTablePath is not None and os.path.exists(self.lookupTablePath):
+            table = np.load(self.lookupTablePath)
+            if table.shape != (256 * 256 * 256,) or table.dtype != np.uint8:
+                raise ValueError("Invalid lookup table file: " + str(self.lookupTablePath))
+        else:
+            table = self.buildLookupTable()
+            if self.lookupTablePath is not None:
+                np.save(self.lookupTablePath, table)
+        lookupTableCache[key] = table
+        return table
+
+    def buildLookupTable(self):
+        """computes the nearest palette code for every opaque RGB colour
+
+        Returns:
+            numpy ndarray: a (256*256*256,) uint8 array indexed by (r << 16) | (g << 8) | b
+        """
+        table = np.empty(256 * 256 * 256, dtype=np.uint8)
+        green, blue = np.meshgrid(np.arange(256, dtype=np.int32), np.arange(256, dtype=np.int32), indexing="ij")
+        plane = np.stack((np.zeros(256 * 256, dtype=np.int32), green.ravel(), blue.ravel(),
+                          np.full(256 * 256, 255, dtype=np.int32)), axis=1)
+        # one plane of constant red at a time
+        for red in range(256):
+            plane[:, 0] = red
+            table[red * 65536:(red + 1) * 65536] = self.nearest(plane)
+        return table
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,185 @@
+import numpy as np
+
+# the tiles that make up rooms, each connected region of one of them is a room
+roomTiles = ["closet", "bathroom", "dining room", "bedroom", "hall", "balcony"]
+
+
+class RoomIndex():
+    """RoomIndex class
+        the rooms of a grid, i.e. the connected regions of each room tile (with Four-Pixel Connectivity),
+        numbered from 1 in roomTiles order, then in the order Grid.labelTiles numbers the regions of each tile
+
+        keeps the room of every cell, the tile, area and centroid of every room,
+        and which rooms each opening connects, the rooms touching its pixels
+        built once, so that finding a cell's room or the room on the other side of a door is a lookup
+    """
+
+    def __init__(self, grid, minSize=1):
+        """RoomIndex class __init__
+
+        Args:
+            grid (Grid): the grid to find the rooms of, with its openings found (see Grid.findOpenings)
+            minSize (int, optional): the smallest amount of cells a room can have, smaller regions are not part of any room. Defaults to 1.
+        """
+        self.grid = grid
+        # the room of every cell, 0 for the cells that are not part of a room
+        self.roomIds = np.zeros((grid.getSizeX(), grid.getSizeY()), dtype=np.int32)
+        tiles, areas, centroids = [], [], []
+        for tile in roomTiles:
+            regions = grid.labelTiles(tile, minSize)
+            if len(regions) == 0:
+                continue
+            inRegion = regions.labels > 0
+            self.roomIds[inRegion] = regions.labels[inRegion] + len(tiles)
+            tiles.extend([tile] * len(regions))
+            areas.append(regions.sizes)
+            centroids.append(regions.centroids)
+        self.tiles = tiles
+        self.areas = np.concatenate(areas) if areas else np.zeros(0, dtype=np.int64)
+        self.centroids = np.concatenate(centroids) if centroids else np.zeros((0, 2))
+
+        # the rooms each opening touches, the room it touches on the most sides of its pixels first
+        self.openingRooms = {key: () for key in grid.getOpenings()}
+        # the openings between every pair of rooms, in the format {room: {other room: [opening key...]}}
+        self.connections = {room: dict() for room in self.getRooms()}
+        if grid.openingLabels is not None:
+            self.connectOpenings(grid.openingLabels.labels)
+
+    def connectOpenings(self, openingLabels):
+        """finds the rooms touching every opening's pixels at once, from the cells next to them
+
+        Args:
+            openingLabels (numpy ndarray): 2D int array of the key of the opening of each pixel, 0 for the pixels of no opening
+        """
+        pairs = []
+        for shifted, neighbour in (((slice(1, None), slice(None)), (slice(None, -1), slice(None))),
+                                   ((slice(None, -1), slice(None)), (slice(1, None), slice(None))),
+                                   ((slice(None), slice(1, None)), (slice(None), slice(None, -1))),
+                                   ((slice(None), slice(None, -1)), (slice(None), slice(1, None)))):
+            openings = openingLabels[shifted]
+            rooms = self.roomIds[neighbour]
+            touching = (openings > 0) & (rooms > 0)
+            pairs.append(np.stack((openings[touching], rooms[touching]), axis=1))
+        pairs, contacts = np.unique(np.concatenate(pairs), axis=0, return_counts=True)
+
+        # the pairs are sorted by opening, each opening's rooms are then sorted by how much they touch it
+        order = np.lexsort((-contacts, pairs[:, 0]))
+        for opening, room in pairs[order].tolist():
+            self.openingRooms[opening] = self.openingRooms.get(opening, ()) + (room,)
+        for opening, rooms in self.openingRooms.items():
+            for room in rooms:
+                for otherRoom in rooms:
+                    if otherRoom != room:
+                        self.connections[room].setdefault(otherRoom, []).append(opening)
+
+    def getRooms(self):
+        """returns the numbers of every room
+
+        Returns:
+            list: the room numbers, from 1
+        """
+        return list(range(1, len(self.tiles) + 1))
+
+    def getRoom(self, x, y):
+        """returns the room of a cell
+
+        Args:
+            x (int): the x coordinate of the cell
+            y (int): the y coordinate of the cell
+
+        Returns:
+            int: the room number, or None if the cell is not part of a room (e.g. a wall)
+        """
+        room = int(self.roomIds[x, y])
+        if room == 0:
+            return None
+        return room
+
+    def getTile(self, room):
+        """returns the tile a room is made of
+
+        Args:
+            room (int): the room number
+
+        Returns:
+            string: the room's tile (see roomTiles)
+        """
+        return self.tiles[room - 1]
+
+    def getArea(self, room):
+        """returns the number of cells of a room
+
+        Args:
+            room (int): the room number
+
+        Returns:
+            int: the room's area in cells
+        """
+        return int(self.areas[room - 1])
+
+    def getCentroid(self, room):
+        """returns the mean cell of a room
+
+        Args:
+            room (int): the room number
+
+        Returns:
+            tuple: the mean (x, y) of the room's cells as floats
+        """
+        return tuple(float(value) for value in self.centroids[room - 1])
+
+    def getOpeningRooms(self, key):
+        """returns the rooms an opening connects
+
+        Args:
+            key (int): the opening's key in the opening dict
+
+        Returns:
+            tuple: the numbers of the rooms touching the opening, the one it touches the most first
+        """
+        return self.openingRooms.get(key, ())
+
+    def getConnections(self, room):
+        """returns the rooms a room connects to, and through which openings
+
+        Args:
+            room (int): the room number
+
+        Returns:
+            dict: the keys of the openings to every connected room, in the format {room: [opening key...]}
+        """
+        return self.connections[room]
+
+    def getRoomBehind(self, key, x, y):
+        """returns the room on the other side of an opening from a cell, e.g. the room a door leads into
+
+        Args:
+            key (int): the opening's key in the opening dict
+            x (int): the x coordinate of the cell
+            y (int): the y coordinate of the cell
+
+        Returns:
+            int: the room number, or None if the opening leads out of the rooms (e.g. a window)
+                or the cell is not in one of the rooms the opening connects (e.g. across the grid from it)
+        """
+        room = self.getRoom(x, y)
+        if room not in self.getOpeningRooms(key):
+            return None
+        for otherRoom in self.getOpeningRooms(key):
+            if otherRoom != room:
+                return otherRoom
+        return None
+
+    def getStats(self):
+        """returns how many rooms and connections there are
+
+        Returns:
+            dict: {"rooms": int, "openings": int (connecting two rooms or more), "roomsPerTile": {tile: int}}
+        """
+        return {"rooms": len(self.tiles),
+                "openings": sum(1 for rooms in self.openingRooms.values() if len(rooms) > 1),
+                "roomsPerTile": {tile: self.tiles.count(tile) for tile in roomTiles}}
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,320 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+'''
+spans around the stages of the upload and click paths, to tell where their time goes
+
+a span records how long a stage took and, when memory tracing is on, the peak memory allocated during it
+the finished spans are given to the sinks added to the tracer, e.g. a JSONLinesSink or a ChromeTraceSink
+without any sink, a span does nothing, so that the instrumented code runs as fast as without it
+'''
+
+
+class Span():
+    """Span class
+        a stage being traced, from the time it starts to the time it finishes
+    """
+
+    def __init__(self, name, parent, threadName, start, details):
+        """Span class __init__
+
+        Args:
+            name (str): the name of the stage (e.g. "MapGenerator.quantize")
+            parent (Span): the span this one runs within on the same thread, or None
+            threadName (str): the name of the thread it runs on
+            start (float): the seconds since the tracer was created at which it starts
+            details (dict): anything else to record about the stage
+        """
+        self.name = name
+        self.parent = parent
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.threadName = threadName
+        self.threadId = threading.get_ident()
+        self.start = start
+        self.duration = None
+        self.details = details
+        # the memory allocated when it starts and the highest since, in bytes, if memory is traced
+        self.startMemory = None
+        self.peakMemory = None
+
+    def toDict(self):
+        """returns the span as a dict, e.g. to be saved as JSON
+
+        Returns:
+            dict: the name, parent, depth, thread, start and duration (in seconds), peak memory (in bytes, or None) and details of the span
+        """
+        return {"name": self.name,
+                "parent": None if self.parent is None else self.parent.name,
+                "depth": self.depth,
+                "thread": self.threadName,
+                "start": self.start,
+                "duration": self.duration,
+                "peakMemory": None if self.peakMemory is None else self.peakMemory - self.startMemory,
+                "details": self.details}
+
+
+class Tracer():
+    """Tracer class
+        times the spans and gives them to its sinks once they finish
+
+        the spans of each thread are nested separately, but tracemalloc's peak is process-wide,
+        so the peak memory of a span includes what other threads allocated while it ran
+    """
+
+    def __init__(self):
+        self.sinks = []
+        self.traceMemory = False
+        self.startTime = time.perf_counter()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def addSink(self, sink, traceMemory=False):
+        """starts giving the finished spans to a sink
+
+        Args:
+            sink: an object with emit(span) and close() (e.g. JSONLinesSink)
+            traceMemory (bool, optional): also record each span's peak memory, with tracemalloc, which slows down allocations. Defaults to False.
+        """
+        with self.lock:
+            self.sinks.append(sink)
+        if traceMemory and not self.traceMemory:
+            self.traceMemory = True
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def removeSink(self, sink):
+        """stops giving the spans to a sink and closes it
+
+        Args:
+            sink: a sink added with addSink
+        """
+        with self.lock:
+            self.sinks.remove(sink)
+            if len(self.sinks) == 0 and self.traceMemory:
+                self.traceMemory = False
+                tracemalloc.stop()
+        sink.close()
+
+    def closeSinks(self):
+        """stops giving the spans to every sink and closes them, e.g. when the app quits
+        """
+        for sink in list(self.sinks):
+            self.removeSink(sink)
+
+    def isEnabled(self):
+        """returns whether any sink receives the spans
+
+        Returns:
+            bool: True if a sink has been added
+        """
+        return len(self.sinks) > 0
+
+    @contextmanager
+    def span(self, name, **details):
+        """traces the code run within the with statement
+
+        Args:
+            name (str): the name of the stage
+            **details: anything else to record about the stage
+
+        Yields:
+            Span: the span, or None if no sink receives it
+        """
+        if not self.isEnabled():
+            yield None
+            return
+        stack = self.getStack()
+        span = Span(name, stack[-1] if stack else None, threading.current_thread().name, time.perf_counter() - self.startTime, details)
+        if self.traceMemory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if span.parent is not None and span.parent.peakMemory is not None:
+                # the parent's peak so far is kept, as the peak is reset for this span
+                span.parent.peakMemory = max(span.parent.peakMemory, peak)
+            tracemalloc.reset_peak()
+            span.startMemory = current
+            span.peakMemory = current
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            stack.pop()
+            span.duration = time.perf_counter() - self.startTime - span.start
+            if span.peakMemory is not None and tracemalloc.is_tracing():
+                span.peakMemory = max(span.peakMemory, tracemalloc.get_traced_memory()[1])
+                if span.parent is not None and span.parent.peakMemory is not None:
+                    span.parent.peakMemory = max(span.parent.peakMemory, span.peakMemory)
+            self.emit(span)
+
+    def getStack(self):
+        """returns the spans running on the current thread, the outermost first
+
+        Returns:
+            list: the running spans
+        """
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def emit(self, span):
+        """gives a finished span to every sink
+
+        Args:
+            span (Span): the finished span
+        """
+        with self.lock:
+            sinks = list(self.sinks)
+        for sink in sinks:
+            sink.emit(span)
+
+
+class ListSink():
+    """ListSink class
+        keeps the finished spans in memory, e.g. for tests
+    """
+
+    def __init__(self):
+        self.spans = []
+
+    def emit(self, span):
+        self.spans.append(span.toDict())
+
+    def close(self):
+        pass
+
+
+class JSONLinesSink():
+    """JSONLinesSink class
+        appends every finished span to a file as a line of JSON (see Span.toDict)
+    """
+
+    def __init__(self, path):
+        """JSONLinesSink class __init__
+
+        Args:
+            path (str): the path of the file, appended to if it exists
+        """
+        self.path = path
+        self.file = open(path, "a")
+        self.lock = threading.Lock()
+
+    def emit(self, span):
+        line = json.dumps(span.toDict(), default=str)
+        with self.lock:
+            self.file.write(line + "\n")
+            # flushed every span, so that the spans of a slow stage are there before it is killed
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class ChromeTraceSink():
+    """ChromeTraceSink class
+        collects the finished spans as Chrome trace events, written to a file when closed,
+        which can be opened in chrome://tracing or https://ui.perfetto.dev
+    """
+
+    def __init__(self, path):
+        """ChromeTraceSink class __init__
+
+        Args:
+            path (str): the path of the trace file, overwritten when the sink is closed
+        """
+        self.path = path
+        self.events = []
+        self.lock = threading.Lock()
+
+    def emit(self, span):
+        arguments = dict(span.details)
+        spanDict = span.toDict()
+        if spanDict["peakMemory"] is not None:
+            arguments["peakMemory"] = spanDict["peakMemory"]
+        # a complete event, with its start and duration in microseconds
+        event = {"name": span.name,
+                 "ph": "X",
+                 "ts": span.start * 1e6,
+                 "dur": span.duration * 1e6,
+                 "pid": os.getpid(),
+                 "tid": span.threadId,
+                 "args": arguments}
+        with self.lock:
+            self.events.append(event)
+
+    def getTrace(self):
+        """returns the trace of the spans so far
+
+        Returns:
+            dict: the trace, in the Chrome trace event format
+        """
+        with self.lock:
+            return {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+
+    def close(self):
+        with open(self.path, "w") as traceFile:
+            json.dump(self.getTrace(), traceFile, default=str)
+
+
+# the tracer of the whole app
+tracer = Tracer()
+
+
+def span(name, **details):
+    """traces the code run within the with statement, with the app's tracer (see Tracer.span)
+
+    Args:
+        name (str): the name of the stage
+        **details: anything else to record about the stage
+    """
+    return tracer.span(name, **details)
+
+
+def traced(name, tracerAttribute=None):
+    """decorates a function so that every call to it is traced as a span, with the app's tracer,
+    or for a method, with the tracer in an attribute of its object, e.g. one given to the object rather than the app's
+
+    Args:
+        name (str): the name of the stage
+        tracerAttribute (str, optional): the name of the attribute of the method's object holding its tracer,
+            calls are not traced while it is None. Defaults to the app's tracer.
+
+    Returns:
+        function: the decorator
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            callTracer = tracer if tracerAttribute is None else getattr(args[0], tracerAttribute)
+            if callTracer is None:
+                return function(*args, **kwargs)
+            with callTracer.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def addSink(sink, traceMemory=False):
+    """starts giving the app's spans to a sink (see Tracer.addSink)
+    """
+    tracer.addSink(sink, traceMemory)
+
+
+def removeSink(sink):
+    """stops giving the app's spans to a sink and closes it (see Tracer.removeSink)
+    """
+    tracer.removeSink(sink)
+
+
+def closeSinks():
+    """stops giving the app's spans to every sink and closes them (see Tracer.closeSinks)
+    """
+    tracer.closeSinks()
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,129 @@
+import time
+import numpy as np
+
+
+class VisibilityIndex():
+    """VisibilityIndex class
+        for every opening of a grid, a boolean mask of the grid's cells from which the opening can be heard,
+        i.e. the cells whose line to the opening's center pixel has no wall or opening tiles on it,
+        other than the opening's own pixels (the same rule as SoundGenerator.getOpeningSources)
+        the masks are built once, so that finding the openings heard from a cell is a single array index
+        when there are too many openings to build eagerly, each mask is built the first time it is needed
+    """
+
+    def __init__(self, grid, openingDict=None, eager=None, maxEagerBytes=4 * 1024 * 1024):
+        """VisibilityIndex class __init__
+
+        Args:
+            grid (Grid): the grid the openings are in
+            openingDict (dict, optional): the openings to index, in the format {int(1): Opening()...}. Defaults to the grid's openings.
+            eager (bool, optional): build every mask now (True) or the first time each is queried (False). Defaults to building eagerly when the masks fit in maxEagerBytes.
+            maxEagerBytes (int, optional): the most memory the masks can use to be built eagerly, which also bounds the build time. Defaults to 4MB.
+        """
+        self.grid = grid
+        if openingDict is None:
+            openingDict = grid.getOpenings()
+        self.openingDict = openingDict
+        self.masks = dict()
+        self.buildTime = 0.0
+        if eager is None:
+            eager = self.estimateBytes() <= maxEagerBytes
+        self.eager = eager
+        if eager:
+            for key in self.openingDict:
+                self.getMask(key)
+
+    def estimateBytes(self):
+        """returns the memory that the masks of every opening would use
+
+        Returns:
+            int: the amount of bytes of all the masks
+        """
+        return len(self.openingDict) * self.grid.getSizeX() * self.grid.getSizeY()
+
+    def getMask(self, key):
+        """returns the mask of the cells from which an opening can be heard, building it if needed
+
+        Args:
+            key (int): the opening's key in the opening dict
+
+        Returns:
+            numpy ndarray: a (sizeX, sizeY) boolean array, True where the opening can be heard
+        """
+        mask = self.masks.get(key)
+        if mask is None:
+            start = time.perf_counter()
+            mask = self.buildMask(self.openingDict[key])
+            self.buildTime += time.perf_counter() - start
+            self.masks[key] = mask
+        return mask
+
+    def setMask(self, key, mask):
+        """sets an already built mask of an opening, e.g. one loaded from a file
+
+        Args:
+            key (int): the opening's key in the opening dict
+            mask (numpy ndarray): a (sizeX, sizeY) boolean array, True where the opening can be heard
+        """
+        self.masks[key] = mask
+
+    def buildMask(self, opening):
+        """computes the mask of the cells from which an opening can be heard,
+        walking the lines from every cell of the grid to the opening's center in lockstep (see Grid.countObstructionsInLines)
+
+        Args:
+            opening (Opening): the opening to build the mask of
+
+        Returns:
+            numpy ndarray: a (sizeX, sizeY) boolean array, True where the opening can be heard
+        """
+        sizeX, sizeY = self.grid.getSizeX(), self.grid.getSizeY()
+        ignore = np.zeros((sizeX, sizeY), dtype=bool)
+        pixels = np.array(opening.getPixels())
+        ignore[pixels[:, 0], pixels[:, 1]] = True
+
+        startX, startY = np.meshgrid(np.arange(sizeX), np.arange(sizeY), indexing="ij")
+        endX, endY = opening.getLocation()
+        counts = self.grid.countObstructionsInLines(startX, startY, endX, endY, ignoreMask=ignore, stopAtFirst=True)
+        return counts.reshape(sizeX, sizeY) == 0
+
+    def canHear(self, key, x, y):
+        """returns whether an opening can be heard from a given cell
+
+        Args:
+            key (int): the opening's key in the opening dict
+            x (int): the x coordinate of the listener
+            y (int): the y coordinate of the listener
+
+        Returns:
+            bool: True if there are no obstructions between the cell and the opening
+        """
+        return bool(self.getMask(key)[x, y])
+
+    def getAudibleOpenings(self, x, y):
+        """returns the openings that can be heard from a given cell
+
+        Args:
+            x (int): the x coordinate of the listener
+            y (int): the y coordinate of the listener
+
+        Returns:
+            list: the keys of the openings that can be heard, in opening dict order
+        """
+        return [key for key in self.openingDict if self.getMask(key)[x, y]]
+
+    def getStats(self):
+        """returns how long the index took to build and how much memory it uses
+
+        Returns:
+            dict: {"openings": int, "built": int, "eager": bool, "buildTime": seconds, "bytes": int}
+        """
+        return {"openings": len(self.openingDict),
+                "built": len(self.masks),
+                "eager": self.eager,
+                "buildTime": self.buildTime,
+                "bytes": sum(mask.nbytes for mask in self.masks.values())}
+
+
+if __name__ == "__main__":
+    pass
@@ -1,12 +1,21 @@
+import argparse
+import json
 import math
+import os
+import statistics
+import subprocess
+import sys
+import threading
 from tkinter.ttk import Progressbar
 from map import mapGenerator
 from sound import *
 from PIL import ImageTk,Image
 import tkinter as tk
-from tkinter import filedialog
-import demo as m
-from tests import *
+from tkinter import filedialog, messagebox
+from map import tracing
+
+# the modules that take long to import, which must not be imported before the window appears
+heavyModules = ("tensorflow", "pyttsx3", "openal", "hypothesis", "demo", "tests")
 
 class Gui():
     
@@ -18,8 +27,36 @@ class Gui():
         
         self.orientations = {v: k for k, v in self.facing.items()}
         self.hatOrientation = "HatUp.png"
-        runAllTests()
+        # the hat icon of the click being played
+        self.hat = None
+        # the DeepFloorPlan model (and tensorflow) is only loaded once a floor plan is uploaded, and kept loaded for every upload after
+        self.demo = None
+        self.engine = None
+        self.engineLoader = None
+        # why the model failed to load, shown to the user when they upload, so that the next upload tries loading it again
+        self.engineError = None
         self.startup()
+
+    def loadEngine(self):
+        """starts loading the DeepFloorPlan model in the background, if it is not loaded yet
+        """
+        if self.engineLoader is not None:
+            return
+
+        def load():
+            try:
+                import demo
+                engine = demo.InferenceEngine()
+                # the engine keeps the error of a model that failed to load, and raises it from wait()
+                engine.wait()
+                self.demo = demo
+                self.engine = engine
+            except Exception as error:
+                # e.g. tensorflow is not installed, or the pretrained model is missing
+                self.engineError = error
+
+        self.engineLoader = threading.Thread(target=load, daemon=True)
+        self.engineLoader.start()
         
     def rotateHat(self, hat, buttonPressed):
         """sets and returns the new hat after rotating it
@@ -52,17 +89,20 @@ class Gui():
                 newHat = "HatRight.png"
                 
         self.hatOrientation = newHat
-        self.audio.listener.orientation = self.orientations[self.hatOrientation]
-        self.audio.sayOrientationChange(newHat)
+        self.audio.listener.set_orientation(self.orientations[self.hatOrientation])
+        self.audioWorker.submit(self.audio.sayOrientationChange, newHat)
         
         
     def quit(self):
         """shut down the software
         """        
         try:
+            self.audioWorker.stop()
             self.audio.quit()
         except:
             pass
+        # the trace files are only complete once their sinks are closed
+        tracing.closeSinks()
         self.root.destroy()
         sys.exit(0)
 
@@ -73,6 +113,12 @@ class Gui():
         self.root.title('Deep Floor Plan Sonification')
         self.root.bind("<Escape>", lambda x: self.quit())
         self.root.attributes('-fullscreen', True)  
+        self.startScreen()
+        self.root.mainloop() 
+
+    def startScreen(self):
+        """shows the buttons to upload a floor plan or use the example
+        """
         self.canvas = tk.Canvas(self.root, bg='white', highlightthickness=0)
         # canvas fills the whole window
         self.uploadButton = tk.Button(self.canvas, text='Upload a Floor Plan', bg='white', font=('arial', 20, 'bold'), command=self.uploadFloorPlan)
@@ -82,7 +128,6 @@ class Gui():
         self.useExampleButton.place(relx=0.6, rely=0.5, anchor=tk.CENTER)
         self.canvas.pack(fill=tk.BOTH, expand=True)
         self.canvas.update()
-        self.root.mainloop() 
         
     def useExample(self):
         """called when the user clicks on the use example button, and loads the example floor plan
@@ -96,7 +141,8 @@ class Gui():
             once the floor plan is uploaded, the DeepFloorPlan model is run with the provided image as input
             the result is saved, and the uploadedGui method is called to display it
         """        
-
+        # the model loads while the user picks the file
+        self.loadEngine()
         self.floorPlanPath=filedialog.askopenfilename(filetypes=[("JPG file", "*.jpg"), ("JPEG file", "*.jpeg")])
         self.canvas.destroy()
         self.root.update()
@@ -106,8 +152,20 @@ class Gui():
         timed = self.canvas.create_text(self.root.winfo_width()/2, (self.root.winfo_height()/9) * 5, text="Average expected runtime: ~25 seconds", font=('arial', 10, 'italic'))
         self.canvas.pack(fill=tk.BOTH, expand=True)
         self.canvas.update()
-        m.main(self.floorPlanPath)
-        self.prepareUploadedSoundStage()
+        with tracing.span("Gui.upload", path=self.floorPlanPath):
+            with tracing.span("Gui.loadEngine"):
+                self.engineLoader.join()
+            if self.engineError is not None:
+                messagebox.showerror("Deep Floor Plan Sonification", "The floor plan model could not be loaded:\n" + repr(self.engineError))
+                # the model is loaded again on the next upload
+                self.engineLoader = None
+                self.engineError = None
+                self.canvas.destroy()
+                self.startScreen()
+                return
+            # the model's label map is handed to the map in memory, rather than through map/result.png
+            labels = self.demo.main(self.floorPlanPath, self.engine, save_image=False)
+            self.prepareUploadedSoundStage(labels)
         self.canvas.destroy()
         self.uploadedGui()
         
@@ -116,8 +174,7 @@ class Gui():
         """        
         self.canvas = tk.Canvas(self.root, bg='white', highlightthickness=0)
         self.canvas.pack(fill=tk.BOTH, expand=True)
-        mapDir = os.path.join(os.getcwd(), "map", "saved.png")
-        img = Image.open(mapDir)
+        img = self.newMap.getImage()
         fullscreenImg = ImageTk.PhotoImage(self.resizeImage(img, min(int(self.root.winfo_height()), int(self.root.winfo_width()/2))))
         self.canvas.create_image(0, 0, image=fullscreenImg, anchor="nw") 
         
@@ -142,7 +199,7 @@ class Gui():
             event (event): the click event
         """        
         self.rotateHat(self.hatOrientation, "q")
-        self.audio.sayOrientationChange(self.hatOrientation)
+        self.audioWorker.submit(self.audio.sayOrientationChange, self.hatOrientation)
         
     def rotateClockwise(self, event):
         """rotates the hat/user orientation clockwise
@@ -188,14 +245,14 @@ class Gui():
         Returns:
             hat (tkinter image object): the hat image
         """        
-        self.listener = self.audio.prepareOpeningSources(math.floor(event.x / scale), math.floor(event.y / scale))
+        self.listener = self.audio.getListener()
         try:
-            self.facing[self.listener.get(AL_ORIENTATION)]
+            self.facing[self.listener.orientation]
         except:
             self.listener.set_orientation(self.orientations[self.hatOrientation])
             
         hatDir = Image.open(os.path.join(os.getcwd(), "map", self.hatOrientation))
-        if self.facing[self.listener.get(AL_ORIENTATION)] == "HatUp.png" or self.facing[self.listener.get(AL_ORIENTATION)] == "HatDown.png":
+        if self.facing[self.listener.orientation] == "HatUp.png" or self.facing[self.listener.orientation] == "HatDown.png":
             hatWidth = 30
             ratio = (hatWidth / float(hatDir.size[0]))
             hatHeight = int((float(hatDir.size[1]) * float(ratio)))
@@ -205,6 +262,8 @@ class Gui():
             ratio = (hatHeight / float(hatDir.size[1]))
             hatWidth = int((float(hatDir.size[0]) * float(ratio)))
             hatIcon = ImageTk.PhotoImage(hatDir.resize((hatWidth,hatHeight)))
+        # keep a reference to the icon, so that it is not garbage collected while it is shown
+        self.hatIcon = hatIcon
         hat = self.canvas.create_image(event.x, event.y, image=hatIcon, anchor="center")
         self.canvas.tag_raise(hat)
         self.canvas.update()
@@ -217,10 +276,28 @@ class Gui():
         Args:
             event (event): the click event
         """        
-        hat = self.loadHat(event)
-        self.soundStage(math.floor(event.x / scale), math.floor(event.y / scale))
-        self.canvas.delete(hat)
-        self.canvas.delete
+        # a new click interrupts the sound stage of the previous one
+        if self.hat is not None:
+            self.canvas.delete(self.hat)
+        self.hat = self.loadHat(event)
+        self.audioWorker.submit(self.soundStage, math.floor(event.x / scale), math.floor(event.y / scale))
+        self.root.after(50, self.removeHatWhenDone, self.hat)
+
+    def removeHatWhenDone(self, hat):
+        """removes the hat icon once the sound stage of its click has finished playing,
+            checking again later if it is still playing
+
+        Args:
+            hat (tkinter image object): the hat image of the click
+        """
+        if hat != self.hat:
+            # a newer click has already removed it
+            return
+        if self.audioWorker.isIdle():
+            self.canvas.delete(hat)
+            self.hat = None
+        else:
+            self.root.after(50, self.removeHatWhenDone, hat)
 
     # resize Image to fit the fullscreen, taken from https://stackoverflow.com/questions/52234971/how-do-i-make-imageops-fit-not-crop
     def resizeImage(self, im, output_edge):
@@ -239,17 +316,25 @@ class Gui():
         new.paste(paste, (0, 0))
         return new
 
-    def prepareUploadedSoundStage(self):
+    def prepareUploadedSoundStage(self, labels=None):
         """creates the MapGenerator object and the SoundGenerator object, 
             then loads the map and the sound stage for the uploaded and processed floor plan
+
+        Args:
+            labels (numpy ndarray, optional): the model's label map, indexed [y, x]. Defaults to reading the model output from map/result.png.
         """        
         self.newMap = mapGenerator.MapGenerator()
-        self.newMap.create()
+        if labels is None:
+            self.newMap.create()
+        else:
+            # images are indexed [y, x], the map [x, y]
+            self.newMap.createFromLabels(labels.T)
         
         self.newMap.grid.findOpenings()
+        self.newMap.grid.buildVisibilityIndex()
+        self.newMap.grid.buildRoomIndex()
         
-        self.audio = soundGenerator.SoundGenerator(self.newMap.grid, self.newMap.grid.getOpenings())
-        self.listener = self.audio.getListener()
+        self.createAudio()
         
     def prepareExampleSoundStage(self):
         """creates the MapGenerator object and the SoundGenerator object,
@@ -260,12 +345,29 @@ class Gui():
         self.newMap.createFromSaveFile(example=True)
         
         self.newMap.grid.findOpenings()
+        self.newMap.grid.buildVisibilityIndex()
+        self.newMap.grid.buildRoomIndex()
 
         
-        self.audio = soundGenerator.SoundGenerator(self.newMap.grid, self.newMap.grid.getOpenings())
-        self.listener = self.audio.getListener()
+        self.createAudio()
         
 
+    def createAudio(self):
+        """creates the SoundGenerator object for the loaded map,
+            speaking from a phrase cache kept on disk between runs
+        """
+        backend = OpenALBackend()
+        # the speech engine is only started when the first phrase is synthesized or spoken
+        phraseCache = PhraseCache(os.path.join(os.getcwd(), "sound", "phraseCache"), backend.synthesize, backend.getSpeechSettings)
+        # the openings heard start half a second apart, the nearest first, and are cut off after 6 seconds
+        self.audio = soundGenerator.SoundGenerator(self.newMap.grid, self.newMap.grid.getOpenings(), backend=backend, phraseCache=phraseCache,
+                                                   stagger=0.5, maxDuration=6.0, tracer=tracing.tracer)
+        self.listener = self.audio.getListener()
+        # the speech and playback run on the audio worker's thread, so that the GUI never waits for them
+        self.audioWorker = AudioWorker(self.audio.cancelled)
+        # the phrases of every click, other than the coordinates, are synthesized ahead of time, until the first click preempts it
+        self.audioWorker.submit(phraseCache.warm, self.audio.getPhrases(coordinates=False), self.audioWorker.cancelled)
+
     def soundStage(self,x, y):
         """prepares and plays the audio for an event at x, y on the sound stage
 
@@ -274,11 +376,59 @@ class Gui():
             y (int): the y coordinate of the event
         """        
         if x < self.newMap.grid.getSizeX() and y < self.newMap.grid.getSizeY():
-            self.audio.prepareOpeningSources(x, y)
-            self.audio.sayLocation(x, y)
-            self.audio.playOpeningSources(x, y)
+            with tracing.span("Gui.click", x=x, y=y):
+                self.audio.prepareOpeningSources(x, y)
+                self.audio.sayLocation(x, y)
+                if not self.audio.cancelled.is_set():
+                    self.audio.playOpeningSources(x, y)
         
 
+def measureStartup(runs=5):
+    """measures how long importing the app takes, each time in a new interpreter so that nothing is cached,
+    and which of the heavy modules it imports
+
+    Args:
+        runs (int, optional): how many times to import the app. Defaults to 5.
+
+    Returns:
+        dict: {"runs": int, "median": seconds, "min": seconds, "max": seconds, "heavyModules": [names imported by the app]}
+    """
+    script = ("import sys, time, json\n"
+              "start = time.perf_counter()\n"
+              "import run\n"
+              "print(json.dumps({'seconds': time.perf_counter() - start, 'heavyModules': [name for name in run.heavyModules if name in sys.modules]}))\n")
+    directory = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    imported = set()
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", script], cwd=directory, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result["seconds"])
+        imported.update(result["heavyModules"])
+    return {"runs": runs,
+            "median": statistics.median(times),
+            "min": min(times),
+            "max": max(times),
+            "heavyModules": sorted(imported)}
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deep Floor Plan Sonification")
+    parser.add_argument("--self-test", action="store_true", help="run the test suite before starting the app")
+    parser.add_argument("--measure-startup", type=int, metavar="RUNS", help="print how long importing the app takes over RUNS runs, as JSON, and exit")
+    parser.add_argument("--trace", metavar="PATH", help="append the time each stage of the upload and click paths takes to PATH, one JSON span per line")
+    parser.add_argument("--chrome-trace", metavar="PATH", help="save the stages' spans to PATH when the app quits, to be opened in chrome://tracing")
+    parser.add_argument("--trace-memory", action="store_true", help="also record the peak memory of each span (slows the app down)")
+    args = parser.parse_args()
+    if args.trace:
+        tracing.addSink(tracing.JSONLinesSink(args.trace), args.trace_memory)
+    if args.chrome_trace:
+        tracing.addSink(tracing.ChromeTraceSink(args.chrome_trace), args.trace_memory)
+    if args.measure_startup:
+        print(json.dumps(measureStartup(args.measure_startup), indent=2))
+        sys.exit(0)
+    if args.self_test:
+        from tests import runAllTests
+        runAllTests()
     gui = Gui()
     
\ No newline at end of file
@@ -1 +1,5 @@
-from .soundGenerator import *
\ No newline at end of file
+from .soundGenerator import *
+from .backends import *
+from .offlineRenderer import *
+from .phraseCache import *
+from .audioWorker import *
\ No newline at end of file
@@ -0,0 +1,116 @@
+import queue
+
+import threading
+
+import traceback
+
+
+class AudioWorker():
+    """AudioWorker class
+        runs the speech and playback of the sound stage on its own thread, one task at a time,
+        so that the GUI never waits for them
+
+        submitting a task preempts the others: the queued tasks are dropped,
+        and the task in progress is cancelled through the cancelled event, which SoundGenerator's waits stop on
+    """
+
+    def __init__(self, cancelled=None):
+        """AudioWorker class __init__
+
+        Args:
+            cancelled (threading.Event, optional): the event that cancels the task in progress, e.g. SoundGenerator.cancelled. Defaults to a new event.
+        """
+        if cancelled is None:
+            cancelled = threading.Event()
+        self.cancelled = cancelled
+        self.tasks = queue.Queue()
+        # the number of the latest task submitted, so that the worker can tell which tasks were preempted
+        self.generation = 0
+        self.lock = threading.Lock()
+        # the number of tasks submitted that have not finished or been dropped yet, queued or running,
+        # counted as soon as they are submitted so that the worker is never idle between taking a task and running it
+        self.pending = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, task, *args):
+        """cancels every task and runs the given one as soon as the task in progress has stopped
+
+        Args:
+            task (function): the task to run on the worker's thread
+            *args: the arguments of the task
+        """
+        with self.lock:
+            self.generation += 1
+            self.dropQueued()
+            self.cancelled.set()
+            self.tasks.put((self.generation, task, args))
+            self.pending += 1
+
+    def cancel(self):
+        """cancels the task in progress and the queued tasks
+        """
+        with self.lock:
+            self.generation += 1
+            self.dropQueued()
+            self.cancelled.set()
+
+    def dropQueued(self):
+        """removes the tasks that have not started yet from the queue, to be called with the lock held
+        """
+        while True:
+            try:
+                generation, task, args = self.tasks.get_nowait()
+            except queue.Empty:
+                return
+            if task is not None:
+                self.pending -= 1
+
+    def isIdle(self):
+        """returns whether the worker has finished every task
+
+        Returns:
+            bool: True if no task is running or queued
+        """
+        with self.lock:
+            return self.pending == 0
+
+    def run(self):
+        """the worker's thread, running the tasks in the order they were submitted
+        """
+        while True:
+            generation, task, args = self.tasks.get()
+            if task is None:
+                return
+            with self.lock:
+                if generation != self.generation:
+                    # preempted before it started
+                    self.pending -= 1
+                    continue
+                # the cancellation was meant for the tasks before this one
+                self.cancelled.clear()
+            try:
+                task(*args)
+            except Exception:
+                # a failing task must not stop the worker
+                traceback.print_exc()
+            finally:
+                with self.lock:
+                    self.pending -= 1
+
+    def stop(self, timeout=1.0):
+        """cancels every task and stops the worker's thread
+
+        Args:
+            timeout (float, optional): how many seconds to wait for the task in progress to stop. Defaults to 1.0.
+        """
+        with self.lock:
+            self.generation += 1
+            self.dropQueued()
+            self.cancelled.set()
+            self.tasks.put((self.generation, None, ()))
+        self.thread.join(timeout)
+
+
+if __name__ == "__main__":
+    pass
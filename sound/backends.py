@@ -0,0 +1,381 @@
+import time
+import wave
+
+'''
+the audio backends that SoundGenerator plays its sound stage through
+
+a backend provides the listener, decodes the sound files, creates the sources that play them,
+reports whether a source is still playing, waits between sounds and speaks text
+the sources and the listener it returns have the same methods as PyOpenAL's
+(set_position, set_rolloff_factor, play, stop, destroy, move_to, set_orientation...)
+'''
+
+
+class AudioBackend():
+    """AudioBackend class
+        the interface every audio backend implements
+    """
+
+    def getListener(self):
+        """returns the listener, with a position, an orientation, move_to() and set_orientation()
+        """
+        raise NotImplementedError
+
+    def loadSound(self, path):
+        """decodes a wave file once, so that it can be shared by many sources
+
+        Args:
+            path (str): the path of the wave file
+
+        Returns:
+            the decoded sound, to be given to createSource
+        """
+        raise NotImplementedError
+
+    def createSource(self, sound):
+        """creates a source playing a decoded sound
+
+        Args:
+            sound: a sound returned by loadSound
+
+        Returns:
+            the source
+        """
+        raise NotImplementedError
+
+    def setSourceSound(self, source, sound):
+        """makes an existing source play another decoded sound
+
+        Args:
+            source: a source returned by createSource
+            sound: a sound returned by loadSound
+        """
+        raise NotImplementedError
+
+    def isPlaying(self, source):
+        """returns whether a source is still playing
+
+        Args:
+            source: a source returned by createSource
+
+        Returns:
+            bool: True while the source is playing
+        """
+        raise NotImplementedError
+
+    def wait(self, seconds, cancelled=None):
+        """waits while the sounds play
+
+        Args:
+            seconds (float): how long to wait for
+            cancelled (threading.Event, optional): stops waiting as soon as it is set. Defaults to None.
+
+        Returns:
+            bool: True if the wait was cancelled
+        """
+        raise NotImplementedError
+
+    def say(self, text):
+        """queues text to be spoken by runAndWait
+
+        Args:
+            text (str): the text to speak
+        """
+        raise NotImplementedError
+
+    def runAndWait(self):
+        """speaks the queued text, returning when it has all been spoken
+        """
+        raise NotImplementedError
+
+    def synthesize(self, text, path):
+        """writes the speech of a text to a wave file instead of speaking it
+
+        Args:
+            text (str): the text to speak
+            path (str): the path of the wave file
+        """
+        raise NotImplementedError
+
+    def getSpeechSettings(self):
+        """returns the settings the speech is synthesized with, which change how the text sounds
+
+        Returns:
+            str: the voice, rate and volume of the speech
+        """
+        raise NotImplementedError
+
+    def quit(self):
+        """releases the backend's resources
+        """
+        raise NotImplementedError
+
+
+class OpenALBackend(AudioBackend):
+    """OpenALBackend class
+        plays the sound stage through PyOpenAL (which requires an OpenAL shared library)
+        and speaks through pyttsx3, using the OS's default voice
+        both are only loaded the first time they are used, so that creating the backend is instant
+    """
+
+    def __init__(self, volume=0.75):
+        """OpenALBackend class __init__
+
+        Args:
+            volume (float, optional): the volume of the speech. Defaults to 0.75 to match the rest of the sound stage.
+        """
+        self.volume = volume
+        self.openal = None
+        self.engine = None
+
+    def getOpenAL(self):
+        """returns the openal module, importing it the first time it is needed
+
+        Returns:
+            module: PyOpenAL
+        """
+        if self.openal is None:
+            import openal
+            self.openal = openal
+        return self.openal
+
+    def getEngine(self):
+        """returns the pyttsx3 engine, starting it the first time it is needed
+
+        Returns:
+            pyttsx3.Engine: the speech engine
+        """
+        if self.engine is None:
+            import pyttsx3
+            # using pyttsx3 to speak the location, using the OS's default voice
+            engine = pyttsx3.init()
+            # try and set the voice to an english synthesizer
+            voices = engine.getProperty('voices')
+            for voice in voices:
+                if "English" in voice.name:
+                    engine.setProperty('voice', voice.id)
+            engine.setProperty('volume', self.volume)
+            self.engine = engine
+        return self.engine
+
+    def getListener(self):
+        openal = self.getOpenAL()
+        # the listener is only heard once the device is open
+        openal.oalInit()
+        return openal.oalGetListener()
+
+    def loadSound(self, path):
+        openal = self.getOpenAL()
+        return openal.Buffer(openal.WaveFile(path))
+
+    def createSource(self, sound):
+        return self.getOpenAL().Source(sound)
+
+    def setSourceSound(self, source, sound):
+        # rebound through Source.set, PyOpenAL's public setter of any AL_ property of a source, rather than the private _set_buffer
+        # the source's buffer attribute is kept in step, as Source.destroy reads it when the source owns its buffer
+        source.set(self.getOpenAL().AL_BUFFER, int(sound.id.value))
+        source.buffer = sound
+
+    def isPlaying(self, source):
+        return source.get_state() == self.getOpenAL().AL_PLAYING
+
+    def wait(self, seconds, cancelled=None):
+        if cancelled is None:
+            time.sleep(seconds)
+            return False
+        return cancelled.wait(seconds)
+
+    def say(self, text):
+        self.getEngine().say(text)
+
+    def runAndWait(self):
+        self.getEngine().runAndWait()
+
+    def synthesize(self, text, path):
+        # depending on the OS's speech driver, the file may not be a wave file (e.g. AIFF on macOS)
+        engine = self.getEngine()
+        engine.save_to_file(text, path)
+        engine.runAndWait()
+
+    def getSpeechSettings(self):
+        engine = self.getEngine()
+        return "pyttsx3 " + " ".join(str(engine.getProperty(name)) for name in ("voice", "rate", "volume"))
+
+    def quit(self):
+        if self.openal is not None:
+            self.openal.oalQuit()
+
+
+class NullListener():
+    """NullListener class
+        the listener of the NullBackend, which only keeps track of its position and orientation
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.position = (0.0, 0.0, 0.0)
+        # the same default orientation as OpenAL's listener
+        self.orientation = (0.0, 0.0, -1.0, 0.0, 1.0, 0.0)
+
+    def move_to(self, position):
+        self.position = tuple(position)
+        self.backend.record("moveListener", position=self.position)
+
+    def set_orientation(self, orientation):
+        self.orientation = tuple(orientation)
+        self.backend.record("orientListener", orientation=self.orientation)
+
+
+class NullSound():
+    """NullSound class
+        a sound of the NullBackend, of which only the name and duration are read from the wave file
+    """
+
+    def __init__(self, path):
+        self.name = path
+        with wave.open(path) as waveFile:
+            self.duration = waveFile.getnframes() / float(waveFile.getframerate())
+
+    def destroy(self):
+        pass
+
+
+class NullSource():
+    """NullSource class
+        a source of the NullBackend, which records what it is asked to do instead of playing
+    """
+
+    def __init__(self, backend, sound, number):
+        self.backend = backend
+        self.sound = sound
+        self.number = number
+        self.position = (0.0, 0.0, 0.0)
+        self.rolloffFactor = 1.0
+        # the backend's clock time at which the sound stops playing
+        self.endTime = None
+
+    def set_position(self, position):
+        self.position = tuple(position)
+
+    def set_rolloff_factor(self, value):
+        self.rolloffFactor = value
+
+    def play(self):
+        self.endTime = self.backend.clock + self.sound.duration
+        self.backend.record("play", source=self.number, sound=self.sound.name, position=self.position, duration=self.sound.duration)
+
+    def stop(self):
+        if self.endTime is not None and self.backend.clock < self.endTime:
+            self.backend.record("stop", source=self.number)
+        self.endTime = None
+
+    def destroy(self):
+        self.endTime = None
+
+
+class NullBackend(AudioBackend):
+    """NullBackend class
+        a headless backend that records the events of the sound stage instead of playing them,
+        so that the sound stage can be built, tested and timed without a sound device
+
+        waiting only moves the backend's clock forward, without sleeping,
+        so every event is recorded with both the time it would have happened at during playback (time)
+        and the real time it was recorded at (wallTime), in seconds since the backend was created
+    """
+
+    def __init__(self, speechRate=15.0):
+        """NullBackend class __init__
+
+        Args:
+            speechRate (float, optional): how many characters per second are spoken, to time the speech. Defaults to 15.
+        """
+        self.speechRate = speechRate
+        self.listener = NullListener(self)
+        self.events = []
+        self.sourceCount = 0
+        self.speechQueue = []
+        self.clock = 0.0
+        self.startTime = time.perf_counter()
+
+    def record(self, event, **details):
+        """records an event, with the time it happened at
+
+        Args:
+            event (str): the name of the event (e.g. "play")
+            **details: anything else to record about the event
+        """
+        details["event"] = event
+        details["time"] = self.clock
+        details["wallTime"] = time.perf_counter() - self.startTime
+        self.events.append(details)
+
+    def getEvents(self, event=None):
+        """returns the recorded events, in the order they happened
+
+        Args:
+            event (str, optional): only return the events with this name. Defaults to every event.
+
+        Returns:
+            list: the events as dicts, each with an "event" name, a "time" and a "wallTime"
+        """
+        if event is None:
+            return list(self.events)
+        return [details for details in self.events if details["event"] == event]
+
+    def clearEvents(self):
+        """forgets the recorded events, e.g. between two clicks
+        """
+        self.events = []
+
+    def getListener(self):
+        return self.listener
+
+    def loadSound(self, path):
+        return NullSound(path)
+
+    def createSource(self, sound):
+        self.sourceCount += 1
+        return NullSource(self, sound, self.sourceCount)
+
+    def setSourceSound(self, source, sound):
+        source.sound = sound
+
+    def isPlaying(self, source):
+        return source.endTime is not None and self.clock < source.endTime
+
+    def wait(self, seconds, cancelled=None):
+        # a cancelled wait ends straight away
+        if cancelled is not None and cancelled.is_set():
+            return True
+        self.clock += seconds
+        return False
+
+    def say(self, text):
+        self.speechQueue.append(text)
+
+    def runAndWait(self):
+        for text in self.speechQueue:
+            self.record("say", text=text)
+            self.clock += len(text) / self.speechRate
+        self.speechQueue = []
+
+    def synthesize(self, text, path):
+        # silence that lasts as long as the text would take to say
+        self.record("synthesize", text=text)
+        sampleRate = 16000
+        with wave.open(path, "wb") as waveFile:
+            waveFile.setnchannels(1)
+            waveFile.setsampwidth(2)
+            waveFile.setframerate(sampleRate)
+            waveFile.writeframes(b"\x00\x00" * int(len(text) / self.speechRate * sampleRate))
+
+    def getSpeechSettings(self):
+        return "null " + str(self.speechRate)
+
+    def quit(self):
+        self.record("quit")
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,212 @@
+import math
+
+import numpy as np
+
+import os
+
+import wave
+
+from .backends import NullBackend
+from .soundGenerator import SoundGenerator
+
+
+def readWave(path):
+    """decodes a wave file to floats
+
+    Args:
+        path (str): the path of the wave file
+
+    Returns:
+        numpy ndarray, int: the mono float32 samples between -1 and 1, and the sample rate
+    """
+    with wave.open(path) as waveFile:
+        channels = waveFile.getnchannels()
+        sampleWidth = waveFile.getsampwidth()
+        sampleRate = waveFile.getframerate()
+        frames = waveFile.readframes(waveFile.getnframes())
+    if sampleWidth == 1:
+        # 8 bit wave files are unsigned
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif sampleWidth in (2, 4):
+        dtype = np.int16 if sampleWidth == 2 else np.int32
+        samples = np.frombuffer(frames, dtype=dtype).astype(np.float32) / float(2 ** (8 * sampleWidth - 1))
+    else:
+        raise ValueError("Only 8, 16 and 32 bit wave files can be read")
+    # sources are mono, as OpenAL only positions mono sounds
+    return samples.reshape(-1, channels).mean(axis=1), sampleRate
+
+
+def writeWave(path, samples, sampleRate):
+    """writes stereo float samples to a 16 bit wave file
+
+    Args:
+        path (str): the path of the wave file
+        samples (numpy ndarray): (n, 2) float array of samples between -1 and 1
+        sampleRate (int): the sample rate
+    """
+    frames = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, "wb") as waveFile:
+        waveFile.setnchannels(2)
+        waveFile.setsampwidth(2)
+        waveFile.setframerate(sampleRate)
+        waveFile.writeframes(frames.tobytes())
+
+
+class OfflineRenderer():
+    """OfflineRenderer class
+        renders what a listener hears at a position on the grid to a stereo buffer, without a sound device
+        the openings heard, and whether they sound like doors or windows, are decided as by SoundGenerator
+        each opening's sound is attenuated with OpenAL's default inverse distance model
+        (the rolloff factor of 1.0 set by SoundGenerator) and panned with the listener's orientation
+    """
+
+    def __init__(self, grid, openingDict=None, visibility=None, hearingMode="ray", rolloffFactor=1.0, referenceDistance=1.0, sequential=False, gap=0.1):
+        """OfflineRenderer class __init__
+
+        Args:
+            grid (Grid): the grid the listener is on
+            openingDict (dict, optional): the openings that make sounds, in the format {int(1): Opening()...}. Defaults to the grid's openings.
+            visibility (VisibilityIndex, optional): the precomputed cells each opening can be heard from. Defaults to the grid's visibility index.
+            hearingMode (str, optional): how the openings heard are decided, see SoundGenerator.hearingModes. Defaults to "ray".
+            rolloffFactor (float, optional): how quickly the sounds fade with distance. Defaults to 1.0.
+            referenceDistance (float, optional): the distance under which the sounds are not attenuated. Defaults to 1.0.
+            sequential (bool, optional): play the openings one after the other, as SoundGenerator.playOpeningSources does, instead of all at once. Defaults to False.
+            gap (float, optional): the seconds of silence between the openings when sequential. Defaults to 0.1.
+        """
+        if openingDict is None:
+            openingDict = grid.getOpenings()
+        self.grid = grid
+        self.openingDict = openingDict
+        # decides the openings heard and their sounds without playing them
+        self.soundGenerator = SoundGenerator(grid, openingDict, visibility=visibility, hearingMode=hearingMode, backend=NullBackend())
+        self.rolloffFactor = rolloffFactor
+        self.referenceDistance = referenceDistance
+        self.sequential = sequential
+        self.gap = gap
+        # the door and window sounds are decoded once
+        soundDirectory = os.path.dirname(os.path.abspath(__file__))
+        self.sounds = dict()
+        self.sampleRate = None
+        for name in ("door", "window"):
+            samples, sampleRate = readWave(os.path.join(soundDirectory, name + ".wav"))
+            if self.sampleRate is not None and sampleRate != self.sampleRate:
+                raise ValueError("The door and window sounds must have the same sample rate")
+            self.sampleRate = sampleRate
+            self.sounds[name] = samples
+        # facing north, as SoundGenerator's listener starts
+        self.defaultOrientation = (0.0, -1.0, 0.0, 0.0, 0.0, -1.0)
+
+    def getGains(self, x, y, positions, orientation):
+        """computes the left and right gains of sounds at the given positions
+
+        Args:
+            x (int): x coordinate of the listener
+            y (int): y coordinate of the listener
+            positions (numpy ndarray): (n, 2) array of the x, y coordinates of the sounds
+            orientation (tuple): the listener's orientation as (frontX, frontY, frontZ, upX, upY, upZ)
+
+        Returns:
+            numpy ndarray: (n, 2) array of the left and right gain of each sound
+        """
+        offsets = positions - np.array([x, y], dtype=np.float64)
+        distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        # OpenAL's inverse distance clamped model
+        clamped = np.maximum(distances, self.referenceDistance)
+        gains = self.referenceDistance / (self.referenceDistance + self.rolloffFactor * (clamped - self.referenceDistance))
+        # the listener's right is the cross product of its front and up vectors
+        front = np.array(orientation[:3], dtype=np.float64)
+        up = np.array(orientation[3:], dtype=np.float64)
+        right = np.cross(front, up)[:2]
+        # pan from -1 (left) to 1 (right), sounds on the listener are centred
+        pans = np.divide(offsets @ right, distances, out=np.zeros_like(distances), where=distances > 0)
+        # equal power panning
+        angles = (pans + 1) * math.pi / 4
+        return np.stack((np.cos(angles), np.sin(angles)), axis=1) * gains[:, np.newaxis]
+
+    def getOpenings(self, x, y):
+        """returns the openings heard from the given x,y coordinates and their sounds
+
+        Args:
+            x (int): x coordinate of the listener
+            y (int): y coordinate of the listener
+
+        Returns:
+            list: (opening, "door" or "window") pairs, in opening dict order
+        """
+        openings = self.soundGenerator.getOpeningSources(x, y)
+        # the listener moves recorded by the backend are not needed
+        self.soundGenerator.backend.clearEvents()
+        return [(opening, self.soundGenerator.getOpeningSound(opening, x, y)) for opening in openings]
+
+    def render(self, x, y, orientation=None):
+        """renders what the listener hears at the given x,y coordinates
+
+        Args:
+            x (int): x coordinate of the listener
+            y (int): y coordinate of the listener
+            orientation (tuple, optional): the listener's orientation as (frontX, frontY, frontZ, upX, upY, upZ). Defaults to facing north.
+
+        Returns:
+            numpy ndarray: (n, 2) float32 array of the left and right samples, silent when no openings are heard
+        """
+        if orientation is None:
+            orientation = self.defaultOrientation
+        heard = self.getOpenings(x, y)
+        if len(heard) == 0:
+            return np.zeros((0, 2), dtype=np.float32)
+        positions = np.array([self.soundGenerator.getSourcePosition(opening, x, y) for opening, sound in heard], dtype=np.float64)
+        gains = self.getGains(x, y, positions, orientation)
+
+        if not self.sequential:
+            # all the openings start together, so every opening with the same sound adds up to a single gain
+            output = np.zeros((max(len(self.sounds[sound]) for opening, sound in heard), 2), dtype=np.float32)
+            for name, samples in self.sounds.items():
+                soundGains = gains[[sound == name for opening, sound in heard]].sum(axis=0)
+                if soundGains.any():
+                    output[:len(samples)] += samples[:, np.newaxis] * soundGains.astype(np.float32)
+            return output
+
+        gapLength = int(round(self.gap * self.sampleRate))
+        lengths = [len(self.sounds[sound]) for opening, sound in heard]
+        starts = np.concatenate(([0], np.cumsum(np.array(lengths[:-1]) + gapLength))).astype(np.int64)
+        output = np.zeros((starts[-1] + lengths[-1], 2), dtype=np.float32)
+        for (opening, sound), start, soundGains in zip(heard, starts, gains):
+            samples = self.sounds[sound]
+            output[start:start + len(samples)] += samples[:, np.newaxis] * soundGains.astype(np.float32)
+        return output
+
+    def renderToWave(self, path, x, y, orientation=None):
+        """renders what the listener hears at the given x,y coordinates to a stereo wave file
+
+        Args:
+            path (str): the path of the wave file
+            x (int): x coordinate of the listener
+            y (int): y coordinate of the listener
+            orientation (tuple, optional): the listener's orientation. Defaults to facing north.
+        """
+        writeWave(path, self.render(x, y, orientation), self.sampleRate)
+
+    def renderMany(self, positions, orientation=None, directory=None):
+        """renders many listener positions, one after the other
+
+        Args:
+            positions (list): the (x, y) coordinates of the listener
+            orientation (tuple, optional): the listener's orientation. Defaults to facing north.
+            directory (str, optional): write each position to "x_y.wav" in this directory instead of returning the arrays. Defaults to None.
+
+        Returns:
+            list: the rendered array of each position, or the paths of the wave files if a directory was given
+        """
+        results = []
+        for x, y in positions:
+            if directory is None:
+                results.append(self.render(x, y, orientation))
+            else:
+                path = os.path.join(directory, str(x) + "_" + str(y) + ".wav")
+                self.renderToWave(path, x, y, orientation)
+                results.append(path)
+        return results
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,171 @@
+import hashlib
+
+import os
+
+from collections import OrderedDict
+
+
+class PhraseCache():
+    """PhraseCache class
+        a cache on disk of the spoken phrases of the sound stage, synthesized once to wave files,
+        so that speaking a sentence is playing already synthesized clips rather than synthesizing it again
+
+        every file is named after the hash of its text and the speech settings it was synthesized with
+        only the phrases are cached, the sentences are spoken by playing their phrases' clips one after the other,
+        so that the clips of the phrases that repeat from click to click are not evicted by one-off sentences
+        when the files are larger than maxBytes, the least recently used ones are deleted
+    """
+
+    def __init__(self, directory, synthesize, settings="", maxBytes=64 * 1024 * 1024):
+        """PhraseCache class __init__
+
+        Args:
+            directory (str): the directory the wave files are kept in, created if needed
+            synthesize (function): writes the speech of a text to a wave file, called as synthesize(text, path) (e.g. AudioBackend.synthesize)
+            settings (str or function, optional): the voice, rate and volume of the speech, so that changing them does not reuse old clips,
+                or a function returning them (e.g. AudioBackend.getSpeechSettings), only called when a clip is first needed. Defaults to "".
+            maxBytes (int, optional): how large the cache can grow on disk. Defaults to 64MB.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.synthesize = synthesize
+        self.settings = settings
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        # the size of every clip, the least recently used first, read from the directory once
+        # so that looking up and evicting clips does not scan the directory again
+        self.files = OrderedDict((path, fileSize) for lastUse, fileSize, path in self.getFiles())
+        self.bytes = sum(self.files.values())
+
+    def getPath(self, text):
+        """returns the path of the clip of a phrase
+
+        Args:
+            text (str): the phrase
+
+        Returns:
+            str: the path of the clip's wave file
+        """
+        if callable(self.settings):
+            self.settings = self.settings()
+        key = hashlib.sha1("\0".join((self.settings, text)).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key + ".wav")
+
+    def lookup(self, path):
+        """returns whether a clip is in the cache, marking it as recently used
+
+        Args:
+            path (str): the path of the clip's wave file
+
+        Returns:
+            bool: True if the clip is cached
+        """
+        if path in self.files:
+            try:
+                # the time of last use is kept on disk, so that the order of use outlasts the app
+                os.utime(path)
+                self.files.move_to_end(path)
+                self.hits += 1
+                return True
+            except FileNotFoundError:
+                # deleted from outside the cache
+                self.bytes -= self.files.pop(path)
+        self.misses += 1
+        return False
+
+    def getPhrase(self, text):
+        """returns the clip of a phrase, synthesizing it if it is not cached yet
+
+        Args:
+            text (str): the phrase
+
+        Returns:
+            str: the path of the phrase's wave file
+        """
+        path = self.getPath(text)
+        if not self.lookup(path):
+            # synthesized to a temporary file first, so that an interrupted synthesis is never cached
+            temporaryPath = path + ".tmp"
+            self.synthesize(text, temporaryPath)
+            os.replace(temporaryPath, path)
+            self.files[path] = os.path.getsize(path)
+            self.bytes += self.files[path]
+            self.evict(keep=[path])
+        return path
+
+    def getSpeech(self, sentences, phrasePause=0.05, sentencePause=0.3):
+        """returns the clips of sentences made of phrases, to be played one after the other,
+        synthesizing the phrases that are not cached yet
+
+        Args:
+            sentences (list): the sentences, each a list of phrases
+            phrasePause (float, optional): the seconds of silence between phrases. Defaults to 0.05.
+            sentencePause (float, optional): the seconds of silence between sentences. Defaults to 0.3.
+
+        Returns:
+            list: the path of every phrase's wave file, and the seconds of silence after it, in the order they are spoken
+        """
+        clips = []
+        for sentence in sentences:
+            for i, phrase in enumerate(sentence):
+                clips.append((self.getPhrase(phrase), phrasePause if i < len(sentence) - 1 else sentencePause))
+        return clips
+
+    def warm(self, phrases, cancelled=None):
+        """synthesizes the given phrases ahead of time, stopping between two phrases once cancelled
+
+        Args:
+            phrases (list): the phrases to synthesize
+            cancelled (threading.Event, optional): stops warming as soon as it is set, e.g. AudioWorker.cancelled when there is a click. Defaults to None.
+        """
+        for phrase in phrases:
+            if cancelled is not None and cancelled.is_set():
+                return
+            self.getPhrase(phrase)
+
+    def getFiles(self):
+        """returns the clips in the cache directory, the least recently used first
+
+        Returns:
+            list: (last use time, size in bytes, path) of every clip
+        """
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".wav"):
+                status = entry.stat()
+                files.append((status.st_mtime, status.st_size, entry.path))
+        return sorted(files)
+
+    def evict(self, keep=()):
+        """deletes the least recently used clips until the cache fits in maxBytes
+
+        Args:
+            keep (list, optional): the paths of clips not to delete, e.g. the one just synthesized. Defaults to ().
+        """
+        for path, fileSize in list(self.files.items()):
+            if self.bytes <= self.maxBytes:
+                break
+            if path in keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            del self.files[path]
+            self.bytes -= fileSize
+
+    def getStats(self):
+        """returns how well the cache is doing
+
+        Returns:
+            dict: {"hits": int, "misses": int, "files": int, "bytes": int}
+        """
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "files": len(self.files),
+                "bytes": self.bytes}
+
+
+if __name__ == "__main__":
+    pass
@@ -1,13 +1,29 @@
-# import PyOpenAL (will require an OpenAL shared library)
-from openal import * 
-
-import pyttsx3
-
 import math
 
+import numpy as np
+
 import os
-# import the time module, for sleeping during playback
-import time
+
+import threading
+
+import wave
+
+from map.tracing import traced
+
+from .backends import OpenALBackend
+
+
+def getWaveDuration(path):
+    """reads how long a wave file lasts from its header
+
+    Args:
+        path (str): the path of the wave file
+
+    Returns:
+        float: the duration of the wave file in seconds
+    """
+    with wave.open(path) as waveFile:
+        return waveFile.getnframes() / float(waveFile.getframerate())
 
 '''
 OpenAl uses a right-handed Cartesian coordinate system (RHS), 
@@ -22,46 +38,172 @@ where
 (frontX, frontY, frontZ, upX, upY, upZ)
 '''
 
+class SourcePool():
+    """SourcePool class
+        a reusable pool of sources, so that sources are reassigned to openings on each click
+        instead of being created (and their sound files decoded) every time
+    """
+
+    def __init__(self, backend):
+        """SourcePool class __init__
+
+        Args:
+            backend (AudioBackend): the backend the sources are created with
+        """
+        self.backend = backend
+        self.sources = []
+        # the amount of sources at the start of the pool that are currently assigned
+        self.inUse = 0
+
+    def acquire(self, buffer):
+        """returns an unassigned source from the pool, playing the given buffer,
+        creating a new source only when every source in the pool is in use
+
+        Args:
+            buffer: the decoded sound for the source to play, from the backend's loadSound
+
+        Returns:
+            the source, from the backend's createSource
+        """
+        if self.inUse < len(self.sources):
+            source = self.sources[self.inUse]
+            source.stop()
+            self.backend.setSourceSound(source, buffer)
+        else:
+            source = self.backend.createSource(buffer)
+            self.sources.append(source)
+        self.inUse += 1
+        return source
+
+    def releaseAll(self):
+        """stops every source and makes them all available to be reassigned
+        """
+        for source in self.sources[:self.inUse]:
+            source.stop()
+        self.inUse = 0
+
+    def destroy(self):
+        """releases the resources of every source in the pool
+        """
+        for source in self.sources:
+            source.destroy()
+        self.sources = []
+        self.inUse = 0
+
+
 class SoundGenerator():
-    def __init__(self, grid, openingDict):
+    # the ways of deciding which openings the listener can hear:
+    # "ray" - an unobstructed line from the listener to the opening's center
+    # "fieldOfView" - any of the opening's pixels in the listener's field of view, found in a single sweep
+    # "propagation" - any opening whose sound reaches the listener around the walls (see PropagationField),
+    #   placed further away the longer the path its sound travels
+    hearingModes = ("ray", "fieldOfView", "propagation")
+
+    def __init__(self, grid, openingDict, visibility=None, hearingMode="ray", backend=None, phraseCache=None, stagger=None, maxDuration=None, propagation=None,
+                 tracer=None):
+        if hearingMode not in self.hearingModes:
+            raise ValueError("The hearing mode must be one of " + str(self.hearingModes))
         self.grid = grid
         self.openingDict = openingDict
+        self.hearingMode = hearingMode
+        # precomputed cells each opening can be heard from (see Grid.buildVisibilityIndex)
+        # without it, the lines to every opening are checked on each click
+        if visibility is None:
+            visibility = grid.getVisibilityIndex()
+        self.visibility = visibility
+        # precomputed path distances from every cell to each opening, for the "propagation" hearing mode
+        if propagation is None and hearingMode == "propagation":
+            propagation = grid.getPropagationField()
+            if propagation is None:
+                propagation = grid.buildPropagationField()
+        self.propagation = propagation
+        # the tracer the spans of the click path are recorded with (see map/tracing.py), none are recorded without one
+        self.tracer = tracer
+        # the key of each opening, to look up its propagation field
+        self.openingKeys = {opening: key for key, opening in openingDict.items()}
+        # each opening's pixels labelled with its key, so that a line to an opening can ignore the opening itself
+        self.openingLabels = np.zeros((grid.getSizeX(), grid.getSizeY()), dtype=np.int64)
+        for key, opening in openingDict.items():
+            pixels = np.array(opening.getPixels()).reshape(-1, 2)
+            self.openingLabels[pixels[:, 0], pixels[:, 1]] = key
+        # the sound stage is played and spoken through an audio backend (see backends.py),
+        # OpenAL and pyttsx3 unless another one is given, e.g. a NullBackend to run without a sound device
+        if backend is None:
+            backend = OpenALBackend()
+        self.backend = backend
+        # the door and window sounds are decoded once, and shared by every source that plays them
+        # the backend stays open until quit() is called
+        soundDirectory = os.path.dirname(os.path.abspath(__file__))
+        self.buffers = {"door": backend.loadSound(os.path.join(soundDirectory, "door.wav")),
+                        "window": backend.loadSound(os.path.join(soundDirectory, "window.wav"))}
+        self.durations = {"door": getWaveDuration(os.path.join(soundDirectory, "door.wav")),
+                          "window": getWaveDuration(os.path.join(soundDirectory, "window.wav"))}
+        self.sourcePool = SourcePool(backend)
+        # how long the sound of each source assigned by prepareOpeningSources lasts
+        self.sourceDurations = dict()
+        # set to stop the speech and playback in progress, e.g. by an AudioWorker when there is a new click
+        self.cancelled = threading.Event()
+        # when the openings start playing (see scheduleOpeningSources):
+        # one after the other when stagger is None, otherwise every stagger seconds (0 for all together)
+        # and the most seconds the openings of a click can take, None for no limit
+        self.stagger = stagger
+        self.maxDuration = maxDuration
+        # the silence between openings played one after the other
+        self.gap = 0.1
+        # already synthesized phrases to speak (see phraseCache.py), the text is synthesized on each click without it
+        self.phraseCache = phraseCache
+        # the phrases' clips decoded once, by path, so that speaking a phrase again only plays it
+        self.phraseSounds = dict()
         # default orientation starts facing north
-        self.listener = oalGetListener()
-        self.listener.orientation = (0.0, -1.0, 0.0, 0.0, 0.0, -1.0)
+        self.listener = backend.getListener()
+        self.listener.set_orientation((0.0, -1.0, 0.0, 0.0, 0.0, -1.0))
         
         self.facing = {(0.0, -1.0, 0.0, 0.0, 0.0, -1.0): "North", 
                 (1.0, 0.0, 0.0, 0.0, 0.0, -1.0): "East",
                 (0.0, 1.0, 0.0, 0.0, 0.0, -1.0): "South",
                 (-1.0, 0.0, 0.0, 0.0, 0.0, -1.0): "West"}
-
-        
-        # using pyttsx3 to speak the location, using the OS's default voice
-        self.engine = pyttsx3.init()
-        
-        # try and set the voice to an english synthesizer
-        voices = self.engine.getProperty('voices')  
-        for voice in voices:
-            if "English" in voice.name:
-                self.engine.setProperty('voice', voice.id)
-        # fix volume to match rest of sound stage
-        self.engine.setProperty('volume', 0.75)
         
         
 
+    @traced("SoundGenerator.sayLocation", tracerAttribute="tracer")
     def sayLocation(self, x, y):
-        """ say the location, quadrant, orientation of the listener in the room and the tile they are standing on 
+        """ say the location, quadrant, orientation of the listener in the room and the tile they are standing on,
+        and the rooms their room opens onto if the grid has a room index
 
         Args:
             x (int): x coordinate of the listener
             y (int): y coordinate of the listener
         """        
-        
-        
-        self.engine.say("You are standing in the " + str(self.findQuadrant(x, y)) + "quadrant of the floorplan, facing " + str(self.facing[self.listener.orientation]))
-        self.engine.say("From the top-left corner, you are " + str(y) + " down, and " + str(x) + " across")
-        self.engine.say("There is " + str(self.grid.getTileType(x, y)) + " here")
-        self.engine.runAndWait()
+        # split into phrases that repeat from click to click, so that they can be cached
+        self.speak([["You are standing in the " + str(self.findQuadrant(x, y)) + " quadrant of the floorplan,", "facing " + str(self.facing[self.listener.orientation])],
+                    ["From the top-left corner, you are", str(y) + " down, and", str(x) + " across"],
+                    ["There is " + str(self.grid.getTileType(x, y)) + " here"]] + self.getRoomSentences(x, y))
+
+    def getRoomSentences(self, x, y):
+        """ returns the sentences describing the rooms the listener's room opens onto, looked up in the grid's room index
+        (see Grid.buildRoomIndex), none if the grid has no room index or the listener is not in a room
+
+        Args:
+            x (int): x coordinate of the listener
+            y (int): y coordinate of the listener
+
+        Returns:
+            list: the sentences, each a list of phrases
+        """
+        rooms = self.grid.getRoomIndex()
+        if rooms is None:
+            return []
+        room = rooms.getRoom(x, y)
+        if room is None:
+            return []
+        # each kind of room once, so that the phrases repeat from click to click
+        tiles = list(dict.fromkeys(rooms.getTile(otherRoom) for otherRoom in sorted(rooms.getConnections(room))))
+        if not tiles:
+            return []
+        sentence = ["This room opens onto the", tiles[0]]
+        for tile in tiles[1:]:
+            sentence.extend(["and the", tile])
+        return [sentence]
         
     def sayOrientationChange(self, newOrientation):
         """ say the orientation change of the listener
@@ -70,8 +212,110 @@ class SoundGenerator():
             newOrientation (string): hat direction of the listener in the format e.g. "HatUp.png"
         """        
         facing = {"HatUp.png": "north", "HatDown.png": "south", "HatLeft.png": "west", "HatRight.png": "east"}
-        self.engine.say("You are now facing " + str(facing[newOrientation]))
-        self.engine.runAndWait()
+        self.speak([["You are now facing " + str(facing[newOrientation])]])
+
+    def speak(self, sentences):
+        """ speak sentences, from the phrase cache if there is one, otherwise by synthesizing them
+
+        Args:
+            sentences (list): the sentences, each a list of phrases
+        """
+        if self.phraseCache is not None:
+            try:
+                clips = [(self.getPhraseSound(path), pause) for path, pause in self.phraseCache.getSpeech(sentences)]
+            except (wave.Error, EOFError):
+                # the speech driver did not write wave files (e.g. AIFF on macOS)
+                clips = None
+            if clips is not None:
+                self.playClips(clips)
+                return
+        for sentence in sentences:
+            self.backend.say(" ".join(sentence))
+        self.backend.runAndWait()
+
+    def getPhraseSound(self, path):
+        """ returns the decoded sound of a phrase's clip, decoding it the first time it is spoken
+
+        Args:
+            path (str): the path of the phrase's wave file
+
+        Returns:
+            tuple: the sound from the backend's loadSound, and how long it lasts in seconds
+        """
+        phraseSound = self.phraseSounds.get(path)
+        if phraseSound is None:
+            phraseSound = (self.backend.loadSound(path), getWaveDuration(path))
+            self.phraseSounds[path] = phraseSound
+        return phraseSound
+
+    def playClips(self, clips):
+        """ play the clips of phrases one after the other at the listener's position, through a single source,
+        returning when they have finished or the playback is cancelled
+
+        Args:
+            clips (list): the (sound, duration) of each phrase (see getPhraseSound), and the seconds of silence after it
+        """
+        source = None
+        for i, ((sound, duration), pause) in enumerate(clips):
+            if source is None:
+                source = self.backend.createSource(sound)
+            else:
+                self.backend.setSourceSound(source, sound)
+            source.set_position(self.listener.position)
+            source.play()
+            if not self.waitForSource(source, duration):
+                break
+            if i < len(clips) - 1 and self.backend.wait(pause, self.cancelled):
+                break
+        if source is not None:
+            source.destroy()
+
+    def waitForSource(self, source, duration):
+        """ wait until a source has finished playing, or until the playback is cancelled
+
+        Args:
+            source: the playing source
+            duration (float): how long the source's sound lasts, in seconds
+
+        Returns:
+            bool: True if the source finished playing, False if it was cancelled and stopped
+        """
+        # sleep until the sound should be over, rather than polling it
+        cancelled = self.backend.wait(duration, self.cancelled)
+        # the device can lag slightly behind the clock
+        while not cancelled and self.backend.isPlaying(source):
+            cancelled = self.backend.wait(0.01, self.cancelled)
+        if cancelled:
+            source.stop()
+        return not cancelled
+
+    def getPhrases(self, coordinates=True):
+        """ returns every phrase that sayLocation and sayOrientationChange can speak, e.g. to warm the phrase cache with
+
+        Args:
+            coordinates (bool, optional): include the phrases of every x and y coordinate of the grid. Defaults to True.
+
+        Returns:
+            list: the phrases
+        """
+        phrases = ["From the top-left corner, you are"]
+        for quadrant in ("top-left", "top-right", "bottom-left", "bottom-right"):
+            phrases.append("You are standing in the " + quadrant + " quadrant of the floorplan,")
+        for direction in self.facing.values():
+            phrases.append("facing " + direction)
+        for direction in ("north", "south", "west", "east"):
+            phrases.append("You are now facing " + direction)
+        for tile, count in self.grid.getTileCounts().items():
+            if count > 0:
+                phrases.append("There is " + str(tile) + " here")
+        rooms = self.grid.getRoomIndex()
+        if rooms is not None:
+            phrases.extend(["This room opens onto the", "and the"])
+            phrases.extend(dict.fromkeys(rooms.getTile(room) for room in rooms.getRooms()))
+        if coordinates:
+            phrases.extend(str(y) + " down, and" for y in range(self.grid.getSizeY()))
+            phrases.extend(str(x) + " across" for x in range(self.grid.getSizeX()))
+        return phrases
         
         # function that returns either top-left, top-right, bottom-left, or bottom-right quadrant where the given x,y coordinates are in the grid
     def findQuadrant(self, x, y):
@@ -95,6 +339,7 @@ class SoundGenerator():
         
         
         
+    @traced("SoundGenerator.prepareOpeningSources", tracerAttribute="tracer")
     def prepareOpeningSources(self, x, y):
         """ prepare the opening sources for playback 
 
@@ -102,28 +347,49 @@ class SoundGenerator():
             listener: the listener object
         """        
         self.listener.move_to((x, y, 0))
+        # the sources of the previous click are reassigned to this one
+        self.sourcePool.releaseAll()
+        self.sourceDurations = dict()
         # check listener is within grid boundary
-        if 0 <= self.listener.position[0] < self.grid.getSizeX() and 0 <= self.listener.position[0] < self.grid.getSizeY(): 
+        if 0 <= self.listener.position[0] < self.grid.getSizeX() and 0 <= self.listener.position[1] < self.grid.getSizeY(): 
             openings = self.openingDict.values()
             for opening in openings:
                 coords = opening.getLocation()
-                # check if the opening is a door or a window as seen from the listener's location
-                isDoor = not self.grid.otherSide(int(self.listener.position[0]), int(self.listener.position[1]), int(coords[0]), int(coords[1]), len(opening.getPixels())) == "background"
-                if isDoor:
-                    # open the mono wave file
-                    door = os.path.join(os.getcwd(), "sound", "door.wav")
-                    source = oalOpen(door)
-                else:
-                    window = os.path.join(os.getcwd(), "sound", "window.wav")
-                    source = oalOpen(window)
+                # play the already decoded mono wave file from a pooled source
+                sound = self.getOpeningSound(opening, int(self.listener.position[0]), int(self.listener.position[1]))
+                source = self.sourcePool.acquire(self.buffers[sound])
+                self.sourceDurations[source] = self.durations[sound]
                 
                 # increase the sound "dampening" to emulate a real room
                 source.set_rolloff_factor(1.0)
                 
-                source.set_position((coords[0], coords[1], 0))
+                sourceX, sourceY = self.getSourcePosition(opening, int(self.listener.position[0]), int(self.listener.position[1]))
+                source.set_position((sourceX, sourceY, 0))
                 opening.setSoundSource(source)
         return self.listener
     
+    def getOpeningSound(self, opening, x, y):
+        """decides whether an opening sounds like a door or a window from the given x,y coordinates,
+        i.e. whether the other side of the opening is inside or outside the floor plan
+
+        Args:
+            opening (Opening): the opening
+            x (int): x coordinate of the listener
+            y (int): y coordinate of the listener
+
+        Returns:
+            string: "door" or "window"
+        """
+        # using the classification made for the listener's side of the opening by Grid.classifyOpenings
+        otherSideTile = opening.getOtherSideTile(x, y)
+        if otherSideTile is None:
+            # the listener is in line with the opening (or it was never classified)
+            coords = opening.getLocation()
+            otherSideTile = self.grid.otherSide(x, y, int(coords[0]), int(coords[1]), len(opening.getPixels()))
+        if otherSideTile == "background":
+            return "window"
+        return "door"
+
     def getOpeningSources(self, x, y):
         """get the opening sources that are to be played at the given x,y coordinates
 
@@ -136,14 +402,31 @@ class SoundGenerator():
         """        
         self.sourcesToPlay = []
         self.listener.move_to((x, y, 0))
-        for opening in self.openingDict.values():
-            coords = opening.getLocation()
-            wallcount = self.grid.getObstructionsInLine(self.grid.pixelsBetweenTwoPoints(x, y, coords[0], coords[1]), opening.getPixels())
-            if wallcount < 1:
-                self.sourcesToPlay.append(opening)
+        keys = list(self.openingDict.keys())
+        if self.hearingMode == "propagation":
+            # the path distances were all found when the field was built
+            reachable = self.propagation.getReachableOpenings(x, y)
+            heard = [key in reachable for key in keys]
+        elif self.hearingMode == "fieldOfView":
+            # one sweep from the listener, instead of one line per opening
+            visible = self.grid.getFieldOfView(x, y)
+            visibleOpenings = set(np.unique(self.openingLabels[visible]).tolist())
+            heard = [key in visibleOpenings for key in keys]
+        elif self.visibility is not None:
+            heard = [self.visibility.canHear(key, x, y) for key in keys]
+        elif len(keys) > 0:
+            # one batch of lines from the listener to every opening, each stopping at its first obstruction
+            centers = np.array([self.openingDict[key].getLocation() for key in keys])
+            heard = self.grid.countObstructionsInLines(x, y, centers[:, 0], centers[:, 1], ignoreLabels=self.openingLabels, lineLabels=keys, stopAtFirst=True) < 1
+        else:
+            heard = []
+        for key, isHeard in zip(keys, heard):
+            if isHeard:
+                self.sourcesToPlay.append(self.openingDict[key])
         return self.sourcesToPlay
         
             
+    @traced("SoundGenerator.playOpeningSources", tracerAttribute="tracer")
     def playOpeningSources(self, x, y):
         """play the sound sources that the listener wants to hear at their x, y location
 
@@ -151,24 +434,86 @@ class SoundGenerator():
             x (int): x coordinate of the listener
             y (int): y coordinate of the listener
         """        
-        self.getOpeningSources(x, y)
-        
-        for opening in self.sourcesToPlay:
+        schedule = self.scheduleOpeningSources(x, y)
+        elapsed = 0.0
+        end = 0.0
+        playing = []
+        for onset, opening, duration in schedule:
+            # sleep until the next onset, rather than polling
+            if onset > elapsed and self.backend.wait(onset - elapsed, self.cancelled):
+                break
+            elapsed = onset
             player = opening.getSoundSource()
             player.play()
-            time.sleep(0.1)
-            while player.get_state() == AL_PLAYING:
-            # wait until the file is done playing
-                time.sleep(0.5)
-        time.sleep(0.1)
-        
-        # release the Openal resources
-        try: 
-            oalQuit()
-        except:
-            pass
+            playing.append(player)
+            end = max(end, onset + duration)
+        else:
+            if self.maxDuration is not None:
+                end = min(end, self.maxDuration)
+            if end <= elapsed or not self.backend.wait(end - elapsed, self.cancelled):
+                if self.maxDuration is None or end < self.maxDuration:
+                    # the device can lag slightly behind the clock
+                    while any(self.backend.isPlaying(player) for player in playing):
+                        if self.backend.wait(0.01, self.cancelled):
+                            break
+        # stop whatever is still playing, when cancelled or past the maximum duration
+        for player in playing:
+            if self.backend.isPlaying(player):
+                player.stop()
+
+    def scheduleOpeningSources(self, x, y):
+        """decides when each opening heard at the given x,y coordinates starts playing,
+        the nearest openings first
+
+        Args:
+            x (int): x coordinate of the listener
+            y (int): y coordinate of the listener
+
+        Returns:
+            list: (onset in seconds, opening, duration in seconds) of the openings to play, by onset
+        """
+        self.getOpeningSources(x, y)
+        openings = sorted(self.sourcesToPlay, key=lambda opening: self.distanceToListener(*self.getSourcePosition(opening, x, y)))
+        schedule = []
+        onset = 0.0
+        for i, opening in enumerate(openings):
+            if self.stagger is not None:
+                onset = i * self.stagger
+            if self.maxDuration is not None and onset >= self.maxDuration:
+                break
+            duration = self.sourceDurations.get(opening.getSoundSource(), 0.0)
+            schedule.append((onset, opening, duration))
+            if self.stagger is None:
+                onset += duration + self.gap
+        return schedule
                
                
+    def getSourcePosition(self, opening, x, y):
+        """returns where an opening's sound is played from, for a listener at the given x,y coordinates
+
+        in the "propagation" hearing mode, the sound comes from the opening's direction,
+        but from further away when it travels around the walls, by how much longer its path is than the shortest possible one
+        otherwise, it is the opening's center
+
+        Args:
+            opening (Opening): the opening
+            x (int): x coordinate of the listener
+            y (int): y coordinate of the listener
+
+        Returns:
+            tuple: the x, y coordinates of the opening's sound
+        """
+        coords = opening.getLocation()
+        if self.hearingMode != "propagation":
+            return coords
+        pathDistance = self.propagation.getDistance(self.openingKeys[opening], x, y)
+        # the paths move between side-adjacent cells, so the shortest possible one is the manhattan distance
+        shortestDistance = abs(coords[0] - x) + abs(coords[1] - y)
+        if pathDistance is None or shortestDistance == 0:
+            return coords
+        detour = max(pathDistance / shortestDistance, 1.0)
+        return (x + (coords[0] - x) * detour, y + (coords[1] - y) * detour)
+
     def distanceToListener(self, x, y):
         """calculates the euclidian distance of a given x, y coordinate to the listener
 
@@ -197,7 +542,12 @@ class SoundGenerator():
     def quit(self):
         """ release resources (don't forget to use this)
         """        
-        oalQuit()
+        self.sourcePool.destroy()
+        for buffer in self.buffers.values():
+            buffer.destroy()
+        for sound, duration in self.phraseSounds.values():
+            sound.destroy()
+        self.backend.quit()
     
 
 if __name__ == "__main__":
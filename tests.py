@@ -3,8 +3,38 @@ from hypothesis import given, strategies as st
 
 import numpy as np
 
+import tempfile
+
+import threading
+
+import time
+
+import os
+
+import json
+
+from collections import deque
+
+import subprocess
+
+import sys
+
+import batch
+
+import benchmark
+
+from map import tracing
+
 from map import *
 
+from map.grid import tileCodes
+
+from map.lines import walkLines
+
+from map.propagation import unreachable
+
+from sound import SoundGenerator, NullBackend, OfflineRenderer, PhraseCache, AudioWorker
+
 from bresenham import bresenham
 
 
@@ -13,15 +43,39 @@ def runAllTests():
     populateTest()
     getAsListTest()
     getRGBTest()
+    setRGBArrayTest()
     averagePixelTest()
     getTileTypeTest()
     getAdjacentTest()
     tileSearchTest()
+    labelTilesTest()
     findOpeningsTest()
+    classifyOpeningsTest()
     rgbDistanceTest()
+    crushDitheringTest()
     countTilesTest()
+    tileCountsTest()
     lineTest()
     getObstructionsTest()
+    batchedLinesTest()
+    visibilityIndexTest()
+    fieldOfViewTest()
+    nullBackendTest()
+    offlineRendererTest()
+    phraseCacheTest()
+    audioWorkerTest()
+    playbackScheduleTest()
+    batchPlanTest()
+    batchInferenceTest()
+    planStoreTest()
+    startupTest()
+    phraseWarmingTest()
+    benchmarkTest()
+    tracingTest()
+    labelMapTest()
+    pyramidTest()
+    propagationTest()
+    roomIndexTest()
     print("all tests passed")
 
 
@@ -139,6 +193,23 @@ def getRGBTest(a, b, rgb):
         assert True
 
 
+@given(st.integers(min_value=1, max_value=12), st.integers(min_value=1, max_value=12), st.sampled_from([3, 4]), st.integers(min_value=0))
+def setRGBArrayTest(sizeX, sizeY, channels, seed):
+    rgbArray = np.random.default_rng(seed).integers(0, 256, (sizeX, sizeY, channels))
+    grid = Grid(sizeX, sizeY)
+    grid.setRGBArray(rgbArray)
+    populatedGrid = Grid(sizeX, sizeY)
+    for x in range(sizeX):
+        for y in range(sizeY):
+            populatedGrid.populate(x, y, tuple(rgbArray[x, y]))
+            assert grid.getRGBValue(x, y) == populatedGrid.getRGBValue(x, y)
+    try:
+        grid.setRGBArray(rgbArray - 256)
+        assert False
+    except ValueError:
+        assert True
+
+
 @given(st.lists(st.tuples(st.integers(min_value=0, max_value=DefaultSize-1), st.integers(min_value=0, max_value=DefaultSize-1)), min_size=1))
 def averagePixelTest(listOfPixels):
     grid = Grid(DefaultSize, DefaultSize)
@@ -171,6 +242,20 @@ def rgbDistanceTest(start, end):
         np.subtract(start, end))
 
 
+@given(st.lists(st.tuples(st.integers(min_value=0, max_value=DefaultSize-1), st.integers(min_value=0, max_value=DefaultSize-1), st.tuples(st.integers(min_value=0, max_value=255), st.integers(min_value=0, max_value=255), st.integers(min_value=0, max_value=255), st.integers(min_value=0, max_value=255))), max_size=20))
+def crushDitheringTest(pixels):
+    grid = Grid(DefaultSize, DefaultSize)
+    for x, y, rgba in pixels:
+        grid.populate(x, y, rgba)
+
+    crushedGrid = grid.crushDithering(grid)
+    for x, y, rgba in pixels:
+        # the closest tile colour, with ties going to the first tile in rgbMap
+        closestColour = min(rgbMap, key=lambda tile: grid.rgbDistance(
+            grid.getRGBValue(x, y), rgbMap[tile]))
+        assert crushedGrid.getTileType(x, y) == closestColour
+
+
 def tileSearchTest():
     grid = Grid(DefaultSize, DefaultSize)
 
@@ -181,6 +266,30 @@ def tileSearchTest():
     assert grid.tileSearch("opening") == expectedTileSearchResult
 
 
+@given(st.lists(st.tuples(st.integers(min_value=0, max_value=15), st.integers(min_value=0, max_value=15)), max_size=150))
+def labelTilesTest(pixels):
+    grid = Grid(16, 16)
+    for x, y in pixels:
+        grid.populate(x, y, rgbMap["opening"])
+
+    components = grid.labelTiles("opening")
+    # every shape found by the depth first search is labelled as one component, in scan order
+    searchGrid = Grid(16, 16)
+    for x, y in pixels:
+        searchGrid.populate(x, y, rgbMap["opening"])
+    shapes = [searchGrid.coagulateShape("opening", x, y) for x in range(16) for y in range(16) if searchGrid.getTileType(x, y) == "opening"]
+
+    assert components.count == len(shapes)
+    for i, shape in enumerate(shapes, start=1):
+        assert sorted(shape) == [tuple(pixel) for pixel in components.getPixels(i).tolist()]
+        assert all(components.labels[x, y] == i for x, y in shape)
+        xs = [pixel[0] for pixel in shape]
+        ys = [pixel[1] for pixel in shape]
+        assert components.getBoundingBox(i) == (min(xs), min(ys), max(xs), max(ys))
+        assert np.allclose(components.getCentroid(i), (np.mean(xs), np.mean(ys)))
+    assert np.count_nonzero(components.labels) == len(set(pixels))
+
+
 def findOpeningsTest():
     grid = Grid(DefaultSize, DefaultSize)
     for coord in randomShapes:
@@ -195,6 +304,31 @@ def findOpeningsTest():
         opening for opening in expectedOpenings.values()]
 
 
+@given(st.integers(min_value=2, max_value=10), st.integers(min_value=3, max_value=28), st.integers(min_value=0, max_value=31), st.booleans())
+def classifyOpeningsTest(width, wallPosition, listenerPosition, vertical):
+    grid = Grid(32, 32)
+    # background on one side of a wall, hall on the other, with an opening in the middle of the wall
+    for i in range(32):
+        for j in range(32):
+            tile = "background" if j < wallPosition else "hall" if j > wallPosition else "wall"
+            if j == wallPosition and 16 - width // 2 <= i < 16 - width // 2 + width:
+                tile = "opening"
+            grid.populate(j if vertical else i, i if vertical else j, rgbMap[tile])
+    grid.findOpenings()
+    opening = grid.getOpenings()[1]
+    listener = (listenerPosition, 16) if vertical else (16, listenerPosition)
+
+    assert opening.getSides() == (("west", "east") if vertical else ("north", "south"))
+    assert opening.getOrientation() == ("vertical" if vertical else "horizontal")
+    assert opening.getSide(*listener) == (None if listenerPosition == wallPosition else opening.getSides()[listenerPosition > wallPosition])
+    if listenerPosition < wallPosition:
+        assert opening.getOtherSideTile(listener[0], listener[1]) == "hall"
+    elif listenerPosition > wallPosition:
+        assert opening.getOtherSideTile(listener[0], listener[1]) == "background"
+    else:
+        assert opening.getOtherSideTile(listener[0], listener[1]) is None
+
+
 def countTilesTest():
     grid = Grid(DefaultSize, DefaultSize)
 
@@ -204,6 +338,19 @@ def countTilesTest():
 
     assert grid.countTiles("opening") == len(
         list(filter(None, grid.getAsList())))
+
+
+@given(st.lists(st.tuples(st.integers(min_value=0, max_value=DefaultSize-1), st.integers(min_value=0, max_value=DefaultSize-1), st.sampled_from(sorted(rgbMap.keys())))))
+def tileCountsTest(tiles):
+    grid = Grid(DefaultSize, DefaultSize)
+    for x, y, tile in tiles:
+        grid.populate(x, y, rgbMap[tile])
+
+    counts = grid.getTileCounts()
+    assert sum(counts.values()) == DefaultSize * DefaultSize
+    for tile in rgbMap:
+        assert counts[tile] == grid.countTiles(tile)
+        assert counts[tile] == np.count_nonzero(grid.getTileMask(tile))
     
 @given(st.integers(min_value=0, max_value=DefaultSize-1), st.integers(min_value=0, max_value=DefaultSize-1), st.integers(min_value=0, max_value=DefaultSize-1), st.integers(min_value=0, max_value=DefaultSize-1))
 def lineTest(startX, startY, endX, endY):
@@ -221,5 +368,570 @@ def getObstructionsTest(startX, startY, endX, endY):
     
     assert grid.getObstructionsInLine(list(bresenham(startX, startY, endX, endY))) == len(list(bresenham(startX, startY, endX, endY)))
 
+@given(st.lists(st.tuples(st.integers(min_value=0, max_value=31), st.integers(min_value=0, max_value=31), st.integers(min_value=0, max_value=31), st.integers(min_value=0, max_value=31)), min_size=1, max_size=20), st.lists(st.tuples(st.integers(min_value=0, max_value=31), st.integers(min_value=0, max_value=31), st.sampled_from(["wall", "opening", "hall"])), max_size=200))
+def batchedLinesTest(lines, tiles):
+    grid = Grid(32, 32)
+    for x, y, tile in tiles:
+        grid.populate(x, y, rgbMap[tile])
+    startX, startY, endX, endY = (np.array(values) for values in zip(*lines))
+    ignore = [(x, y) for x, y, tile in tiles[::2]]
+    ignoreMask = np.zeros((32, 32), dtype=bool)
+    for x, y in ignore:
+        ignoreMask[x, y] = True
+
+    pixelX, pixelY, offsets = grid.linesBetweenPoints(startX, startY, endX, endY)
+    counts = grid.countObstructionsInLines(startX, startY, endX, endY, ignoreMask=ignoreMask)
+    firstCounts = grid.countObstructionsInLines(startX, startY, endX, endY, ignoreMask=ignoreMask, stopAtFirst=True)
+    for i, line in enumerate(lines):
+        expectedLine = grid.pixelsBetweenTwoPoints(*line)
+        assert list(zip(pixelX[offsets[i]:offsets[i+1]], pixelY[offsets[i]:offsets[i+1]])) == expectedLine
+        assert counts[i] == grid.getObstructionsInLine(expectedLine, ignore)
+        # the pixels can also be given as arrays, as the vectorized callers make them
+        assert counts[i] == grid.getObstructionsInLine(np.array(expectedLine), np.array(ignore).reshape(-1, 2))
+        assert firstCounts[i] == min(counts[i], 1)
+
+
+@given(st.lists(st.tuples(st.integers(min_value=0, max_value=23), st.integers(min_value=0, max_value=23), st.sampled_from(["wall", "opening"])), max_size=120), st.booleans())
+def visibilityIndexTest(tiles, eager):
+    grid = Grid(24, 24)
+    for x in range(24):
+        for y in range(24):
+            grid.populate(x, y, rgbMap["background"])
+    for x, y, tile in tiles:
+        grid.populate(x, y, rgbMap[tile])
+    grid.findOpenings()
+    visibility = grid.buildVisibilityIndex(eager=eager)
+
+    for x in range(24):
+        for y in range(24):
+            expected = [key for key, opening in grid.getOpenings().items()
+                        if grid.getObstructionsInLine(grid.pixelsBetweenTwoPoints(x, y, opening.getLocation()[0], opening.getLocation()[1]), opening.getPixels()) < 1]
+            assert visibility.getAudibleOpenings(x, y) == expected
+    assert visibility.getStats()["built"] == len(grid.getOpenings())
+
+
+@given(st.integers(min_value=0, max_value=31), st.integers(min_value=0, max_value=31), st.integers(min_value=1, max_value=30))
+def fieldOfViewTest(x, y, wallX):
+    grid = Grid(32, 32)
+    for i in range(32):
+        for j in range(32):
+            grid.populate(i, j, rgbMap["background"])
+    # with nothing in the way, everything can be seen
+    assert grid.getFieldOfView(x, y).all()
+
+    # a wall from top to bottom hides everything behind it, but can be seen itself
+    for j in range(32):
+        grid.populate(wallX, j, rgbMap["wall"])
+    visible = grid.getFieldOfView(x, y)
+    if x < wallX:
+        assert visible[:wallX + 1, :].all() and not visible[wallX + 1:, :].any()
+    elif x > wallX:
+        assert visible[wallX:, :].all() and not visible[:wallX, :].any()
+    else:
+        assert visible.sum() == 1
+
+
+def doorGrid():
+    # a room split by a wall, with a door in the wall
+    grid = Grid(24, 24)
+    for x in range(24):
+        for y in range(24):
+            grid.populate(x, y, rgbMap["hall" if x < 12 else "bedroom"])
+    for y in range(24):
+        grid.populate(12, y, rgbMap["wall"])
+    for y in range(10, 13):
+        grid.populate(12, y, rgbMap["opening"])
+    grid.findOpenings()
+    return grid
+
+
+def nullBackendTest():
+    grid = doorGrid()
+    backend = NullBackend()
+    audio = SoundGenerator(grid, grid.getOpenings(), backend=backend)
+
+    audio.prepareOpeningSources(3, 11)
+    audio.sayLocation(3, 11)
+    audio.playOpeningSources(3, 11)
+    plays = backend.getEvents("play")
+    assert len(plays) == 1 and plays[0]["sound"].endswith("door.wav")
+    assert plays[0]["position"] == (12, 11, 0)
+    assert len(backend.getEvents("say")) == 3
+    # the clock only moves on once the door has finished playing
+    assert backend.clock >= plays[0]["time"] + plays[0]["duration"]
+
+    # the sources are reused on the next click
+    audio.prepareOpeningSources(20, 11)
+    assert backend.sourceCount == 1
+    audio.quit()
+    assert backend.getEvents()[-1]["event"] == "quit"
+
+
+def offlineRendererTest():
+    grid = doorGrid()
+    renderer = OfflineRenderer(grid)
+
+    # facing north, the door is on the listener's right, 9 cells away
+    north = renderer.render(3, 11)
+    door = renderer.sounds["door"]
+    assert north.shape == (len(door), 2)
+    peak = np.argmax(np.abs(door))
+    assert np.isclose(np.hypot(north[peak, 0], north[peak, 1]), abs(door[peak]) / 9, rtol=1e-4)
+    assert np.abs(north[:, 1]).sum() > np.abs(north[:, 0]).sum()
+    # facing south, it is on their left
+    south = renderer.render(3, 11, (0.0, 1.0, 0.0, 0.0, 0.0, -1.0))
+    assert np.allclose(south[:, ::-1], north)
+    # nothing is heard where the wall hides the door
+    assert renderer.render(11, 0).shape == (0, 2)
+
+
+def phraseCacheTest():
+    grid = doorGrid()
+    backend = NullBackend()
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PhraseCache(directory, backend.synthesize, backend.getSpeechSettings())
+        audio = SoundGenerator(grid, grid.getOpenings(), backend=backend, phraseCache=cache)
+        audio.sayLocation(3, 11)
+        # each phrase is synthesized once, and the phrases are played one after the other from their clips
+        assert len(backend.getEvents("synthesize")) == 6
+        plays = backend.getEvents("play")
+        assert len(backend.getEvents("say")) == 0 and len(plays) == 6
+        assert all(second["time"] >= first["time"] + first["duration"] for first, second in zip(plays, plays[1:]))
+        audio.sayLocation(3, 11)
+        audio.sayLocation(4, 11)
+        assert len(backend.getEvents("synthesize")) == 7
+        assert len(backend.getEvents("play")) == 18
+
+        # warming synthesizes the phrases that were not cached yet, and only the phrases are cached
+        cache.warm(audio.getPhrases(coordinates=False))
+        assert cache.getStats()["files"] == len(backend.getEvents("synthesize")) == len(os.listdir(directory))
+
+        # the least recently used clips are evicted
+        cache.maxBytes = cache.getStats()["bytes"] // 2
+        cache.evict()
+        assert 0 < cache.getStats()["bytes"] <= cache.maxBytes
+        assert cache.getStats()["files"] == len(os.listdir(directory))
+        # and the cache is read back from its directory
+        assert PhraseCache(directory, backend.synthesize, backend.getSpeechSettings()).getStats()["bytes"] == cache.getStats()["bytes"]
+
+
+def audioWorkerTest():
+    worker = AudioWorker()
+    started = threading.Event()
+    finished = threading.Event()
+    results = []
+
+    def longTask():
+        started.set()
+        # stands in for a long playback, which stops when cancelled
+        results.append(("long", worker.cancelled.wait(5)))
+
+    def newTask():
+        results.append(("new", worker.cancelled.is_set()))
+        finished.set()
+
+    worker.submit(longTask)
+    assert started.wait(5)
+    # a new task preempts the one in progress and the ones queued behind it
+    worker.submit(results.append, ("queued", False))
+    worker.submit(newTask)
+    assert finished.wait(5)
+    assert results == [("long", True), ("new", False)]
+    worker.stop(timeout=5)
+    assert not worker.thread.is_alive() and worker.isIdle()
+
+    # the worker is not idle between taking a task off the queue and running it
+    worker = AudioWorker()
+    started, gate, taken, resume = threading.Event(), threading.Event(), threading.Event(), threading.Event()
+
+    def gatedTask():
+        started.set()
+        gate.wait(5)
+
+    worker.submit(gatedTask)
+    assert started.wait(5)
+    getTask = worker.tasks.get
+
+    def slowGet(block=True, timeout=None):
+        task = getTask(block, timeout)
+        if block:
+            taken.set()
+            resume.wait(5)
+        return task
+
+    # used from the task after the one in progress
+    worker.tasks.get = slowGet
+    gate.set()
+    worker.submit(results.append, ("taken", False))
+    assert taken.wait(5)
+    assert worker.tasks.empty() and not worker.isIdle()
+    resume.set()
+    deadline = time.perf_counter() + 5
+    while not worker.isIdle() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert results[-1] == ("taken", False) and worker.isIdle()
+    worker.stop(timeout=5)
+
+    # the sound stage stops as soon as it is cancelled
+    grid = doorGrid()
+    backend = NullBackend()
+    audio = SoundGenerator(grid, grid.getOpenings(), backend=backend)
+    audio.prepareOpeningSources(3, 11)
+    audio.cancelled.set()
+    audio.playOpeningSources(3, 11)
+    assert len(backend.getEvents("play")) == 1 and len(backend.getEvents("stop")) == 1
+
+
+def playbackScheduleTest():
+    grid = doorGrid()
+    # two more doors, further from the listener than the first one
+    for y in (1, 2, 21, 22, 23):
+        grid.populate(12, y, rgbMap["opening"])
+    grid.findOpenings()
+    backend = NullBackend()
+    audio = SoundGenerator(grid, grid.getOpenings(), backend=backend)
+    doorLength = audio.durations["door"]
+
+    # one after the other, the nearest first
+    audio.prepareOpeningSources(3, 11)
+    audio.playOpeningSources(3, 11)
+    plays = backend.getEvents("play")
+    assert [play["position"][1] for play in plays] == [11, 1, 22]
+    assert np.allclose([play["time"] for play in plays], [0, doorLength + audio.gap, 2 * (doorLength + audio.gap)])
+
+    # staggered, and cut off after the maximum duration
+    backend.clearEvents()
+    audio.stagger = 0.5
+    audio.maxDuration = 1.2
+    start = backend.clock
+    audio.prepareOpeningSources(3, 11)
+    audio.playOpeningSources(3, 11)
+    plays = backend.getEvents("play")
+    assert np.allclose([play["time"] - start for play in plays], [0, 0.5, 1.0])
+    assert len(backend.getEvents("stop")) == 2
+    assert np.isclose(backend.clock - start, 1.2)
+
+
+def batchPlanTest():
+    example = os.path.join(os.path.dirname(os.path.abspath(__file__)), "map", "example.png")
+    with tempfile.TemporaryDirectory() as directory:
+        result = batch.processPlan("example", example, directory)
+        assert "error" not in result
+        assert {"quantize", "downsample", "findOpenings", "save"} <= set(result["timings"])
+        with open(os.path.join(directory, "example.openings.json")) as openingsFile:
+            openings = json.load(openingsFile)
+        assert len(openings) == result["openings"] > 0
+        assert os.path.exists(os.path.join(directory, "example.png"))
+        assert len(loadPlan(os.path.join(directory, "example.plan.npz")).getOpenings()) == result["openings"]
+
+        # a broken plan is reported rather than stopping the batch
+        assert "error" in batch.processPlan("missing", os.path.join(directory, "missing.png"), directory)
+        summary = batch.summarize([result], 1.0)
+        assert summary["plans"] == 1 and summary["failed"] == 0 and summary["stages"]["save"]["max"] > 0
+
+
+class StubInferenceEngine():
+    # stands in for demo.InferenceEngine, failing on the images named bad
+    batches = []
+
+    def __init__(self, intra_op_threads=0, inter_op_threads=0):
+        pass
+
+    def infer(self, images):
+        StubInferenceEngine.batches.append([os.path.basename(path) for path in images])
+        if any("bad" in os.path.basename(path) for path in images):
+            raise OSError("cannot identify image file")
+        # a hall with a wall around it and a door in the wall, indexed [y, x] like the model's output
+        roomTypes = np.full((len(images), 256, 256), 5)
+        roomBoundaries = np.zeros((len(images), 256, 256), dtype=np.int64)
+        roomBoundaries[:, :8, :] = roomBoundaries[:, -8:, :] = roomBoundaries[:, :, :8] = roomBoundaries[:, :, -8:] = 2
+        roomBoundaries[:, :8, 100:140] = 1
+        return roomTypes, roomBoundaries
+
+    def close(self):
+        pass
+
+
+class StubModel():
+    # stands in for the demo module
+    InferenceEngine = StubInferenceEngine
+
+    @staticmethod
+    def merge_results(roomType, roomBoundary):
+        return np.where(roomBoundary > 0, roomBoundary + 8, roomType)
+
+
+def batchInferenceTest():
+    with tempfile.TemporaryDirectory() as directory:
+        inputDirectory = os.path.join(directory, "input")
+        os.makedirs(inputDirectory)
+        for name in ("a.jpg", "bad.jpg", "c.jpg"):
+            open(os.path.join(inputDirectory, name), "w").close()
+        StubInferenceEngine.batches = []
+        summary = batch.runBatch(inputDirectory, os.path.join(directory, "output"), workers=1, batchSize=2, model=StubModel)
+
+        # the batch with the bad image is run again one image at a time, and only the bad image fails
+        assert StubInferenceEngine.batches == [["a.jpg", "bad.jpg"], ["a.jpg"], ["bad.jpg"], ["c.jpg"]]
+        assert summary["plans"] == 3 and summary["failed"] == 1
+        results = {result["name"]: result for result in summary["results"]}
+        assert "OSError" in results["bad"]["error"] and results["bad"]["timings"] == {}
+        assert all("error" not in results[name] and "inference" in results[name]["timings"] for name in ("a", "c"))
+        assert os.path.exists(os.path.join(directory, "output", "summary.json"))
+
+
+def planStoreTest():
+    generator = MapGenerator()
+    generator.createFromSaveFile(example=True)
+    grid = generator.grid
+    # a colour that is not a tile is kept in the palette
+    grid.populate(0, 0, (10, 20, 30, 255))
+    grid.findOpenings()
+    grid.buildVisibilityIndex(eager=True)
+    with tempfile.TemporaryDirectory() as directory:
+        for path in (os.path.join(directory, "plan.npz"), os.path.join(directory, "plan")):
+            savePlan(path, grid)
+            loaded = loadPlan(path)
+            assert np.array_equal(loaded.getRGBAArray(), grid.getRGBAArray())
+            assert loaded.getRGBValue(0, 0) == (10, 20, 30, 255)
+            assert list(loaded.getOpenings()) == list(grid.getOpenings())
+            for key, opening in grid.getOpenings().items():
+                assert loaded.getOpenings()[key].getPixels() == opening.getPixels()
+                assert loaded.getOpenings()[key].getLocation() == opening.getLocation()
+                assert loaded.getOpenings()[key].otherSideTiles == opening.otherSideTiles
+            for x, y in ((10, 10), (40, 60), (100, 20)):
+                assert loaded.getVisibilityIndex().getAudibleOpenings(x, y) == grid.getVisibilityIndex().getAudibleOpenings(x, y)
+        # the arrays of a directory are memory-mapped
+        assert isinstance(loadPlan(os.path.join(directory, "plan")).getSelf(), np.memmap)
+
+        # overwriting a plan leaves none of the arrays of the plan it replaces
+        for path in (os.path.join(directory, "plan.npz"), os.path.join(directory, "plan")):
+            savePlan(path, doorGrid(), includeVisibility=False)
+            loaded = loadPlan(path)
+            assert loaded.getVisibilityIndex() is None and len(loaded.getOpenings()) == 1
+            savePlan(path, Grid(8, 8))
+            loaded = loadPlan(path)
+            assert loaded.openingLabels is None and loaded.getOpenings() == {}
+        assert sorted(os.listdir(os.path.join(directory, "plan"))) == ["codes.npy", "hasOpenings.npy", "hasVisibility.npy", "palette.npy", "version.npy"]
+
+
+def startupTest():
+    """tests that starting the app does not import tensorflow, the speech engine, OpenAL or the tests
+    """
+    script = "import sys, run; print([name for name in run.heavyModules if name in sys.modules])"
+    output = subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]", output
+
+
+def phraseWarmingTest():
+    # warming the phrase cache at startup stops at the first click, rather than delaying it until every phrase is synthesized
+    backend = NullBackend()
+    synthesized = []
+
+    def slowSynthesize(text, path):
+        time.sleep(0.05)
+        backend.synthesize(text, path)
+        synthesized.append(text)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PhraseCache(directory, slowSynthesize, backend.getSpeechSettings())
+        worker = AudioWorker()
+        phrases = ["phrase " + str(i) for i in range(20)]
+        clicked = threading.Event()
+        worker.submit(cache.warm, phrases, worker.cancelled)
+        deadline = time.perf_counter() + 5
+        while not synthesized and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        start = time.perf_counter()
+        worker.submit(lambda: clicked.set())
+        assert clicked.wait(5)
+        assert time.perf_counter() - start < 0.5 and len(synthesized) < len(phrases)
+        worker.stop(timeout=5)
+
+
+def benchmarkTest():
+    results = benchmark.runBenchmarks(sizes=[128], repeat=1, example=False)
+    assert set(results["results"]) == {name + "[128]" for name in ("populateGrid", "crushDithering", "tileSearch", "findOpenings", "pixelsBetweenTwoPoints",
+                                                                    "getObstructionsInLine", "otherSide", "getOpeningSources")}
+    assert all(result["median"] > 0 for result in results["results"].values())
+
+    baseline = {"results": {"fast[128]": {"median": 1.0}, "slow[128]": {"median": 1.0}, "same[128]": {"median": 1.0}, "old[128]": {"median": 1.0}}}
+    current = {"results": {"fast[128]": {"median": 0.5}, "slow[128]": {"median": 1.5}, "same[128]": {"median": 1.1}, "new[128]": {"median": 1.0}}}
+    comparison = benchmark.compareResults(current, baseline, threshold=0.25)
+    assert {name: result["status"] for name, result in comparison.items()} == {"fast[128]": "speedup", "slow[128]": "regression", "same[128]": "same"}
+
+
+def tracingTest():
+    spans = tracing.ListSink()
+    with tempfile.TemporaryDirectory() as directory:
+        tracePath = os.path.join(directory, "trace.json")
+        linesPath = os.path.join(directory, "trace.jsonl")
+        for sink in (spans, tracing.ChromeTraceSink(tracePath), tracing.JSONLinesSink(linesPath)):
+            tracing.addSink(sink, traceMemory=True)
+        try:
+            generator = MapGenerator()
+            generator.create(os.path.join(generator.mapDirectory, "example.png"))
+            grid = doorGrid()
+            audio = SoundGenerator(grid, grid.getOpenings(), backend=NullBackend(), tracer=tracing.tracer)
+            with tracing.span("click", x=3, y=11):
+                audio.prepareOpeningSources(3, 11)
+                audio.sayLocation(3, 11)
+                audio.playOpeningSources(3, 11)
+            # without a tracer, the sound stage is not traced
+            SoundGenerator(grid, grid.getOpenings(), backend=NullBackend()).sayLocation(3, 11)
+        finally:
+            tracing.closeSinks()
+        assert not tracing.tracer.isEnabled()
+
+        names = [span["name"] for span in spans.spans]
+        assert names[:7] == ["MapGenerator." + name for name, stage in generator.stages] + ["MapGenerator.create"]
+        assert names[-4:] == ["SoundGenerator.prepareOpeningSources", "SoundGenerator.sayLocation", "SoundGenerator.playOpeningSources", "click"]
+        assert "Grid.findOpenings" in names
+        click = spans.spans[-1]
+        assert click["details"] == {"x": 3, "y": 11} and click["depth"] == 0
+        assert all(span["parent"] == "click" and span["depth"] == 1 for span in spans.spans[-4:-1])
+        assert sum(span["duration"] for span in spans.spans[-4:-1]) <= click["duration"]
+        # a parent's peak memory includes its children's
+        assert all(span["peakMemory"] >= 0 for span in spans.spans)
+        create = spans.spans[6]
+        assert create["peakMemory"] >= max(span["peakMemory"] for span in spans.spans[:6])
+
+        with open(tracePath) as traceFile:
+            events = json.load(traceFile)["traceEvents"]
+        assert [event["name"] for event in events] == names and all(event["ph"] == "X" for event in events)
+        with open(linesPath) as linesFile:
+            assert [json.loads(line)["name"] for line in linesFile] == names
+
+
+def labelMapTest():
+    # the colours demo.ind2rgb draws the model's classes in
+    classColours = np.array([[255, 255, 255], [192, 192, 224], [192, 255, 255], [224, 255, 192], [255, 224, 128], [255, 160, 96],
+                             [255, 224, 224], [255, 255, 255], [255, 255, 255], [255, 60, 128], [0, 0, 0]], dtype=np.uint8)
+    random = np.random.default_rng(0)
+    # rooms of 8x8 pixels, so that the label map is blocky like the model's
+    labels = np.kron(random.integers(0, 11, (64, 64)), np.ones((8, 8), dtype=np.int64))
+    fromLabels = MapGenerator()
+    fromLabels.createFromLabels(labels)
+    fromColours = MapGenerator()
+    fromColours.create(classColours[labels])
+    assert np.array_equal(fromLabels.grid.getSelf(), fromColours.grid.getSelf())
+    assert np.array_equal(np.asarray(fromLabels.getImage()), np.asarray(fromColours.getImage()))
+    assert list(fromLabels.timings) == ["labels", "downsample", "requantize", "grid"]
+
+    for invalid in (labels.astype(np.int64) * 2, labels[0]):
+        try:
+            fromLabels.createFromLabels(invalid)
+            assert False
+        except ValueError:
+            pass
+
+
+def pyramidTest():
+    random = np.random.default_rng(0)
+    for sizeX, sizeY, density in ((37, 42, 0.05), (64, 64, 0.01), (100, 30, 0.3)):
+        mask = random.random((sizeX, sizeY)) < density
+        labels = random.integers(0, 4, (sizeX, sizeY)) * mask
+        pyramid = ObstructionPyramid(mask)
+        lines = [random.integers(0, size, 500) for size in (sizeX, sizeY, sizeX, sizeY)]
+        lineLabels = random.integers(0, 4, 500)
+        for stopAtFirst in (False, True):
+            assert np.array_equal(pyramid.walkLines(mask, *lines, stopAtFirst=stopAtFirst), walkLines(mask, *lines, stopAtFirst=stopAtFirst))
+            assert np.array_equal(pyramid.walkLines(mask, *lines, labels, lineLabels, stopAtFirst),
+                                  walkLines(mask, *lines, labels, lineLabels, stopAtFirst))
+
+    # a large grid walks its lines through the pyramid, which is rebuilt when the grid changes
+    grid = Grid(300, 300)
+    grid.setTiles(np.full((300, 300), tileCodes["hall"]))
+    assert grid.countObstructionsInLines(0, 0, 299, 299)[0] == 0
+    pyramid = grid.getObstructionPyramid()
+    assert pyramid.getLevelCount() > 1 and grid.getObstructionPyramid() is pyramid
+    grid.populate(150, 150, rgbMap["wall"])
+    assert grid.countObstructionsInLines(0, 0, 299, 299)[0] == 1
+    assert grid.getObstructionPyramid() is not pyramid
+
+
+def propagationTest():
+    # a room split by a wall that stops short of the bottom, with a window at the top of the right half
+    grid = Grid(24, 24)
+    grid.setTiles(np.full((24, 24), tileCodes["hall"]))
+    for y in range(16):
+        grid.populate(12, y, rgbMap["wall"])
+    for x in range(18, 21):
+        grid.populate(x, 0, rgbMap["opening"])
+    grid.findOpenings()
+    field = grid.buildPropagationField()
+    window = grid.getOpenings()[1]
+
+    # the same distances as a breadth-first search one cell at a time
+    expected = np.full((24, 24), -1)
+    queue = deque(window.getPixels())
+    for x, y in queue:
+        expected[x, y] = 0
+    while queue:
+        x, y = queue.popleft()
+        for neighbour in grid.getAdjacentCoords(x, y).values():
+            if expected[neighbour] < 0 and grid.getTileType(*neighbour) != "wall":
+                expected[neighbour] = expected[x, y] + 1
+                queue.append(neighbour)
+    distances = field.getField(1).astype(np.int64)
+    assert np.array_equal(np.where(distances == unreachable, -1, distances), expected)
+    assert field.getDistance(1, 12, 3) is None and field.getDistance(1, 3, 5) == expected[3, 5]
+
+    # the window is around the corner of the wall from the left half, so only heard through propagation
+    backend = NullBackend()
+    assert SoundGenerator(grid, grid.getOpenings(), backend=backend).getOpeningSources(3, 5) == []
+    audio = SoundGenerator(grid, grid.getOpenings(), hearingMode="propagation", backend=backend)
+    assert audio.getOpeningSources(3, 5) == [window]
+    # and played from further away than the window itself, in its direction
+    sourceX, sourceY = audio.getSourcePosition(window, 3, 5)
+    windowX, windowY = window.getLocation()
+    assert np.hypot(sourceX - 3, sourceY - 5) > np.hypot(windowX - 3, windowY - 5)
+    assert np.isclose((sourceX - 3) * (windowY - 5), (sourceY - 5) * (windowX - 3))
+    # in the open, the window is where it is
+    assert audio.getSourcePosition(window, 19, 10) == window.getLocation()
+
+
+def roomIndexTest():
+    grid = doorGrid()
+    # a closet cut off from the bedroom by walls, with a window to the outside
+    for x in range(18, 24):
+        grid.populate(x, 17, rgbMap["wall"])
+    for y in range(18, 24):
+        grid.populate(17, y, rgbMap["wall"])
+    for x in range(18, 24):
+        for y in range(18, 24):
+            grid.populate(x, y, rgbMap["closet"])
+    for y in range(19, 21):
+        grid.populate(23, y, rgbMap["opening"])
+    grid.findOpenings()
+    rooms = grid.buildRoomIndex()
+    assert rooms.getStats()["rooms"] == 3 and rooms.getStats()["openings"] == 1
+
+    closet, hall, bedroom = rooms.getRoom(20, 20), rooms.getRoom(3, 11), rooms.getRoom(15, 3)
+    assert [rooms.getTile(room) for room in (closet, hall, bedroom)] == ["closet", "hall", "bedroom"]
+    assert rooms.getRoom(12, 3) is None and rooms.getRoom(12, 11) is None
+    assert rooms.getArea(hall) == 12 * 24 and rooms.getArea(closet) == 6 * 6 - 2
+    assert rooms.getArea(bedroom) == 11 * 24 - 6 - 6 - 6 * 6
+    assert rooms.getCentroid(hall) == (5.5, 11.5)
+
+    # the door connects the hall and the bedroom, the closet's window leads out of the rooms
+    door = [key for key, opening in grid.getOpenings().items() if opening.getLocation()[0] == 12][0]
+    window = [key for key in grid.getOpenings() if key != door][0]
+    assert sorted(rooms.getOpeningRooms(door)) == sorted((hall, bedroom))
+    assert rooms.getConnections(hall) == {bedroom: [door]} and rooms.getConnections(closet) == {}
+    assert rooms.getRoomBehind(door, 3, 11) == bedroom and rooms.getRoomBehind(door, 15, 3) == hall
+    assert rooms.getRoomBehind(window, 20, 20) is None
+    # nothing is behind a door from a room it does not open from, nor from a wall
+    assert rooms.getRoomBehind(door, 20, 20) is None and rooms.getRoomBehind(door, 12, 3) is None
+
+    # and is announced from the hall, with the phrases to cache it
+    backend = NullBackend()
+    audio = SoundGenerator(grid, grid.getOpenings(), backend=backend)
+    audio.sayLocation(3, 11)
+    assert backend.getEvents("say")[-1]["text"] == "This room opens onto the bedroom"
+    assert audio.getRoomSentences(20, 20) == [] and audio.getRoomSentences(12, 3) == []
+    assert {"This room opens onto the", "bedroom", "closet"} <= set(audio.getPhrases(coordinates=False))
+
+
 if __name__ == "__main__":
     runAllTests()